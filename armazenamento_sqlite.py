@@ -0,0 +1,288 @@
+"""
+Armazenamento SQLite - Sessões persistentes e retomáveis por id
+
+Cada turno concluído é acrescentado ao banco (nunca reescrito), então uma
+sessão sobrevive a reinícios do processo e pode ser retomada por qualquer
+worker que abra o mesmo arquivo:
+
+    chat = ChatComMemoria(sessao_id="cliente-42")   # com ARMAZENAMENTO_SQLITE no .env
+
+Ao retomar, apenas as mensagens que cabem na janela (JANELA_MAX ou
+JANELA_TOKENS) são lidas, do fim para o início; o histórico completo
+continua no banco.
+
+- Modo WAL: leitores não bloqueiam o escritor (vários processos podem ler)
+- Commits em lote: as escritas são agrupadas em memória e gravadas em uma
+  única transação a cada intervalo_commit segundos (por uma thread própria)
+  ou a cada max_pendentes mensagens; a trava de escrita do banco só é
+  mantida durante essa gravação, nunca entre turnos
+- Somente acréscimos: limpar_historico() grava um marco de início, sem apagar
+
+Configurações opcionais do .env:
+    ARMAZENAMENTO_SQLITE: Caminho do banco (ex: dados/sessoes.db). Sem ele, nada é persistido
+    ARMAZENAMENTO_INTERVALO_COMMIT: Segundos máximos entre commits. Padrão: 0.5
+"""
+
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Mensagens pendentes que forçam um commit imediato
+MAX_PENDENTES = 256
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS sessoes (
+    id TEXT PRIMARY KEY,
+    system_prompt TEXT,
+    inicio_seq INTEGER NOT NULL DEFAULT 0,
+    criada_em REAL NOT NULL,
+    atualizada_em REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS mensagens (
+    sessao_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    criada_em REAL NOT NULL,
+    PRIMARY KEY (sessao_id, seq)
+) WITHOUT ROWID;
+"""
+
+_abertos: Dict[str, "ArmazenamentoSQLite"] = {}
+_trava_abertos = threading.Lock()
+
+
+def obter_armazenamento(caminho: str, intervalo_commit: float = 0.5) -> "ArmazenamentoSQLite":
+    """
+    Retorna o armazenamento do arquivo informado, abrindo-o apenas uma vez por
+    processo (todas as sessões compartilham a conexão e os commits em lote).
+    """
+    chave = os.path.abspath(caminho)
+    with _trava_abertos:
+        armazenamento = _abertos.get(chave)
+        if armazenamento is None or armazenamento.fechado:
+            armazenamento = ArmazenamentoSQLite(caminho, intervalo_commit)
+            _abertos[chave] = armazenamento
+        return armazenamento
+
+
+class ArmazenamentoSQLite:
+    """Persistência de sessões de chat em um arquivo SQLite"""
+
+    def __init__(self, caminho: str, intervalo_commit: float = 0.5, max_pendentes: int = MAX_PENDENTES):
+        """
+        Abre (ou cria) o banco.
+
+        Args:
+            caminho: Arquivo do banco (o diretório é criado se necessário)
+            intervalo_commit: Segundos máximos que uma escrita aguarda o commit
+            max_pendentes: Mensagens pendentes que forçam um commit imediato
+        """
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+
+        self.caminho = caminho
+        self.intervalo_commit = intervalo_commit
+        self.max_pendentes = max_pendentes
+        self.fechado = False
+
+        # isolation_level=None: as transações são abertas e confirmadas explicitamente
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.executescript(_ESQUEMA)
+        self._trava = threading.RLock()
+        # Escritas aguardando o próximo commit, na ordem em que foram feitas: (função, argumentos)
+        self._fila: List[Tuple[Callable, tuple]] = []
+        self._pendentes = 0  # Mensagens na fila
+
+        self._acordar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name=f"ArmazenamentoSQLite({caminho})",
+                                        daemon=True)
+        self._thread.start()
+        atexit.register(self.fechar)
+
+    def _enfileirar(self, funcao: Callable, *argumentos):
+        """Guarda uma escrita para o próximo commit e acorda a thread de commits"""
+        if self.fechado:
+            raise ValueError(f"Armazenamento já fechado: {self.caminho}")
+        self._fila.append((funcao, argumentos))
+        self._acordar.set()
+
+    def _tocar_sessao(self, sessao_id: str, agora: float):
+        self._conexao.execute(
+            "INSERT INTO sessoes (id, criada_em, atualizada_em) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET atualizada_em = excluded.atualizada_em",
+            (sessao_id, agora, agora)
+        )
+
+    def _gravar_mensagens(self, sessao_id: str, mensagens: List[Tuple[str, str, int]], agora: float):
+        # Dentro da transação IMMEDIATE: a próxima posição (seq) não muda até o
+        # commit, mesmo com vários processos escrevendo no mesmo arquivo
+        self._tocar_sessao(sessao_id, agora)
+        seq = self._conexao.execute(
+            "SELECT COALESCE(MAX(seq) + 1, 0) FROM mensagens WHERE sessao_id = ?", (sessao_id,)
+        ).fetchone()[0]
+        self._conexao.executemany(
+            "INSERT INTO mensagens (sessao_id, seq, role, content, tokens, criada_em) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(sessao_id, seq + i, role, content, tokens, agora)
+             for i, (role, content, tokens) in enumerate(mensagens)]
+        )
+
+    def _gravar_system_prompt(self, sessao_id: str, prompt: str, agora: float):
+        self._tocar_sessao(sessao_id, agora)
+        self._conexao.execute("UPDATE sessoes SET system_prompt = ? WHERE id = ?", (prompt, sessao_id))
+
+    def _gravar_limpeza(self, sessao_id: str, agora: float):
+        self._tocar_sessao(sessao_id, agora)
+        self._conexao.execute(
+            "UPDATE sessoes SET inicio_seq = (SELECT COALESCE(MAX(seq) + 1, 0) FROM mensagens "
+            "WHERE sessao_id = ?) WHERE id = ?",
+            (sessao_id, sessao_id)
+        )
+
+    def anexar(self, sessao_id: str, mensagens: List[Tuple[str, str, int]]):
+        """
+        Acrescenta mensagens (role, content, tokens) ao fim da sessão.
+
+        A escrita é confirmada em até intervalo_commit segundos (ou
+        imediatamente, se houver max_pendentes mensagens aguardando).
+        """
+        if not mensagens:
+            return
+        with self._trava:
+            self._enfileirar(self._gravar_mensagens, sessao_id, list(mensagens), time.time())
+            self._pendentes += len(mensagens)
+            if self._pendentes >= self.max_pendentes or self.intervalo_commit == 0:
+                self.commit()
+
+    def definir_system_prompt(self, sessao_id: str, prompt: str):
+        """Guarda o system prompt da sessão (restaurado ao retomar)"""
+        with self._trava:
+            self._enfileirar(self._gravar_system_prompt, sessao_id, prompt, time.time())
+
+    def limpar(self, sessao_id: str):
+        """
+        Marca o histórico atual da sessão como descartado.
+
+        As mensagens continuam no banco (somente acréscimos); apenas deixam de
+        ser carregadas ao retomar a sessão.
+        """
+        with self._trava:
+            self._enfileirar(self._gravar_limpeza, sessao_id, time.time())
+
+    def carregar(self, sessao_id: str, max_mensagens: int = None,
+                 max_tokens: int = None) -> Tuple[Optional[str], List[Tuple[str, str, int]]]:
+        """
+        Lê as mensagens mais recentes da sessão, sem ler o histórico inteiro.
+
+        As linhas são lidas do fim para o início e a leitura para assim que o
+        limite é atingido; a primeira mensagem retornada é sempre do usuário
+        (pares inteiros).
+
+        Args:
+            sessao_id: Id da sessão
+            max_mensagens: Máximo de mensagens (ex: JANELA_MAX * 2)
+            max_tokens: Máximo de tokens somados (ex: JANELA_TOKENS)
+
+        Returns:
+            Tupla (system_prompt, mensagens), com system_prompt None se nunca
+            definido e mensagens como (role, content, tokens) em ordem cronológica
+        """
+        with self._trava:
+            self.commit()  # Inclui as escritas ainda na fila
+            sessao = self._conexao.execute(
+                "SELECT system_prompt, inicio_seq FROM sessoes WHERE id = ?", (sessao_id,)
+            ).fetchone()
+            if sessao is None:
+                return None, []
+            system_prompt, inicio_seq = sessao
+
+            sql = ("SELECT role, content, tokens FROM mensagens WHERE sessao_id = ? AND seq >= ? "
+                   "ORDER BY seq DESC")
+            parametros = [sessao_id, inicio_seq]
+            if max_mensagens:
+                sql += " LIMIT ?"
+                parametros.append(max_mensagens)
+
+            mensagens = []
+            total_tokens = 0
+            for role, content, tokens in self._conexao.execute(sql, parametros):
+                if max_tokens and mensagens and total_tokens + tokens > max_tokens:
+                    break
+                mensagens.append((role, content, tokens))
+                total_tokens += tokens
+
+        mensagens.reverse()
+        # Não começa no meio de um par (resposta sem a pergunta)
+        while mensagens and mensagens[0][0] != "user":
+            mensagens.pop(0)
+        return system_prompt, mensagens
+
+    def existe(self, sessao_id: str) -> bool:
+        with self._trava:
+            self.commit()
+            return self._conexao.execute("SELECT 1 FROM sessoes WHERE id = ?", (sessao_id,)).fetchone() is not None
+
+    def sessoes(self) -> List[str]:
+        """Ids das sessões gravadas, da atualizada mais recentemente para a mais antiga"""
+        with self._trava:
+            self.commit()
+            return [linha[0] for linha in
+                    self._conexao.execute("SELECT id FROM sessoes ORDER BY atualizada_em DESC")]
+
+    def commit(self):
+        """
+        Grava imediatamente as escritas da fila, em uma única transação.
+
+        IMMEDIATE reserva a escrita já no início; outras conexões só esperam
+        durante a gravação. Se ela falhar (ex: banco travado por outro
+        processo além do timeout), as escritas voltam para a fila.
+        """
+        with self._trava:
+            if not self._fila or self.fechado:
+                return
+            fila, self._fila = self._fila, []
+            pendentes, self._pendentes = self._pendentes, 0
+            try:
+                self._conexao.execute("BEGIN IMMEDIATE")
+                for funcao, argumentos in fila:
+                    funcao(*argumentos)
+                self._conexao.execute("COMMIT")
+            except BaseException:
+                if self._conexao.in_transaction:
+                    self._conexao.execute("ROLLBACK")
+                self._fila[:0] = fila
+                self._pendentes += pendentes
+                raise
+
+    def fechar(self):
+        """Confirma o que estiver pendente e fecha a conexão"""
+        with self._trava:
+            if self.fechado:
+                return
+            self.commit()
+            self.fechado = True
+            self._conexao.close()
+        self._acordar.set()
+        self._thread.join()
+        atexit.unregister(self.fechar)
+
+    def _executar(self):
+        """Thread de commits em lote: confirma as escritas até intervalo_commit segundos depois"""
+        while not self.fechado:
+            self._acordar.wait()
+            self._acordar.clear()
+            if self.fechado:
+                return
+            time.sleep(self.intervalo_commit)
+            try:
+                self.commit()
+            except sqlite3.Error:
+                self._acordar.set()  # Escritas de volta na fila: nova tentativa no próximo intervalo
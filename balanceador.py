@@ -0,0 +1,320 @@
+"""
+Balanceador - Distribui as requisições entre vários endpoints compatíveis
+
+Com várias réplicas compatíveis com a API da OpenAI (ex: vLLM/Ollama locais e
+um provedor em nuvem como reserva), OPENAI_BASE_URLS lista os endpoints com
+seus pesos e o Balanceador escolhe, a cada requisição, para onde enviá-la,
+sem um proxy externo:
+
+- Menor carga ponderada: pontuação = (requisições em andamento + 1) x
+  latência média (EWMA) / peso; vence a menor
+- Ejeção: após BALANCEADOR_FALHAS_EJECAO falhas seguidas (conexão, timeout,
+  429 ou 5xx), o endpoint fica fora da rotação por BALANCEADOR_TEMPO_EJECAO
+  segundos; depois disso volta à rotação, mas uma única nova falha o ejeta
+  de novo (até um sucesso zerar a contagem)
+- Verificação de saúde: uma thread consulta GET /models em cada endpoint a
+  cada BALANCEADOR_INTERVALO_SAUDE segundos; um endpoint ejetado que responde
+  volta à rotação antes do prazo
+- Afinidade: cada sessão tende a continuar no mesmo endpoint (aproveitando o
+  cache de prefixo da réplica), enquanto ele estiver saudável e sua
+  pontuação não passar de FATOR_AFINIDADE vezes a melhor
+- Se todos estiverem ejetados, usa o que sai da ejeção primeiro (nenhuma
+  requisição fica sem destino)
+
+Todos os endpoints devem servir o modelo de OPENAI_MODEL. A chave de API é
+OPENAI_API_KEY, ou a variável indicada no terceiro campo do endpoint.
+
+Configurações opcionais do .env:
+    OPENAI_BASE_URLS: Endpoints no formato "url|peso[|VARIAVEL_DA_CHAVE],..."
+                      (ex: http://10.0.0.5:8000/v1|3,http://10.0.0.6:8000/v1|3,https://x.openai.azure.com/openai/v1|1|AZURE_API_KEY)
+    BALANCEADOR_FALHAS_EJECAO: Falhas seguidas até a ejeção. Padrão: 3
+    BALANCEADOR_TEMPO_EJECAO: Segundos fora da rotação. Padrão: 30
+    BALANCEADOR_INTERVALO_SAUDE: Segundos entre verificações (0 desativa). Padrão: 10
+    BALANCEADOR_AFINIDADE: true para manter cada sessão no mesmo endpoint. Padrão: true
+
+Uso no terminal (estado e verificação de saúde dos endpoints do .env):
+    python balanceador.py
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List
+
+from configuracao import ConfiguracaoChat, carregar_configuracao
+from limitador import classificar_erro
+
+# Peso da observação mais recente na latência média (EWMA)
+ALFA_EWMA = 0.3
+
+# O endpoint da sessão é mantido enquanto sua pontuação for até este múltiplo da melhor
+FATOR_AFINIDADE = 2.0
+
+# Sessões lembradas pela afinidade (as mais antigas são esquecidas)
+MAX_AFINIDADES = 10000
+
+# Limite de tempo da verificação de saúde de cada endpoint
+TIMEOUT_SAUDE = 5.0
+
+_abertos: Dict[tuple, "Balanceador"] = {}
+_trava_abertos = threading.Lock()
+
+
+def obter_balanceador(config: ConfiguracaoChat) -> "Balanceador":
+    """
+    Retorna o balanceador compartilhado do processo para os endpoints da
+    configuração (a carga e a saúde de cada endpoint valem para todas as sessões).
+    """
+    chave = (config.base_urls, config.api_key)
+    with _trava_abertos:
+        balanceador = _abertos.get(chave)
+        if balanceador is None:
+            balanceador = _abertos[chave] = Balanceador(config)
+        return balanceador
+
+
+class Endpoint:
+    """Estado de um endpoint: carga, latência média, falhas e clientes da API"""
+
+    def __init__(self, url: str, peso: float, api_key: str):
+        self.url = url
+        self.peso = peso
+        self.api_key = api_key
+        self.em_andamento = 0
+        self.latencia = None  # EWMA, em segundos (None até a primeira resposta)
+        self.falhas_seguidas = 0
+        self.ejetado_ate = 0.0
+        self.requisicoes = 0
+        self.falhas = 0
+        self.ejecoes = 0
+        self._clientes = {}  # assincrono -> cliente
+
+    def saudavel(self, agora: float) -> bool:
+        return self.ejetado_ate <= agora
+
+    def pontuacao(self, latencia_padrao: float) -> float:
+        """Menor é melhor: carga x latência média / peso"""
+        return (self.em_andamento + 1) * (self.latencia or latencia_padrao) / self.peso
+
+    def resumo(self, agora: float) -> Dict:
+        return {
+            "url": self.url,
+            "peso": self.peso,
+            "saudavel": self.saudavel(agora),
+            "em_andamento": self.em_andamento,
+            "latencia_media": round(self.latencia, 4) if self.latencia is not None else None,
+            "requisicoes": self.requisicoes,
+            "falhas": self.falhas,
+            "ejecoes": self.ejecoes,
+        }
+
+
+class Requisicao:
+    """Uma requisição em andamento em um endpoint (ver Balanceador.iniciar)"""
+
+    __slots__ = ("balanceador", "endpoint", "inicio", "_respondida", "_concluida")
+
+    def __init__(self, balanceador: "Balanceador", endpoint: Endpoint):
+        self.balanceador = balanceador
+        self.endpoint = endpoint
+        self.inicio = time.perf_counter()
+        self._respondida = False
+        self._concluida = False
+
+    def respondida(self):
+        """Registra a chegada da resposta (ou do início do streaming) na latência média"""
+        if not self._respondida:
+            self._respondida = True
+            self.balanceador._registrar_latencia(self.endpoint, time.perf_counter() - self.inicio)
+
+    def concluir(self, erro: Exception = None):
+        """Libera o endpoint; com erro, conta a falha se ela for do endpoint (e não da requisição)"""
+        if not self._concluida:
+            self._concluida = True
+            self.balanceador._concluir(self.endpoint, erro)
+
+    def descartar(self):
+        """Libera o endpoint sem registrar resultado (requisição cancelada antes de responder)"""
+        if not self._concluida:
+            self._concluida = True
+            self.balanceador._liberar(self.endpoint)
+
+
+class Balanceador:
+    """Escolhe o endpoint de cada requisição entre os de OPENAI_BASE_URLS"""
+
+    def __init__(self, config: ConfiguracaoChat = None, iniciar_verificacao: bool = True):
+        """
+        Args:
+            config: Configuração com base_urls e os parâmetros do balanceador.
+                   Se None, usa a configuração do .env (carregada uma única vez).
+            iniciar_verificacao: Se False, não inicia a thread de verificação de saúde
+        """
+        if config is None:
+            config = carregar_configuracao()
+        if not config.base_urls:
+            raise ValueError("OPENAI_BASE_URLS não configurada: informe ao menos um endpoint")
+        self.config = config
+        self.endpoints: List[Endpoint] = [
+            Endpoint(url, peso, (os.getenv(variavel) if variavel else None) or config.api_key)
+            for url, peso, variavel in config.base_urls
+        ]
+        self._afinidades: "OrderedDict[str, Endpoint]" = OrderedDict()
+        self._trava = threading.Lock()
+
+        self._parar = threading.Event()
+        self._thread = None
+        if iniciar_verificacao and config.balanceador_intervalo_saude > 0:
+            self._thread = threading.Thread(target=self._verificar_periodicamente, daemon=True,
+                                            name="balanceador-saude")
+            self._thread.start()
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def cliente(self, endpoint: Endpoint, assincrono: bool = False):
+        """
+        Cliente da API do endpoint (um por endpoint e modo, criado no primeiro uso).
+
+        Sem retentativas internas do SDK: as retentativas do chat escolhem um novo
+        endpoint a cada tentativa.
+        """
+        cliente = endpoint._clientes.get(assincrono)
+        if cliente is None:
+            import httpx
+            from openai import AsyncOpenAI, OpenAI
+
+            limites = httpx.Limits(max_connections=self.config.pool_max_conexoes,
+                                   max_keepalive_connections=min(self.config.pool_max_ociosas,
+                                                                 self.config.pool_max_conexoes))
+            if assincrono:
+                cliente = AsyncOpenAI(api_key=endpoint.api_key, base_url=endpoint.url, max_retries=0,
+                                      http_client=httpx.AsyncClient(limits=limites))
+            else:
+                cliente = OpenAI(api_key=endpoint.api_key, base_url=endpoint.url, max_retries=0,
+                                 http_client=httpx.Client(limits=limites))
+            cliente = endpoint._clientes.setdefault(assincrono, cliente)
+        return cliente
+
+    def escolher(self, sessao_id: str = None, evitar: Endpoint = None) -> Endpoint:
+        """
+        Escolhe o endpoint da próxima requisição.
+
+        Args:
+            sessao_id: Sessão que fará a requisição (para a afinidade)
+            evitar: Endpoint a evitar, se houver outro saudável (ex: o que acabou de falhar)
+        """
+        with self._trava:
+            agora = time.monotonic()
+            candidatos = [e for e in self.endpoints if e.saudavel(agora) and e is not evitar]
+            if not candidatos:
+                candidatos = [e for e in self.endpoints if e.saudavel(agora)]
+            if not candidatos:
+                # Todos ejetados: o que volta primeiro recebe a requisição de teste
+                return min(self.endpoints, key=lambda e: e.ejetado_ate)
+
+            conhecidas = [e.latencia for e in self.endpoints if e.latencia is not None]
+            latencia_padrao = sum(conhecidas) / len(conhecidas) if conhecidas else 1.0
+            melhor = min(candidatos, key=lambda e: e.pontuacao(latencia_padrao))
+
+            if sessao_id is None or not self.config.balanceador_afinidade:
+                return melhor
+            atual = self._afinidades.get(sessao_id)
+            if (atual is not None and atual in candidatos
+                    and atual.pontuacao(latencia_padrao) <= FATOR_AFINIDADE * melhor.pontuacao(latencia_padrao)):
+                self._afinidades.move_to_end(sessao_id)
+                return atual
+            self._afinidades[sessao_id] = melhor
+            self._afinidades.move_to_end(sessao_id)
+            while len(self._afinidades) > MAX_AFINIDADES:
+                self._afinidades.popitem(last=False)
+            return melhor
+
+    def iniciar(self, sessao_id: str = None, evitar: Endpoint = None) -> Requisicao:
+        """Escolhe o endpoint e registra uma requisição em andamento nele"""
+        endpoint = self.escolher(sessao_id, evitar)
+        with self._trava:
+            endpoint.em_andamento += 1
+            endpoint.requisicoes += 1
+        return Requisicao(self, endpoint)
+
+    def _registrar_latencia(self, endpoint: Endpoint, segundos: float):
+        with self._trava:
+            if endpoint.latencia is None:
+                endpoint.latencia = segundos
+            else:
+                endpoint.latencia = ALFA_EWMA * segundos + (1 - ALFA_EWMA) * endpoint.latencia
+
+    def _liberar(self, endpoint: Endpoint):
+        with self._trava:
+            endpoint.em_andamento -= 1
+
+    def _concluir(self, endpoint: Endpoint, erro: Exception = None):
+        self._liberar(endpoint)
+        if erro is None:
+            self._registrar_sucesso(endpoint)
+        elif classificar_erro(erro)[0]:
+            # Apenas erros temporários indicam problema no endpoint (400/401 são da requisição)
+            self._registrar_falha(endpoint)
+
+    def _registrar_sucesso(self, endpoint: Endpoint):
+        with self._trava:
+            endpoint.falhas_seguidas = 0
+            endpoint.ejetado_ate = 0.0
+
+    def _registrar_falha(self, endpoint: Endpoint):
+        with self._trava:
+            endpoint.falhas += 1
+            endpoint.falhas_seguidas += 1
+            if endpoint.falhas_seguidas >= self.config.balanceador_falhas_ejecao:
+                if endpoint.saudavel(time.monotonic()):
+                    endpoint.ejecoes += 1
+                endpoint.ejetado_ate = time.monotonic() + self.config.balanceador_tempo_ejecao
+
+    def verificar_saude(self) -> Dict[str, bool]:
+        """
+        Consulta GET /models em cada endpoint: sucesso devolve o endpoint à
+        rotação, falha conta como falha seguida.
+
+        Returns:
+            {url: respondeu}
+        """
+        resultado = {}
+        for endpoint in self.endpoints:
+            try:
+                self.cliente(endpoint).with_options(timeout=TIMEOUT_SAUDE).models.list()
+                self._registrar_sucesso(endpoint)
+                resultado[endpoint.url] = True
+            except Exception:
+                self._registrar_falha(endpoint)
+                resultado[endpoint.url] = False
+        return resultado
+
+    def _verificar_periodicamente(self):
+        while not self._parar.wait(self.config.balanceador_intervalo_saude):
+            self.verificar_saude()
+
+    def resumo(self) -> List[Dict]:
+        """Estado de cada endpoint (ex: para debug_memoria)"""
+        agora = time.monotonic()
+        with self._trava:
+            return [endpoint.resumo(agora) for endpoint in self.endpoints]
+
+    def fechar(self):
+        """Para a verificação de saúde e fecha os clientes síncronos"""
+        self._parar.set()
+        for endpoint in self.endpoints:
+            cliente = endpoint._clientes.pop(False, None)
+            if cliente is not None:
+                cliente.close()
+
+
+if __name__ == "__main__":
+    balanceador = Balanceador(iniciar_verificacao=False)
+    saude = balanceador.verificar_saude()
+    print(f"\n{len(balanceador)} endpoints:\n")
+    for endpoint in balanceador.endpoints:
+        print(f"  {'✓' if saude[endpoint.url] else '✗'} {endpoint.url} (peso {endpoint.peso:g})")
+    print()
+    balanceador.fechar()
@@ -0,0 +1,92 @@
+"""
+Benchmark - Custo por turno da contagem de tokens
+
+Mede o tempo gasto na contabilidade local de um turno (contagem antes,
+adição das mensagens, sliding window, contagem depois e alertas) com
+históricos de 10 a 100.000 mensagens, sem chamar a API.
+
+Com a contagem incremental o custo por turno deve permanecer constante,
+enquanto a recontagem completa (coluna "recontagem") cresce com o histórico.
+
+As colunas "janela pares" e "janela tokens" medem o mesmo turno com o
+histórico cheio, de modo que cada turno descarta o par mais antigo
+(JANELA_MAX e JANELA_TOKENS); com o deque esse custo também é constante.
+
+Uso:
+    python benchmarks/bench_contagem_tokens.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Valores mínimos para construir o chat sem arquivo .env (nenhuma chamada à API é feita)
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("OPENAI_MODEL", "gpt-4o-mini")
+os.environ.setdefault("OPENAI_TEMPERATURE", "0.7")
+os.environ.setdefault("OPENAI_MAX_TOKENS", "1000")
+
+from chat_openai_memoria import ChatComMemoria
+
+TAMANHOS = [10, 100, 1_000, 10_000, 100_000]
+TURNOS = 200
+MENSAGEM = "Como funcionam as listas em Python? " * 4
+RESPOSTA = "Listas são sequências mutáveis que aceitam elementos de qualquer tipo. " * 6
+
+
+def _criar_chat(tamanho: int, **opcoes) -> ChatComMemoria:
+    """Cria um chat com histórico pré-carregado de `tamanho` mensagens"""
+    chat = ChatComMemoria(limite_maximo=10**12, modo_debug=False, exibir_banner=False, **opcoes)
+    mensagens = []
+    for i in range(tamanho):
+        role = "user" if i % 2 == 0 else "assistant"
+        mensagens.append({"role": role, "content": MENSAGEM if role == "user" else RESPOSTA})
+    chat.historico = mensagens
+    return chat
+
+
+def medir_turno(tamanho: int, **opcoes) -> float:
+    """Retorna o tempo médio (µs) da contabilidade local de um turno"""
+    chat = _criar_chat(tamanho, **opcoes)
+    inicio = time.perf_counter()
+    for _ in range(TURNOS):
+        chat.contar_tokens_aproximado()
+        chat.adicionar_mensagem("user", MENSAGEM)
+        chat.adicionar_mensagem("assistant", RESPOSTA)
+        chat._aplicar_janela_deslizante()
+        tokens = chat.contar_tokens_aproximado()
+        chat._verificar_tokens(tokens)
+    return (time.perf_counter() - inicio) / TURNOS * 1e6
+
+
+def medir_recontagem(tamanho: int) -> float:
+    """Retorna o tempo médio (µs) de recontar o histórico inteiro, como antes"""
+    chat = _criar_chat(tamanho)
+    repeticoes = max(1, TURNOS // max(1, tamanho // 1000))
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        sum(len(msg["content"]) for msg in chat.historico) // 4
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+
+def _orcamento_tokens(tamanho: int) -> int:
+    """Orçamento de JANELA_TOKENS que comporta exatamente o histórico inicial"""
+    chat = _criar_chat(tamanho)
+    return chat.contar_tokens_aproximado() + chat._tokens_system_prompt()
+
+
+def main():
+    print(f"{'mensagens':>10} | {'turno (µs)':>12} | {'recontagem (µs)':>16} | "
+          f"{'janela pares (µs)':>18} | {'janela tokens (µs)':>19}")
+    print("-" * 88)
+    for tamanho in TAMANHOS:
+        pares = medir_turno(tamanho, tamanho_janela=tamanho // 2)
+        tokens = medir_turno(tamanho, janela_tokens=_orcamento_tokens(tamanho))
+        print(f"{tamanho:>10} | {medir_turno(tamanho):>12.2f} | {medir_recontagem(tamanho):>16.2f} | "
+              f"{pares:>18.2f} | {tokens:>19.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark - Tempo de inicialização (cold start)
+
+Mede, em interpretadores novos, o tempo de:
+    1. importar chat_openai_memoria
+    2. construir um ChatComMemoria
+    3. criar o cliente da API (primeiro acesso a chat.client, que importa o SDK)
+
+O SDK da OpenAI (e httpx/pydantic) só deve ser importado na etapa 3; a coluna
+"SDK carregado" confirma que as etapas 1 e 2 não o importam.
+
+Uso:
+    python benchmarks/bench_inicializacao.py [repeticoes]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Executado em um processo novo a cada repetição
+SCRIPT = r"""
+import json, os, sys, time
+sys.path.insert(0, os.getcwd())
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("OPENAI_MODEL", "gpt-4o-mini")
+os.environ.setdefault("OPENAI_TEMPERATURE", "0.7")
+os.environ.setdefault("OPENAI_MAX_TOKENS", "1000")
+
+t0 = time.perf_counter()
+from chat_openai_memoria import ChatComMemoria
+t1 = time.perf_counter()
+chat = ChatComMemoria(modo_debug=False, exibir_banner=False)
+t2 = time.perf_counter()
+sdk_construcao = "openai" in sys.modules
+chat.client
+t3 = time.perf_counter()
+
+print(json.dumps({
+    "importacao": (t1 - t0) * 1000,
+    "construcao": (t2 - t1) * 1000,
+    "primeiro_cliente": (t3 - t2) * 1000,
+    "sdk_carregado_na_construcao": sdk_construcao,
+}))
+"""
+
+
+def medir(repeticoes: int) -> dict:
+    """Executa o script em processos novos e retorna as medianas (ms)"""
+    amostras = []
+    for _ in range(repeticoes):
+        saida = subprocess.run(
+            [sys.executable, "-c", SCRIPT],
+            cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout
+        amostras.append(json.loads(saida.strip().splitlines()[-1]))
+
+    resultado = {
+        etapa: statistics.median(a[etapa] for a in amostras)
+        for etapa in ("importacao", "construcao", "primeiro_cliente")
+    }
+    resultado["sdk_carregado_na_construcao"] = any(a["sdk_carregado_na_construcao"] for a in amostras)
+    return resultado
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    resultado = medir(repeticoes)
+
+    print(f"Mediana de {repeticoes} processos (ms)\n")
+    print(f"  Importação do módulo:      {resultado['importacao']:8.2f}")
+    print(f"  Construção do chat:        {resultado['construcao']:8.2f}")
+    print(f"  Criação do cliente (SDK):  {resultado['primeiro_cliente']:8.2f}")
+    print(f"\n  SDK carregado antes do primeiro envio: "
+          f"{'sim' if resultado['sdk_carregado_na_construcao'] else 'não'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark - Memória ocupada pelo histórico
+
+Compara, com tracemalloc, os bytes alocados por mensagem em três
+representações do histórico (o texto das mensagens é compartilhado e não
+entra na conta):
+
+    dict          {"role": ..., "content": ...} comum
+    dict+tokens   subclasse de dict com __slots__ = ("tokens",) (representação anterior)
+    Mensagem      registro com __slots__ e role internado (atual)
+
+E estima o total para muitas sessões residentes, o cenário em que essa
+diferença domina o uso de memória (RSS) do processo.
+
+Uso:
+    python benchmarks/bench_memoria_historico.py [sessoes] [mensagens_por_sessao]
+"""
+
+import os
+import sys
+import tracemalloc
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from chat_openai_memoria import Mensagem
+
+CONTEUDO = "Como funcionam as listas em Python? " * 4
+
+
+class MensagemDict(dict):
+    """Representação anterior: dict com a contagem de tokens em um slot"""
+    __slots__ = ("tokens",)
+
+    def __init__(self, role, content, tokens):
+        super().__init__(role=role, content=content)
+        self.tokens = tokens
+
+
+def _role(i: int) -> str:
+    # Roles montados em tempo de execução, como os lidos de JSON ou banco
+    # (não são as constantes internadas do código-fonte)
+    return "".join(["user"] if i % 2 == 0 else ["assis", "tant"])
+
+
+FABRICAS = {
+    "dict": lambda i: {"role": _role(i), "content": CONTEUDO},
+    "dict+tokens": lambda i: MensagemDict(_role(i), CONTEUDO, 37),
+    "Mensagem": lambda i: Mensagem(_role(i), CONTEUDO, 37),
+}
+
+
+def medir(fabrica, sessoes: int, mensagens: int) -> int:
+    """Retorna os bytes alocados para `sessoes` históricos de `mensagens` mensagens"""
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    historicos = [deque(fabrica(i) for i in range(mensagens)) for _ in range(sessoes)]
+    depois = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del historicos
+    return depois - antes
+
+
+def main():
+    sessoes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    mensagens = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+
+    print(f"{sessoes} sessões x {mensagens} mensagens\n")
+    print(f"{'representação':>14} | {'bytes/mensagem':>15} | {'total (MiB)':>12}")
+    print("-" * 48)
+    for nome, fabrica in FABRICAS.items():
+        total = medir(fabrica, sessoes, mensagens)
+        print(f"{nome:>14} | {total / (sessoes * mensagens):>15.1f} | {total / 2**20:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Benchmark - Sobrecarga por turno contra o servidor mock
+
+Executa turnos completos de ChatComMemoria (SDK da OpenAI e HTTP de verdade)
+contra um ServidorMock local, apontado por OPENAI_BASE_URL, com históricos
+de 10 a 100.000 mensagens. Para cada turno separa:
+
+    local   processamento do chat antes e depois da chamada: contagem de
+            tokens, montagem das mensagens, sliding window, alertas e log
+            (métrica chat_tempo_local_segundos)
+    api     chamada ao SDK: serialização da requisição, HTTP, servidor mock
+            (inclusive a latência simulada) e leitura da resposta
+    turno   tempo total de enviar_mensagem(), medido por fora
+
+Sem sliding window, cada turno envia o histórico inteiro e a coluna api cresce
+com ele: o SDK valida e converte cada mensagem antes de serializar a
+requisição. Com 10.000 mensagens ou mais a execução leva alguns minutos;
+use --tamanhos para uma medição rápida.
+
+Cenários:
+    padrao  sem sliding window e sem log de debug
+    janela  histórico cheio (JANELA_MAX = metade do tamanho): cada turno
+            descarta o par mais antigo
+    debug   MODO_DEBUG com LOG_MODO=delta (no modo completo o log cresce
+            quadraticamente com o histórico)
+    stream  enviar_mensagem_stream(), consumindo todos os trechos
+
+Os resultados são gravados em JSON; com --comparar, cada medida é comparada
+com a de uma execução anterior (ex: do branch principal) e o script termina
+com código 1 se alguma piorar mais que a tolerância.
+
+Uso:
+    python benchmarks/bench_turno_mock.py [opções]
+
+    --tamanhos 10,100,1000     Tamanhos do histórico (padrão: 10 a 100000)
+    --cenarios padrao,stream   Cenários executados (padrão: todos)
+    --turnos N                 Turnos medidos por tamanho (padrão: 100; no mínimo 3 e até
+                               50000 mensagens enviadas por tamanho nos históricos grandes)
+    --latencia S               Latência do mock em segundos (padrão: 0)
+    --intervalo-stream S       Atraso entre trechos do streaming (padrão: 0)
+    --tamanho-resposta N       Caracteres de cada resposta (padrão: 400)
+    --sem-uso                  Respostas sem usage (contagem apenas local)
+    --saida ARQUIVO            JSON de resultados (padrão: benchmarks/resultados/turno_mock.json)
+    --comparar ARQUIVO         JSON de referência para detectar regressões
+    --tolerancia F             Piora relativa aceita (padrão: 0.25 = 25%)
+
+Exemplo (referência no branch principal, depois a comparação no branch da mudança):
+    python benchmarks/bench_turno_mock.py --saida base.json
+    python benchmarks/bench_turno_mock.py --comparar base.json
+
+Requer o pacote openai (requirements.txt); nenhuma chamada à API real é feita.
+"""
+
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, RAIZ)
+
+# Valores mínimos para construir o chat sem arquivo .env
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("OPENAI_MODEL", "gpt-4o-mini")
+os.environ.setdefault("OPENAI_TEMPERATURE", "0.7")
+os.environ.setdefault("OPENAI_MAX_TOKENS", "1000")
+
+from chat_openai_memoria import ChatComMemoria
+from configuracao import carregar_configuracao
+from metricas import RegistroMetricas
+from servidor_mock import ServidorMock
+
+TAMANHOS = [10, 100, 1_000, 10_000, 100_000]
+CENARIOS = ["padrao", "janela", "debug", "stream"]
+MENSAGEM = "Como funcionam as listas em Python? " * 4
+RESPOSTA = "Listas são sequências mutáveis que aceitam elementos de qualquer tipo. " * 6
+
+# Total de mensagens enviadas por tamanho: limita os turnos nos históricos
+# grandes (mínimo de MIN_TURNOS), cujo custo é dominado pela serialização
+MENSAGENS_POR_TAMANHO = 50_000
+MIN_TURNOS = 3
+
+# Diferenças absolutas menores que isso (ms) não contam como regressão (ruído)
+MINIMO_REGRESSAO_MS = 0.05
+
+
+def _opcao(nome: str, padrao=None):
+    """Valor de `--nome VALOR` na linha de comando (padrao se ausente)"""
+    if nome in sys.argv[:-1]:
+        return sys.argv[sys.argv.index(nome) + 1]
+    return padrao
+
+
+def _configuracao(servidor: ServidorMock):
+    """Configuração do .env apontada para o mock, sem recursos que mudam o turno"""
+    os.environ["OPENAI_BASE_URL"] = servidor.base_url
+    carregar_configuracao.cache_clear()
+    return carregar_configuracao().com(
+        exibir_banner=False, limite_maximo=10**12, log_modo="delta",
+        memoria_resumo=False, memoria_semantica=False, armazenamento_sqlite=None, log_binario=None,
+        cache_respostas=False, limite_rpm=None, limite_tpm=None, base_urls=(), hedge=False,
+    )
+
+
+def _criar_chat(config, tamanho: int, cenario: str) -> ChatComMemoria:
+    """Cria um chat com histórico pré-carregado de `tamanho` mensagens"""
+    chat = ChatComMemoria(
+        config=config,
+        modo_debug=cenario == "debug",
+        tamanho_janela=tamanho // 2 if cenario == "janela" else None,
+    )
+    mensagens = []
+    for i in range(tamanho):
+        role = "user" if i % 2 == 0 else "assistant"
+        mensagens.append({"role": role, "content": MENSAGEM if role == "user" else RESPOSTA})
+    chat.historico = mensagens
+    return chat
+
+
+def _turno(chat: ChatComMemoria, cenario: str, i: int):
+    mensagem = f"{i} {MENSAGEM}"  # Mensagens distintas, como em uma conversa real
+    if cenario == "stream":
+        for _ in chat.enviar_mensagem_stream(mensagem):
+            pass
+    else:
+        chat.enviar_mensagem(mensagem)
+
+
+def _restaurar_tamanho(chat: ChatComMemoria, tamanho: int):
+    """Remove as mensagens adicionadas pelo turno (fora da medição): cada turno vê o mesmo histórico"""
+    while len(chat.historico) > tamanho:
+        mensagem = chat._historico.pop()
+        chat._total_chars -= len(mensagem.content)
+        chat._total_tokens -= mensagem.tokens
+
+
+def medir(config, servidor: ServidorMock, tamanho: int, cenario: str, turnos: int) -> dict:
+    """Executa os turnos de um cenário e retorna as medidas (ms)"""
+    chat = _criar_chat(config, tamanho, cenario)
+    _turno(chat, cenario, -1)  # Aquecimento: conexão HTTP e primeiros imports do SDK
+    _restaurar_tamanho(chat, tamanho)
+    chat.metricas = RegistroMetricas()
+    chat._iniciar_metricas()
+
+    duracoes = []
+    for i in range(turnos):
+        inicio = time.perf_counter()
+        _turno(chat, cenario, i)
+        duracoes.append(time.perf_counter() - inicio)
+        _restaurar_tamanho(chat, tamanho)
+    servidor.requisicoes.clear()  # O mock guarda cada corpo recebido
+
+    local = chat._m_tempo_local
+    api = chat._m_latencia_api
+    duracoes.sort()
+    return {
+        "turnos": turnos,
+        "local_p50_ms": local.percentil(50) * 1000,
+        "local_p95_ms": local.percentil(95) * 1000,
+        "api_p50_ms": api.percentil(50) * 1000,
+        "turno_p50_ms": statistics.median(duracoes) * 1000,
+        "turno_p95_ms": duracoes[min(len(duracoes) - 1, int(len(duracoes) * 0.95))] * 1000,
+    }
+
+
+def comparar(resultado: dict, base: dict, tolerancia: float) -> list:
+    """
+    Compara as medidas com as da execução de referência.
+
+    Returns:
+        Lista de regressões (cenario, tamanho, medida, base, atual)
+    """
+    regressoes = []
+    print(f"\nComparação com {base['data']} (tolerância: {tolerancia:.0%})\n")
+    print(f"{'cenário':>8} | {'mensagens':>10} | {'medida':>13} | {'base (ms)':>10} | "
+          f"{'atual (ms)':>10} | {'variação':>9}")
+    print("-" * 76)
+    for cenario, tamanhos in resultado["resultados"].items():
+        for tamanho, medidas in tamanhos.items():
+            referencia = base["resultados"].get(cenario, {}).get(tamanho)
+            if referencia is None:
+                continue
+            for medida, atual in medidas.items():
+                if not medida.endswith("_ms") or medida not in referencia:
+                    continue
+                anterior = referencia[medida]
+                variacao = (atual - anterior) / anterior if anterior else 0.0
+                piorou = variacao > tolerancia and atual - anterior > MINIMO_REGRESSAO_MS
+                if piorou:
+                    regressoes.append((cenario, tamanho, medida, anterior, atual))
+                print(f"{cenario:>8} | {tamanho:>10} | {medida:>13} | {anterior:>10.3f} | "
+                      f"{atual:>10.3f} | {variacao:>+8.0%}{' ⚠️' if piorou else ''}")
+    return regressoes
+
+
+def main():
+    tamanhos = [int(t) for t in _opcao("--tamanhos", ",".join(map(str, TAMANHOS))).split(",")]
+    cenarios = _opcao("--cenarios", ",".join(CENARIOS)).split(",")
+    turnos = int(_opcao("--turnos", 100))
+    saida = _opcao("--saida", os.path.join(RAIZ, "benchmarks", "resultados", "turno_mock.json"))
+    arquivo_base = _opcao("--comparar")
+    tolerancia = float(_opcao("--tolerancia", 0.25))
+    mock = {
+        "latencia": float(_opcao("--latencia", 0.0)),
+        "intervalo_stream": float(_opcao("--intervalo-stream", 0.0)),
+        "tamanho_resposta": int(_opcao("--tamanho-resposta", 400)),
+        "incluir_uso": "--sem-uso" not in sys.argv,
+    }
+    invalidos = set(cenarios) - set(CENARIOS)
+    if invalidos:
+        sys.exit(f"Cenários desconhecidos: {', '.join(sorted(invalidos))} (use {', '.join(CENARIOS)})")
+    saida = os.path.abspath(saida)
+
+    resultado = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "mock": mock,
+        "resultados": {},
+    }
+    servidor = ServidorMock(**mock).iniciar()
+    diretorio_original = os.getcwd()
+    try:
+        config = _configuracao(servidor)
+        resultado["contador_tokens"] = config.tipo_contador_tokens
+        print(f"Servidor mock em {servidor.base_url} (latência {mock['latencia']}s, "
+              f"respostas de {mock['tamanho_resposta']} caracteres, "
+              f"usage {'sim' if mock['incluir_uso'] else 'não'})\n")
+        print(f"{'cenário':>8} | {'mensagens':>10} | {'turnos':>6} | {'local p50':>10} | "
+              f"{'local p95':>10} | {'api p50':>9} | {'turno p50':>10} | {'turno p95':>10}")
+        print("-" * 92)
+        with tempfile.TemporaryDirectory() as temporario:
+            os.chdir(temporario)  # logs/ do cenário debug
+            for cenario in cenarios:
+                for tamanho in tamanhos:
+                    n = max(MIN_TURNOS, min(turnos, MENSAGENS_POR_TAMANHO // tamanho))
+                    # Os alertas do modo debug são impressos (o custo conta), mas fora do terminal
+                    with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+                        medidas = medir(config, servidor, tamanho, cenario, n)
+                    resultado["resultados"].setdefault(cenario, {})[str(tamanho)] = medidas
+                    print(f"{cenario:>8} | {tamanho:>10} | {n:>6} | {medidas['local_p50_ms']:>10.3f} | "
+                          f"{medidas['local_p95_ms']:>10.3f} | {medidas['api_p50_ms']:>9.3f} | "
+                          f"{medidas['turno_p50_ms']:>10.3f} | {medidas['turno_p95_ms']:>10.3f}")
+            os.chdir(diretorio_original)
+    finally:
+        os.chdir(diretorio_original)
+        servidor.parar()
+
+    os.makedirs(os.path.dirname(saida), exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados (ms) gravados em {saida}")
+
+    if arquivo_base:
+        with open(arquivo_base, encoding="utf-8") as f:
+            base = json.load(f)
+        if base.get("mock") != mock or base.get("contador_tokens") != resultado["contador_tokens"]:
+            print("\n⚠️  A referência usou outra configuração do mock ou do contador de tokens")
+        regressoes = comparar(resultado, base, tolerancia)
+        if regressoes:
+            print(f"\n{len(regressoes)} regressão(ões) acima de {tolerancia:.0%}")
+            sys.exit(1)
+        print("\nSem regressões")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Cache de Respostas - Reaproveita respostas de requisições idênticas
+
+Fluxos roteirizados (bots de onboarding, listas fixas de perguntas como em
+exemplo_programatico) enviam muitas vezes exatamente a mesma requisição:
+mesmo modelo, temperature, max_tokens, system prompt e histórico. Com o
+cache, a partir da segunda vez a resposta sai da memória (ou do disco), sem
+latência nem custo de API.
+
+A chave é um hash SHA-256 do modelo, temperature, max_tokens e da lista
+completa de mensagens enviada (incluindo resumo e trechos recuperados). Faz
+mais sentido com OPENAI_TEMPERATURE=0, em que a resposta da API já é
+praticamente determinística.
+
+- Memória: LRU limitado a max_itens entradas, cada uma válida por ttl segundos
+- Disco (opcional): tabela SQLite consultada quando a memória não tem a
+  chave; sobrevive a reinícios e é compartilhada entre processos
+
+Configurações opcionais do .env:
+    CACHE_RESPOSTAS: true para ativar. Padrão: false
+    CACHE_MAX_ITENS: Respostas mantidas em memória. Padrão: 1000
+    CACHE_TTL: Segundos de validade de cada resposta (0 = sem expiração). Padrão: 3600
+    CACHE_ARQUIVO: Banco SQLite do nível em disco (ex: dados/cache.db). Sem ele, apenas memória
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Mapping, Optional
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS respostas (
+    chave TEXT PRIMARY KEY,
+    resposta TEXT NOT NULL,
+    expira_em REAL
+) WITHOUT ROWID;
+"""
+
+_abertos: Dict[tuple, "CacheRespostas"] = {}
+_trava_abertos = threading.Lock()
+
+
+def obter_cache(max_itens: int = 1000, ttl: float = 3600, arquivo: str = None) -> "CacheRespostas":
+    """
+    Retorna o cache compartilhado do processo para essa configuração (todas as
+    sessões aproveitam as respostas umas das outras).
+    """
+    chave = (max_itens, ttl, os.path.abspath(arquivo) if arquivo else None)
+    with _trava_abertos:
+        cache = _abertos.get(chave)
+        if cache is None:
+            cache = _abertos[chave] = CacheRespostas(max_itens, ttl, arquivo)
+        return cache
+
+
+def calcular_chave(modelo: str, temperature: float, max_tokens: int,
+                   mensagens: Iterable[Mapping[str, str]]) -> str:
+    """
+    Hash da requisição, calculado incrementalmente (sem serializar o histórico).
+
+    Cada campo é prefixado pelo tamanho, então conteúdos diferentes nunca
+    produzem a mesma sequência de bytes.
+    """
+    h = hashlib.sha256(json.dumps([modelo, temperature, max_tokens]).encode("utf-8"))
+    for msg in mensagens:
+        for campo in (msg["role"], msg["content"]):
+            dados = campo.encode("utf-8")
+            h.update(b"%d:" % len(dados))
+            h.update(dados)
+    return h.hexdigest()
+
+
+class CacheRespostas:
+    """Cache LRU com expiração (TTL) e nível opcional em disco (SQLite)"""
+
+    def __init__(self, max_itens: int = 1000, ttl: float = 3600, arquivo: str = None):
+        """
+        Args:
+            max_itens: Máximo de respostas em memória (as menos usadas saem primeiro)
+            ttl: Segundos de validade de cada resposta (0 ou None = sem expiração)
+            arquivo: Banco SQLite do nível em disco (o diretório é criado se necessário)
+        """
+        if max_itens <= 0:
+            raise ValueError(f"max_itens deve ser maior que 0, recebido: {max_itens}")
+        self.max_itens = max_itens
+        self.ttl = ttl or None
+        self.arquivo = arquivo
+
+        self._itens: "OrderedDict[str, tuple]" = OrderedDict()  # chave -> (resposta, expira_em)
+        self._trava = threading.Lock()
+
+        self.acertos_memoria = 0
+        self.acertos_disco = 0
+        self.falhas = 0
+        self.expirados = 0
+        self.removidos = 0  # Saídas da memória por limite de tamanho (LRU)
+
+        self._conexao = None
+        if arquivo:
+            diretorio = os.path.dirname(arquivo)
+            if diretorio:
+                os.makedirs(diretorio, exist_ok=True)
+            self._conexao = sqlite3.connect(arquivo, check_same_thread=False, isolation_level=None)
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.execute("PRAGMA synchronous=NORMAL")
+            self._conexao.executescript(_ESQUEMA)
+
+    def __len__(self) -> int:
+        return len(self._itens)
+
+    @property
+    def acertos(self) -> int:
+        return self.acertos_memoria + self.acertos_disco
+
+    @property
+    def taxa_acerto(self) -> float:
+        """Fração das consultas respondidas pelo cache (0.0 sem consultas)"""
+        consultas = self.acertos + self.falhas
+        return self.acertos / consultas if consultas else 0.0
+
+    def obter(self, chave: str) -> Optional[str]:
+        """Retorna a resposta guardada para a chave, ou None (ausente ou expirada)"""
+        agora = time.time()
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is not None:
+                resposta, expira_em = item
+                if expira_em is None or expira_em > agora:
+                    self._itens.move_to_end(chave)
+                    self.acertos_memoria += 1
+                    return resposta
+                del self._itens[chave]
+                self.expirados += 1
+
+            if self._conexao is not None:
+                linha = self._conexao.execute(
+                    "SELECT resposta, expira_em FROM respostas WHERE chave = ?", (chave,)
+                ).fetchone()
+                if linha is not None:
+                    resposta, expira_em = linha
+                    if expira_em is None or expira_em > agora:
+                        self._guardar_memoria(chave, resposta, expira_em)
+                        self.acertos_disco += 1
+                        return resposta
+                    self._conexao.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+                    self.expirados += 1
+
+            self.falhas += 1
+            return None
+
+    def guardar(self, chave: str, resposta: str):
+        """Guarda a resposta na memória e, se configurado, no disco"""
+        expira_em = time.time() + self.ttl if self.ttl else None
+        with self._trava:
+            self._guardar_memoria(chave, resposta, expira_em)
+            if self._conexao is not None:
+                self._conexao.execute(
+                    "INSERT OR REPLACE INTO respostas (chave, resposta, expira_em) VALUES (?, ?, ?)",
+                    (chave, resposta, expira_em)
+                )
+
+    def _guardar_memoria(self, chave: str, resposta: str, expira_em: Optional[float]):
+        self._itens[chave] = (resposta, expira_em)
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.max_itens:
+            self._itens.popitem(last=False)
+            self.removidos += 1
+
+    def remover_expirados(self) -> int:
+        """Remove as respostas expiradas da memória e do disco; retorna quantas saíram"""
+        agora = time.time()
+        with self._trava:
+            vencidas = [chave for chave, (_, expira_em) in self._itens.items()
+                        if expira_em is not None and expira_em <= agora]
+            for chave in vencidas:
+                del self._itens[chave]
+            removidas = len(vencidas)
+            if self._conexao is not None:
+                removidas += self._conexao.execute(
+                    "DELETE FROM respostas WHERE expira_em IS NOT NULL AND expira_em <= ?", (agora,)
+                ).rowcount
+            self.expirados += removidas
+            return removidas
+
+    def limpar(self):
+        """Descarta todas as respostas (memória e disco)"""
+        with self._trava:
+            self._itens.clear()
+            if self._conexao is not None:
+                self._conexao.execute("DELETE FROM respostas")
+
+    def resumo(self) -> Dict[str, float]:
+        """Estatísticas do cache (ex: para debug_memoria ou exportação)"""
+        return {
+            "itens": len(self._itens),
+            "max_itens": self.max_itens,
+            "acertos_memoria": self.acertos_memoria,
+            "acertos_disco": self.acertos_disco,
+            "falhas": self.falhas,
+            "expirados": self.expirados,
+            "removidos": self.removidos,
+            "taxa_acerto": round(self.taxa_acerto, 4),
+        }
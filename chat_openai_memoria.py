@@ -5,22 +5,315 @@ Este script demonstra como criar um chat interativo com a API da OpenAI
 mantendo o histórico completo de conversas (memória).
 """
 
+import asyncio
+import io
+import json
 import os
-from openai import OpenAI
-from typing import List, Dict
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import nullcontext
+from collections.abc import Mapping, Sequence
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as TempoEsgotado, wait
+from itertools import chain, islice
+from typing import List, Dict, Deque, Iterator, AsyncIterator
 from datetime import datetime
-from dotenv import load_dotenv
+from armazenamento_sqlite import ArmazenamentoSQLite, obter_armazenamento
+from balanceador import Balanceador, Requisicao, obter_balanceador
+from cache_respostas import CacheRespostas, calcular_chave, obter_cache
+from configuracao import ConfiguracaoChat, carregar_configuracao
+from contador_tokens import ContadorTokens, criar_contador
+from ganchos import Ganchos
+from limitador import LimitadorTaxa, calcular_espera, classificar_erro, obter_limitador
+from log_binario import LogBinario
+from log_debug import EscritorLog
+from memoria_resumo import ResumidorMemoria
+from metricas import BUCKETS_PROPORCAO, BUCKETS_RAPIDOS, RegistroMetricas
+from perfilador import Perfilador
 
 
-class ChatComMemoria:
-    """Classe para gerenciar chat com memória usando OpenAI API
-       Todas as configurações são carregadas do arquivo .env"""
+# Janela (pares) usada pelas memórias de resumo e semântica quando nenhuma janela foi configurada
+JANELA_PADRAO_MEMORIA = 8
+
+# Threads das requisições com hedge (HEDGE=true) no modo síncrono, compartilhadas pelas
+# sessões; criadas apenas na primeira requisição com hedge (ver _obter_executor_hedge)
+_executor_hedge = None
+_trava_executor_hedge = threading.Lock()
+
+
+class ErroAPI(Exception):
+    """
+    Falha na chamada à API, após as retentativas.
+    
+    A mensagem do usuário do turno com erro não fica no histórico: a sessão
+    continua consistente e a mesma mensagem pode ser enviada de novo.
+    
+    Attributes:
+        status: Status HTTP da resposta (None em falhas de conexão e timeouts)
+        repetivel: Se o erro é temporário (ex: 429, 5xx), isto é, se vale tentar mais tarde
+        tentativas: Quantas vezes a requisição foi enviada
+    """
+    
+    def __init__(self, mensagem: str, status: int = None, repetivel: bool = False, tentativas: int = 1):
+        super().__init__(mensagem)
+        self.status = status
+        self.repetivel = repetivel
+        self.tentativas = tentativas
+
+
+class Mensagem(Mapping):
+    """
+    Mensagem do histórico, compacta.
+    
+    Registro com __slots__ (sem o dict por instância) que se comporta como o
+    mapeamento {"role": ..., "content": ...} esperado pela API: pode ser
+    enviado diretamente em messages=, sem conversão a cada turno. O role é
+    internado (uma única string compartilhada por todas as mensagens) e a
+    contagem de tokens é calculada uma única vez ao entrar no histórico.
+    """
+    __slots__ = ("role", "content", "tokens")
+    
+    _CHAVES = ("role", "content")
+    
+    def __init__(self, role: str, content: str, tokens: int):
+        self.role = sys.intern(role)
+        self.content = content
+        self.tokens = tokens
+    
+    def __getitem__(self, chave: str) -> str:
+        if chave == "role":
+            return self.role
+        if chave == "content":
+            return self.content
+        raise KeyError(chave)
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._CHAVES)
+    
+    def __len__(self) -> int:
+        return 2
+    
+    def __repr__(self) -> str:
+        return f"Mensagem(role={self.role!r}, content={self.content!r}, tokens={self.tokens})"
+    
+    def como_dict(self) -> Dict[str, str]:
+        """Cópia como dict comum (ex: para serializar em JSON)"""
+        return {"role": self.role, "content": self.content}
+
+
+class Prompt:
+    """
+    Mensagens de um envio à API: mensagens system + histórico, sem copiar o histórico.
+    
+    Visão sobre o deque do histórico que pode ser percorrida várias vezes
+    (retentativas, hedge, chave do cache, ganchos) e é aceita diretamente em
+    messages=. Reflete o histórico atual: vale apenas durante o turno.
+    """
+    __slots__ = ("prefixo", "historico", "antes_da_ultima")
+    
+    def __init__(self, prefixo: list, historico: Deque[Mensagem], antes_da_ultima: dict = None):
+        """
+        Args:
+            prefixo: Mensagens system enviadas antes do histórico
+            historico: Histórico da sessão (não copiado)
+            antes_da_ultima: Mensagem inserida logo antes da última do histórico
+                             (trechos recuperados com CONTEXTO_ESTAVEL)
+        """
+        self.prefixo = prefixo
+        self.historico = historico
+        self.antes_da_ultima = antes_da_ultima
+    
+    def __iter__(self) -> Iterator[Mapping]:
+        if self.antes_da_ultima is None or not self.historico:
+            return chain(self.prefixo, self.historico)
+        return chain(self.prefixo, islice(self.historico, len(self.historico) - 1),
+                     (self.antes_da_ultima, self.historico[-1]))
+    
+    def __len__(self) -> int:
+        return len(self.prefixo) + len(self.historico) + (self.antes_da_ultima is not None)
+    
+    def __repr__(self) -> str:
+        return f"Prompt({len(self)} mensagens)"
+
+
+class VisaoHistorico(Sequence):
+    """
+    Visão somente leitura do histórico (chat.historico), sem copiar o deque.
+    
+    Aceita o mesmo que a lista de antes para leitura: len(), iteração, índices
+    e fatias (historico[-4:] devolve uma lista). Para alterar o histórico,
+    atribua uma nova lista a chat.historico ou use adicionar_mensagem().
+    """
+    __slots__ = ("_mensagens",)
+    
+    def __init__(self, mensagens: Deque[Mensagem]):
+        self._mensagens = mensagens
+    
+    def __getitem__(self, indice):
+        if not isinstance(indice, slice):
+            return self._mensagens[indice]
+        total = len(self._mensagens)
+        inicio, fim, passo = indice.indices(total)
+        if passo != 1:
+            return list(self._mensagens)[indice]
+        if inicio >= fim:
+            return []
+        if inicio < total - fim:
+            return list(islice(self._mensagens, inicio, fim))
+        # Fatia perto do fim (ex: [-4:]): percorre o deque de trás para frente
+        fatia = list(islice(reversed(self._mensagens), total - fim, total - inicio))
+        fatia.reverse()
+        return fatia
+    
+    def __len__(self) -> int:
+        return len(self._mensagens)
+    
+    def __iter__(self) -> Iterator[Mensagem]:
+        return iter(self._mensagens)
+    
+    def __reversed__(self) -> Iterator[Mensagem]:
+        return reversed(self._mensagens)
+    
+    def __eq__(self, outro) -> bool:
+        if isinstance(outro, (VisaoHistorico, list, tuple, deque)):
+            return len(self) == len(outro) and all(a == b for a, b in zip(self, outro))
+        return NotImplemented
+    
+    def __repr__(self) -> str:
+        return f"VisaoHistorico({list(self._mensagens)!r})"
+
+
+def _uso_tokens(usage) -> tuple:
+    """
+    Extrai (prompt, resposta, em cache) do objeto usage da API.
+    
+    Campos ausentes (ex: APIs compatíveis que não informam cache) contam como 0.
+    """
+    if usage is None:
+        return 0, 0, 0
+    detalhes = getattr(usage, "prompt_tokens_details", None)
+    cache = getattr(detalhes, "cached_tokens", None) if detalhes is not None else None
+    return (getattr(usage, "prompt_tokens", None) or 0,
+            getattr(usage, "completion_tokens", None) or 0,
+            cache or 0)
+
+
+def _fechar_stream(stream):
+    """Fecha o streaming (e a conexão HTTP); sem efeito se já foi consumido até o fim"""
+    fechar = getattr(stream, "close", None)
+    if fechar is not None:
+        fechar()
+
+
+async def _fechar_stream_async(stream):
+    """Versão assíncrona de _fechar_stream()"""
+    fechar = getattr(stream, "aclose", None) or getattr(stream, "close", None)
+    if fechar is not None:
+        await fechar()
+
+
+def _acompanhar_stream(stream, requisicao: Requisicao) -> Iterator:
+    """Repassa o streaming e libera o endpoint do balanceador ao final (ou no erro)"""
+    try:
+        for chunk in stream:
+            yield chunk
+    except Exception as e:
+        requisicao.concluir(e)
+        raise
+    finally:
+        _fechar_stream(stream)
+        requisicao.concluir()
+
+
+async def _acompanhar_stream_async(stream, requisicao: Requisicao) -> AsyncIterator:
+    """Versão assíncrona de _acompanhar_stream()"""
+    try:
+        async for chunk in stream:
+            yield chunk
+    except Exception as e:
+        requisicao.concluir(e)
+        raise
+    finally:
+        await _fechar_stream_async(stream)
+        requisicao.concluir()
+
+
+def _com_primeiro_trecho(primeiro, stream, iterador) -> Iterator:
+    """Repassa o trecho já lido (ver ChatComMemoria._criar) e o restante do streaming"""
+    try:
+        if primeiro is not None:
+            yield primeiro
+        yield from iterador
+    finally:
+        _fechar_stream(stream)
+
+
+async def _com_primeiro_trecho_async(primeiro, stream, iterador) -> AsyncIterator:
+    """Versão assíncrona de _com_primeiro_trecho()"""
+    try:
+        if primeiro is not None:
+            yield primeiro
+        async for chunk in iterador:
+            yield chunk
+    finally:
+        await _fechar_stream_async(stream)
+
 
-    def __init__(self, tamanho_janela: int = None, limite_maximo: int = None, modo_debug: bool = None):
+def _obter_executor_hedge() -> ThreadPoolExecutor:
+    """Pool de threads do hedge síncrono, criado no primeiro uso"""
+    global _executor_hedge
+    if _executor_hedge is None:
+        with _trava_executor_hedge:
+            if _executor_hedge is None:
+                _executor_hedge = ThreadPoolExecutor(max_workers=64, thread_name_prefix="hedge")
+    return _executor_hedge
+
+
+def _descartar_perdedora(futuro, requisicao: Requisicao = None):
+    """
+    Descarta a requisição que perdeu a disputa do hedge (modo síncrono).
+    
+    Um streaming é fechado assim que possível; uma chamada sem streaming não
+    pode ser interrompida e tem a resposta ignorada quando terminar.
+    """
+    futuro.cancel()
+    
+    def _ao_terminar(f):
+        if f.cancelled():
+            # Nem chegou a ser enviada: nada a registrar no balanceador
+            if requisicao is not None:
+                requisicao.descartar()
+            return
+        erro = f.exception()
+        if erro is None:
+            resposta = f.result()[0]
+            if hasattr(resposta, "close") and not hasattr(resposta, "choices"):
+                resposta.close()
+        if requisicao is not None:
+            requisicao.concluir(erro)
+    
+    futuro.add_done_callback(_ao_terminar)
+
+
+class ChatMemoriaBase:
+    """Núcleo comum dos chats com memória (configuração, histórico, sliding window,
+       monitoramento de tokens e logging). As subclasses definem o cliente e o envio.
+       Todas as configurações são carregadas do arquivo .env (ver ConfiguracaoChat)"""
+
+    def __init__(self, tamanho_janela: int = None, limite_maximo: int = None, modo_debug: bool = None,
+                 contador_tokens: ContadorTokens = None, client=None, config: ConfiguracaoChat = None,
+                 exibir_banner: bool = None, metricas: RegistroMetricas = None, janela_tokens: int = None,
+                 memoria_resumo: bool = None, memoria_semantica: bool = None, sessao_id: str = None,
+                 armazenamento: ArmazenamentoSQLite = None, log_binario: LogBinario = None,
+                 cache: CacheRespostas = None, contexto_estavel: bool = None,
+                 limitador: LimitadorTaxa = None, balanceador: Balanceador = None, ganchos: Ganchos = None):
         """
         Inicializa o chat com memória.
 
-        Todas as configurações básicas são carregadas do arquivo .env
+        Todas as configurações básicas são carregadas do arquivo .env (uma única vez
+        por processo, ver configuracao.carregar_configuracao)
         O sistema falhará se qualquer variável obrigatória estiver faltando ou inválida.
         
         Args:
@@ -30,133 +323,309 @@ class ChatComMemoria:
                           Se None, carrega de LIMITE_MAXIMO no .env. Se ainda None, desabilita monitoramento.
             modo_debug: Se True, gera logs detalhados em logs/chat_debug_TIMESTAMP.log.
                        Se None, carrega de MODO_DEBUG no .env. Padrão: False.
+            contador_tokens: Contador usado para medir cada mensagem.
+                            Se None, usa CONTADOR_TOKENS do .env ('bpe' ou 'aproximado'). Padrão: 'bpe'.
+            client: Cliente da API já configurado, compartilhado entre sessões (ver GerenciadorSessoes).
+                   Se None, cada instância cria o próprio cliente.
+            config: Configuração a usar (ex: compartilhada ou ajustada com config.com(...)).
+                   Se None, usa a configuração do .env, carregada uma única vez.
+            exibir_banner: Se False, não imprime as configurações ao inicializar. Padrão: True.
+            metricas: Registro onde cada turno grava latência e uso de tokens.
+                     Se None, cada instância cria o próprio (ver GerenciadorSessoes
+                     para um registro compartilhado entre sessões).
+            janela_tokens: Orçamento de tokens do contexto (system prompt + histórico) mantido
+                          entre turnos; os pares mais antigos são descartados para respeitá-lo.
+                          Se None, carrega de JANELA_TOKENS no .env. Se ainda None, desabilitado.
+            memoria_resumo: Se True, as mensagens removidas pelo sliding window entram em um
+                           resumo gerado em segundo plano (ver memoria_resumo.py).
+                           Se None, carrega de MEMORIA_RESUMO no .env. Padrão: False.
+            memoria_semantica: Se True, os turnos removidos pelo sliding window são indexados
+                              e os mais relevantes voltam ao prompt (ver memoria_semantica.py).
+                              Se None, carrega de MEMORIA_SEMANTICA no .env. Padrão: False.
+            sessao_id: Identificador da sessão. Com armazenamento, uma sessão já gravada
+                      com esse id é retomada (ver armazenamento_sqlite.py).
+                      Se None, um id novo é gerado.
+            armazenamento: Onde gravar cada turno concluído.
+                          Se None, usa ARMAZENAMENTO_SQLITE do .env. Se ainda None, nada é persistido.
+            log_binario: Log binário com o histórico completo da sessão (ver log_binario.py).
+                        Se None, usa LOG_BINARIO do .env (um log por sessao_id). Se ainda None, desabilitado.
+            cache: Cache de respostas para requisições idênticas (ver cache_respostas.py).
+                  Se None e CACHE_RESPOSTAS=true no .env, usa o cache compartilhado do processo.
+            contexto_estavel: Se True, o início do prompt é mantido idêntico entre turnos para
+                             aproveitar o cache de prompt do provedor (a janela remove blocos
+                             inteiros, ver CONTEXTO_FOLGA). Se None, carrega de CONTEXTO_ESTAVEL no .env.
+            limitador: Limite de requisições e tokens por minuto (ver limitador.py).
+                      Se None e LIMITE_RPM/LIMITE_TPM no .env, usa o limitador compartilhado do processo.
+            balanceador: Distribui as chamadas de chat entre vários endpoints (ver balanceador.py).
+                        Se None e OPENAI_BASE_URLS no .env, usa o balanceador compartilhado do processo.
+            ganchos: Callbacks chamados nas fases de cada turno (ver ganchos.py).
+                    Se None, cada instância cria os próprios (chat.ganchos), sem callbacks.
         """
-        # Carregar .env OBRIGATORIAMENTE
-        load_dotenv()
-
-        # Validar API Key
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        if not self.api_key:
-            raise ValueError(
-                "OPENAI_API_KEY não configurada. "
-                "Crie o arquivo .env com: OPENAI_API_KEY=sua-chave-aqui"
-            )
-
-        # Validar Modelo
-        self.modelo = os.getenv("OPENAI_MODEL")
-        if not self.modelo:
-            raise ValueError(
-                "OPENAI_MODEL não configurada. "
-                "Adicione no arquivo .env: OPENAI_MODEL=gpt-4o-mini"
-            )
-
-        # Validar Temperature
-        temp_str = os.getenv("OPENAI_TEMPERATURE")
-        if not temp_str:
-            raise ValueError(
-                "OPENAI_TEMPERATURE não configurada. "
-                "Adicione no arquivo .env: OPENAI_TEMPERATURE=0.7"
-            )
-        try:
-            self.temperature = float(temp_str)
-            if not 0.0 <= self.temperature <= 2.0:
-                raise ValueError(f"OPENAI_TEMPERATURE deve estar entre 0.0 e 2.0, recebido: {self.temperature}")
-        except ValueError as e:
-            if "could not convert" in str(e):
-                raise ValueError(
-                    f"OPENAI_TEMPERATURE inválida: '{temp_str}'. "
-                    f"Use um número entre 0.0 e 2.0"
-                ) from e
-            raise
-
-        # Validar Max Tokens
-        tokens_str = os.getenv("OPENAI_MAX_TOKENS")
-        if not tokens_str:
-            raise ValueError(
-                "OPENAI_MAX_TOKENS não configurada. "
-                "Adicione no arquivo .env: OPENAI_MAX_TOKENS=1000"
-            )
-        try:
-            self.max_tokens = int(tokens_str)
-            if self.max_tokens <= 0:
-                raise ValueError(f"OPENAI_MAX_TOKENS deve ser maior que 0, recebido: {self.max_tokens}")
-        except ValueError as e:
-            if "invalid literal" in str(e):
-                raise ValueError(
-                    f"OPENAI_MAX_TOKENS inválida: '{tokens_str}'. "
-                    f"Use um número inteiro positivo"
-                ) from e
-            raise
-
-        # Validar Base URL (opcional)
-        self.base_url = os.getenv("OPENAI_BASE_URL")
-        if self.base_url:
-            # Validar formato básico de URL
-            if not (self.base_url.startswith("http://") or self.base_url.startswith("https://")):
-                raise ValueError(
-                    f"OPENAI_BASE_URL inválida: '{self.base_url}'. "
-                    f"A URL deve começar com http:// ou https://"
-                )
-
-        # Configurações opcionais de gerenciamento de memória
-        # Prioridade: parâmetro do construtor > .env > None (desabilitado)
-        
-        # Sliding Window
-        if tamanho_janela is None:
-            janela_env = os.getenv("JANELA_MAX")
-            self.tamanho_janela = int(janela_env) if janela_env else None
-        else:
-            self.tamanho_janela = tamanho_janela
-        
-        # Monitoramento de tokens
-        if limite_maximo is None:
-            limite_env = os.getenv("LIMITE_MAXIMO")
-            self.limite_maximo = int(limite_env) if limite_env else None
-        else:
-            self.limite_maximo = limite_maximo
-        
-        # Modo debug
-        if modo_debug is None:
-            debug_env = os.getenv("MODO_DEBUG", "false").lower()
-            self.modo_debug = debug_env == "true"
-        else:
-            self.modo_debug = modo_debug
-        
-        # Inicializar cliente
-        if self.base_url:
-            self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
-        else:
-            self.client = OpenAI(api_key=self.api_key)
-        self.historico = []
+        # Configuração lida e validada uma única vez por processo (ou fornecida pelo chamador)
+        # Prioridade: parâmetro do construtor > config > .env > None (desabilitado)
+        if config is None:
+            config = carregar_configuracao()
+        self.config = config.com(
+            tamanho_janela=tamanho_janela,
+            janela_tokens=janela_tokens,
+            limite_maximo=limite_maximo,
+            modo_debug=modo_debug,
+            exibir_banner=exibir_banner,
+            memoria_resumo=memoria_resumo,
+            memoria_semantica=memoria_semantica,
+            contexto_estavel=contexto_estavel
+        )
+        
+        self.api_key = self.config.api_key
+        self.modelo = self.config.modelo
+        self.temperature = self.config.temperature
+        self.max_tokens = self.config.max_tokens
+        # Com vários endpoints (OPENAI_BASE_URLS), o cliente padrão (resumo, embeddings) usa o primeiro
+        self.base_url = self.config.base_url or (self.config.base_urls[0][0] if self.config.base_urls else None)
+        self.tamanho_janela = self.config.tamanho_janela
+        self.janela_tokens = self.config.janela_tokens
+        self.limite_maximo = self.config.limite_maximo
+        self.modo_debug = self.config.modo_debug
+        self.contexto_estavel = self.config.contexto_estavel
+        
+        # As memórias de resumo e semântica dependem do sliding window para saber o que guardar
+        if ((self.config.memoria_resumo or self.config.memoria_semantica)
+                and not (self.tamanho_janela or self.janela_tokens)):
+            self.tamanho_janela = JANELA_PADRAO_MEMORIA
+        
+        # Contador de tokens (tokenizador carregado apenas na primeira contagem)
+        if contador_tokens is None:
+            contador_tokens = criar_contador(self.modelo, self.config.tipo_contador_tokens)
+        self.contador_tokens = contador_tokens
+        
+        # Cliente compartilhado, ou criado apenas no primeiro envio (ver propriedade client)
+        self._client = client
+        # deque: o sliding window remove do início em O(1), sem copiar o restante
+        self._historico: Deque[Mensagem] = deque()
+        # Totais acumulados do histórico (O(1) por consulta)
+        self._total_chars = 0
+        self._total_tokens = 0
         self.system_prompt = "Você é um assistente útil e amigável."
+        self._system_prompt_contado = (None, 0)  # (texto, tokens) da última contagem
+        self.contexto_fixo = None  # Enviado logo após o system prompt (ver fixar_contexto)
+        self._contexto_fixo_contado = (None, 0)
+        self._prefixo_prompt = ((), [])  # (textos, mensagens system) do último prompt montado
         
         # Controle de logging
         self.arquivo_log = None
+        self._escritor_log = None
+        self.arquivo_deltas = None
+        self._escritor_deltas = None
         self.contador_interacoes = 0
+        self.ultimo_tempo_primeiro_token = None  # Segundos até o primeiro token do último streaming
+        self.ultimos_tempos: Dict[str, float] = {}  # Segundos de cada fase do último turno
+        self.ganchos = ganchos if ganchos is not None else Ganchos()
+        
+        # Métricas por turno (latência, tempo local e uso real de tokens da API)
+        self.metricas = metricas if metricas is not None else RegistroMetricas()
+        self._iniciar_metricas()
+        
+        # Resumo das mensagens removidas pelo sliding window (gerado em segundo plano)
+        self._resumidor = None
+        self._tokens_resumo = 0
+        if self.config.memoria_resumo:
+            self._resumidor = ResumidorMemoria(
+                self._cliente_auxiliar,
+                self.config.resumo_modelo or self.modelo,
+                max_tokens=self.config.resumo_max_tokens,
+                metricas=self.metricas,
+                ao_atualizar=self._ao_atualizar_resumo
+            )
+        
+        # Identifica a sessão no armazenamento, nos logs binários e nos índices semânticos
+        self.sessao_id = sessao_id or uuid.uuid4().hex
+        
+        # Índice dos turnos removidos, consultado a cada envio (numpy importado só se ativo)
+        self._memoria_semantica = None
+        if self.config.memoria_semantica:
+            from memoria_semantica import EmbedderLocal, EmbedderOpenAI, MemoriaSemantica
+            
+            if self.config.embeddings_modelo == "local":
+                embedder = EmbedderLocal()
+            else:
+                embedder = EmbedderOpenAI(self._cliente_auxiliar, self.config.embeddings_modelo)
+            # Um índice por sessão, como o log binário: sessões não recuperam umas às outras
+            self._memoria_semantica = MemoriaSemantica(
+                embedder,
+                top_k=self.config.semantica_top_k,
+                arquivo=(os.path.join(self.config.semantica_diretorio, self.sessao_id)
+                         if self.config.semantica_diretorio else None)
+            )
+            self._m_recuperacao = self.metricas.histograma(
+                "chat_memoria_semantica_segundos",
+                "Duração da recuperação na memória semântica (embeddings + busca)"
+            )
+        
+        # Respostas reaproveitadas entre requisições idênticas (compartilhado entre sessões)
+        if cache is None and self.config.cache_respostas:
+            cache = obter_cache(self.config.cache_max_itens, self.config.cache_ttl, self.config.cache_arquivo)
+        self._cache = cache
+        
+        # Limite de taxa compartilhado pelas sessões do processo (RPM/TPM)
+        if limitador is None and (self.config.limite_rpm or self.config.limite_tpm):
+            limitador = obter_limitador(self.config.limite_rpm, self.config.limite_tpm)
+        self._limitador = limitador
+        self._cliente_sem_retentativas = (None, None)  # (cliente, cópia com max_retries=0)
+        
+        # Vários endpoints (OPENAI_BASE_URLS): o balanceador escolhe o de cada requisição
+        if balanceador is None and self.config.base_urls:
+            balanceador = obter_balanceador(self.config)
+        self._balanceador = balanceador
+        
+        # Sessão persistente: retoma do banco as mensagens que cabem na janela
+        # Serializa turnos da mesma sessão disparados em paralelo (ex: GerenciadorSessoes.transmitir)
+        self.trava_turno = self._criar_trava()
+        if armazenamento is None and self.config.armazenamento_sqlite:
+            armazenamento = obter_armazenamento(self.config.armazenamento_sqlite,
+                                                self.config.armazenamento_intervalo_commit)
+        self._armazenamento = armazenamento
+        # Histórico completo em disco; em memória fica apenas a janela
+        if log_binario is None and self.config.log_binario:
+            log_binario = LogBinario(os.path.join(self.config.log_binario, self.sessao_id),
+                                     sincronizar=self.config.log_binario_fsync)
+        self._log_binario = log_binario
+        if self._armazenamento is not None or (self._log_binario is not None and self._log_binario.total):
+            self._retomar_sessao()
         
         # Inicializar arquivo de log se modo debug ativo
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         if self.modo_debug:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             self.arquivo_log = f"logs/chat_debug_{timestamp}.log"
+            if self.config.log_modo == "delta":
+                self.arquivo_deltas = f"logs/chat_debug_{timestamp}.deltas.jsonl"
             self._inicializar_log()
+            if self._historico:
+                self.registrar_snapshot()
+        
+        # Perfil dos turnos (MODO_PROFILE), gravado ao lado do log de debug
+        self._perfilador = None
+        if self.config.modo_profile:
+            prefixo = self.arquivo_log[:-len(".log")] if self.arquivo_log else f"logs/chat_profile_{timestamp}"
+            self._perfilador = Perfilador(self.config.modo_profile, prefixo)
 
-        # Mensagem com configurações REAIS do .env
+        if self.config.exibir_banner:
+            self._exibir_banner()
+    
+    def _exibir_banner(self):
+        """Exibe as configurações REAIS em uso pela sessão"""
         print(f"Chat inicializado com modelo: {self.modelo}")
         print(f"Temperature: {self.temperature}")
         print(f"Max Tokens: {self.max_tokens}")
-        print(f"Memoria ativa: histórico será mantido durante a sessão")
+        print("Memoria ativa: histórico será mantido durante a sessão")
         
         # Informar configurações de gerenciamento
-        if self.base_url:
+        if self._balanceador is not None:
+            print(f"Endpoints: {', '.join(endpoint.url for endpoint in self._balanceador.endpoints)}")
+        elif self.base_url:
             print(f"Base URL: {self.base_url}")
         if self.tamanho_janela:
             print(f"Sliding Window: {self.tamanho_janela} pares de mensagens")
+        if self.janela_tokens:
+            print(f"Sliding Window por tokens: {self.janela_tokens} tokens de contexto")
+        if self.contexto_estavel:
+            print(f"Contexto estável: remoção em blocos de {self.config.contexto_folga:.0%} da janela")
         if self.limite_maximo:
             print(f"Monitoramento: limite de {self.limite_maximo} tokens")
+        if self._armazenamento is not None:
+            print(f"Sessão persistente: {self.sessao_id} em {self._armazenamento.caminho} "
+                  f"({len(self._historico)} mensagens retomadas)")
+        if self._log_binario is not None:
+            print(f"Log binário: {self._log_binario.arquivo_log} ({self._log_binario.total} registros)")
+        if self._cache is not None:
+            print(f"Cache de respostas: até {self._cache.max_itens} em memória"
+                  + (f" + disco ({self._cache.arquivo})" if self._cache.arquivo else ""))
+        if self._resumidor:
+            print(f"Memória de resumo: ativa (modelo {self._resumidor.modelo})")
+        if self._memoria_semantica:
+            print(f"Memória semântica: top {self._memoria_semantica.top_k}, "
+                  f"embeddings {self._memoria_semantica.embedder.descricao}")
         if self.modo_debug:
             print(f"Modo Debug: logs em {self.arquivo_log}")
+        if self._perfilador is not None:
+            print(f"Perfil ({self._perfilador.modo}): {self._perfilador.resumo()['arquivo']}")
         print()
     
+    @property
+    def client(self):
+        """
+        Cliente da API.
+        
+        O SDK da OpenAI só é importado, e o cliente só é criado, no primeiro
+        acesso (normalmente o primeiro enviar_mensagem). Sessões que nunca
+        enviam mensagens não pagam esse custo.
+        """
+        if self._client is None:
+            self._client = self._criar_cliente()
+        return self._client
+    
+    @client.setter
+    def client(self, client):
+        self._client = client
+    
+    def _criar_cliente(self):
+        """Cria o cliente da API (implementado pelas subclasses)"""
+        raise NotImplementedError
+    
+    def _criar_trava(self):
+        """Trava de turno da sessão (threading.Lock; a versão assíncrona usa asyncio.Lock)"""
+        return threading.Lock()
+    
+    def _retomar_sessao(self):
+        """
+        Carrega o system prompt e as mensagens recentes da sessão, do
+        armazenamento ou, sem ele, do log binário
+        """
+        limites = {
+            "max_mensagens": self.tamanho_janela * 2 if self.tamanho_janela else None,
+            "max_tokens": self.janela_tokens,
+        }
+        if self._armazenamento is not None:
+            system_prompt, mensagens = self._armazenamento.carregar(self.sessao_id, **limites)
+        else:
+            system_prompt, mensagens = self._log_binario.carregar(**limites)
+        if system_prompt is not None:
+            self.system_prompt = system_prompt
+        self._historico = deque(Mensagem(role, content, tokens) for role, content, tokens in mensagens)
+        self._total_chars = sum(len(msg.content) for msg in self._historico)
+        self._total_tokens = sum(msg.tokens for msg in self._historico)
+    
+    def _persistir(self, *mensagens: Mensagem):
+        """Acrescenta mensagens à sessão no armazenamento e no log binário (se configurados)"""
+        registros = [(msg.role, msg.content, msg.tokens) for msg in mensagens]
+        if self._armazenamento is not None:
+            self._armazenamento.anexar(self.sessao_id, registros)
+        if self._log_binario is not None:
+            self._log_binario.anexar(registros)
+    
+    def _persistir_limpeza(self):
+        """Marca no armazenamento e no log binário o início de um novo histórico"""
+        if self._armazenamento is not None:
+            self._armazenamento.limpar(self.sessao_id)
+        if self._log_binario is not None:
+            self._log_binario.limpar()
+    
+    def _cliente_auxiliar(self):
+        """Cliente síncrono usado pelas memórias de resumo e semântica"""
+        return self.client
+    
+    @property
+    def resumo(self) -> str:
+        """Resumo corrente das mensagens já removidas do histórico ('' se não houver)"""
+        return self._resumidor.resumo if self._resumidor else ""
+    
+    def _ao_atualizar_resumo(self, resumo: str):
+        """Chamado pelo worker a cada novo resumo: atualiza a contagem e o log"""
+        self._tokens_resumo = self.contador_tokens.contar(resumo)
+        if self.modo_debug:
+            linha = "─" * 70
+            self._registrar_log(f"\n{linha}\n[RESUMO DA MEMÓRIA ATUALIZADO] ({self._tokens_resumo} tokens)\n"
+                                f"{linha}\n{resumo}\n\n")
+    
     def definir_personalidade(self, prompt: str):
         """
         Define a personalidade do assistente através do system prompt.
@@ -167,137 +636,385 @@ class ChatComMemoria:
         self.system_prompt = prompt
         print(f"Personalidade definida: {prompt[:50]}...\n")
         
+        if self._armazenamento is not None:
+            self._armazenamento.definir_system_prompt(self.sessao_id, prompt)
+        if self._log_binario is not None:
+            self._log_binario.definir_system_prompt(prompt)
+        
         if self.modo_debug:
             self._registrar_log(f"\n{'─'*70}\n[SYSTEM PROMPT ATUALIZADO]\n{'─'*70}\n{prompt}\n")
+            self._registrar_delta("system_prompt", conteudo=prompt)
+    
+    def fixar_contexto(self, texto: str = None):
+        """
+        Fixa um contexto (ex: documentação, regras, catálogo) enviado em todo
+        turno logo após o system prompt, sempre com o mesmo texto.
+        
+        Como o início do prompt não muda, o provedor atende essa parte pelo
+        cache de prompt (ver CONTEXTO_ESTAVEL). Os tokens do contexto fixo
+        contam no orçamento de janela_tokens.
+        
+        Args:
+            texto: Contexto a fixar (None remove o contexto fixo)
+        """
+        self.contexto_fixo = texto or None
+        if self.modo_debug:
+            self._registrar_log(f"\n{'─'*70}\n[CONTEXTO FIXO {'ATUALIZADO' if texto else 'REMOVIDO'}]\n"
+                                f"{'─'*70}\n{texto or ''}\n")
+    
+    def _iniciar_metricas(self):
+        """Cria (ou obtém, se o registro for compartilhado) as métricas de turno"""
+        m = self.metricas
+        self._m_turnos = m.contador("chat_turnos_total", "Turnos concluídos")
+        self._m_erros = m.contador("chat_erros_total", "Turnos com erro na chamada à API")
+        self._m_interrompidos = m.contador("chat_turnos_interrompidos_total",
+                                           "Turnos de streaming abandonados antes do fim da resposta (desfeitos)")
+        self._m_latencia_api = m.histograma("chat_latencia_api_segundos",
+                                            "Duração da chamada à API (até o fim da resposta)")
+        self._m_tempo_local = m.histograma("chat_tempo_local_segundos",
+                                           "Tempo de processamento local do turno (histórico, janela, alertas, log)",
+                                           buckets=BUCKETS_RAPIDOS)
+        self._m_primeiro_token = m.histograma("chat_tempo_primeiro_token_segundos",
+                                              "Tempo até o primeiro token (streaming)")
+        self._m_tokens_prompt = m.contador("chat_tokens_prompt_total", "Tokens de prompt informados pela API")
+        self._m_tokens_resposta = m.contador("chat_tokens_resposta_total", "Tokens de resposta informados pela API")
+        self._m_tokens_cache = m.contador("chat_tokens_cache_total",
+                                          "Tokens de prompt atendidos pelo cache da API")
+        self._m_proporcao_cache = m.histograma("chat_prompt_em_cache_proporcao",
+                                               "Fração dos tokens de prompt atendida pelo cache da API, por turno",
+                                               buckets=BUCKETS_PROPORCAO)
+        self._m_cache_acertos = m.contador("chat_cache_respostas_acertos_total",
+                                           "Turnos respondidos pelo cache de respostas (sem chamar a API)")
+        self._m_cache_falhas = m.contador("chat_cache_respostas_falhas_total",
+                                          "Turnos não encontrados no cache de respostas")
+        self._m_retentativas = m.contador("chat_retentativas_total",
+                                          "Requisições repetidas após erro temporário (429, 5xx, conexão)")
+        self._m_espera_limitador = m.histograma("chat_limitador_espera_segundos",
+                                                "Espera imposta pelo limite de taxa (RPM/TPM) antes de cada requisição")
+        self._m_hedges = m.contador("chat_hedge_total",
+                                    "Requisições duplicadas por demora na primeira resposta (HEDGE)")
+        self._m_hedges_vitorias = m.contador("chat_hedge_vitorias_total",
+                                             "Requisições em que a duplicata respondeu primeiro")
+    
+    def _registrar_metricas_turno(self, latencia_api: float, tempo_local: float, usage=None,
+                                  tempo_primeiro_token: float = None):
+        """
+        Registra as métricas de um turno concluído.
+        
+        Args:
+            latencia_api: Segundos da chamada à API (até o último trecho, em streaming);
+                         None quando não se aplica (ex: turnos da Batch API, ver lote_batch.py)
+            tempo_local: Segundos gastos no processamento local antes e depois da chamada
+            usage: Objeto usage da resposta (None se a API não informou)
+            tempo_primeiro_token: Segundos até o primeiro token (apenas em streaming)
+        """
+        self._m_turnos.incrementar()
+        if latencia_api is not None:
+            self._m_latencia_api.observar(latencia_api)
+        self._m_tempo_local.observar(tempo_local)
+        if tempo_primeiro_token is not None:
+            self._m_primeiro_token.observar(tempo_primeiro_token)
+        
+        prompt, resposta, cache = _uso_tokens(usage)
+        self._m_tokens_prompt.incrementar(prompt)
+        self._m_tokens_resposta.incrementar(resposta)
+        self._m_tokens_cache.incrementar(cache)
+        if prompt:
+            self._m_proporcao_cache.observar(cache / prompt)
     
     def _inicializar_log(self):
         """Inicializa o arquivo de log com cabeçalho visual"""
-        with open(self.arquivo_log, "w", encoding="utf-8") as f:
-            f.write("╔" + "═"*68 + "╗\n")
-            f.write("║" + " "*20 + "CHAT DEBUG LOG" + " "*34 + "║\n")
-            f.write("║" + " "*15 + "Chat OpenAI com Memória" + " "*30 + "║\n")
-            f.write("╚" + "═"*68 + "╝\n\n")
-            f.write(f"Sessão iniciada em: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n")
-            f.write(f"{'═'*70}\n\n")
-            f.write("CONFIGURAÇÕES DA SESSÃO:\n")
-            f.write(f"  • Modelo: {self.modelo}\n")
-            f.write(f"  • Temperature: {self.temperature}\n")
-            f.write(f"  • Max Tokens: {self.max_tokens}\n")
-            f.write(f"  • System Prompt: {self.system_prompt}\n")
-            
-            if self.tamanho_janela:
-                f.write(f"  • Sliding Window: {self.tamanho_janela} pares de mensagens\n")
-            else:
-                f.write(f"  • Sliding Window: Desabilitado\n")
-            
-            if self.limite_maximo:
-                f.write(f"  • Monitoramento: {self.limite_maximo} tokens (máximo)\n")
-                f.write(f"    - 🟢 Verde: 0-{self.limite_maximo//3} tokens (0-33%)\n")
-                f.write(f"    - 🟡 Amarelo: {self.limite_maximo//3}-{(self.limite_maximo*2)//3} tokens (33-66%)\n")
-                f.write(f"    - 🟠 Laranja: {(self.limite_maximo*2)//3}-{self.limite_maximo} tokens (66-99%)\n")
-                f.write(f"    - 🔴 Vermelho: ≥{self.limite_maximo} tokens (≥100% - CRÍTICO)\n")
-            else:
-                f.write(f"  • Monitoramento: Desabilitado\n")
-            
-            f.write(f"\n{'═'*70}\n\n")
+        self._escritor_log = EscritorLog(
+            self.arquivo_log,
+            intervalo_flush=self.config.log_intervalo_flush,
+            max_pendentes=self.config.log_max_pendentes
+        )
+        
+        f = io.StringIO()
+        f.write("╔" + "═"*68 + "╗\n")
+        f.write("║" + " "*20 + "CHAT DEBUG LOG" + " "*34 + "║\n")
+        f.write("║" + " "*15 + "Chat OpenAI com Memória" + " "*30 + "║\n")
+        f.write("╚" + "═"*68 + "╝\n\n")
+        f.write(f"Sessão iniciada em: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n")
+        f.write(f"{'═'*70}\n\n")
+        f.write("CONFIGURAÇÕES DA SESSÃO:\n")
+        f.write(f"  • Modelo: {self.modelo}\n")
+        f.write(f"  • Temperature: {self.temperature}\n")
+        f.write(f"  • Max Tokens: {self.max_tokens}\n")
+        f.write(f"  • System Prompt: {self.system_prompt}\n")
+        
+        if self._armazenamento is not None:
+            f.write(f"  • Sessão: {self.sessao_id} ({self._armazenamento.caminho}, "
+                    f"{len(self._historico)} mensagens retomadas)\n")
+        
+        if self.tamanho_janela:
+            f.write(f"  • Sliding Window: {self.tamanho_janela} pares de mensagens\n")
+        else:
+            f.write("  • Sliding Window: Desabilitado\n")
+        
+        if self.janela_tokens:
+            f.write(f"  • Sliding Window por tokens: {self.janela_tokens} tokens de contexto\n")
+        
+        if self.limite_maximo:
+            f.write(f"  • Monitoramento: {self.limite_maximo} tokens (máximo)\n")
+            f.write(f"    - 🟢 Verde: 0-{self.limite_maximo//3} tokens (0-33%)\n")
+            f.write(f"    - 🟡 Amarelo: {self.limite_maximo//3}-{(self.limite_maximo*2)//3} tokens (33-66%)\n")
+            f.write(f"    - 🟠 Laranja: {(self.limite_maximo*2)//3}-{self.limite_maximo} tokens (66-99%)\n")
+            f.write(f"    - 🔴 Vermelho: ≥{self.limite_maximo} tokens (≥100% - CRÍTICO)\n")
+        else:
+            f.write("  • Monitoramento: Desabilitado\n")
+        
+        if self.config.memoria_semantica:
+            f.write(f"  • Memória semântica: top {self.config.semantica_top_k} "
+                    f"({self.config.embeddings_modelo})\n")
+        
+        if self.config.memoria_resumo:
+            f.write(f"  • Memória de resumo: {self.config.resumo_modelo or self.modelo} "
+                    f"(até {self.config.resumo_max_tokens} tokens)\n")
+        
+        f.write(f"\n{'═'*70}\n\n")
+        
+        self._escritor_log.escrever(f.getvalue())
+        
+        if self.arquivo_deltas:
+            self._escritor_deltas = EscritorLog(
+                self.arquivo_deltas,
+                intervalo_flush=self.config.log_intervalo_flush,
+                max_pendentes=self.config.log_max_pendentes
+            )
+            self._registrar_delta("inicio", modelo=self.modelo, system_prompt=self.system_prompt)
     
     def _registrar_log(self, mensagem: str):
-        """Registra mensagem no arquivo de log se modo debug ativo"""
+        """
+        Registra mensagem no arquivo de log se modo debug ativo.
+        
+        A gravação é feita em segundo plano pelo EscritorLog; se o log tiver
+        sido fechado (fechar()), o arquivo é reaberto para acréscimo.
+        """
         if self.modo_debug and self.arquivo_log:
-            with open(self.arquivo_log, "a", encoding="utf-8") as f:
-                f.write(mensagem)
+            if self._escritor_log is None:
+                self._escritor_log = EscritorLog(
+                    self.arquivo_log,
+                    intervalo_flush=self.config.log_intervalo_flush,
+                    max_pendentes=self.config.log_max_pendentes,
+                    modo="a"
+                )
+            self._escritor_log.escrever(mensagem)
+    
+    def fechar(self):
+        """
+        Grava o log de debug pendente e fecha o arquivo (chamado também ao sair do programa).
+        Com SEMANTICA_DIRETORIO, também grava o índice da memória semântica; com
+        armazenamento, confirma os turnos ainda pendentes de commit; com log
+        binário, fecha os arquivos (reabertos se a sessão continuar). Com
+        MODO_PROFILE, grava o perfil dos turnos e desliga o tracemalloc.
+        """
+        try:
+            if self._armazenamento is not None and not self._armazenamento.fechado:
+                self._armazenamento.commit()
+            if self._log_binario is not None:
+                self._log_binario.fechar()
+            if self._memoria_semantica is not None:
+                self._memoria_semantica.salvar()
+        finally:
+            # Os logs e o perfil são fechados mesmo se a gravação acima falhar
+            if self._escritor_log is not None:
+                self._escritor_log.fechar()
+                self._escritor_log = None
+            if self._escritor_deltas is not None:
+                self._escritor_deltas.fechar()
+                self._escritor_deltas = None
+            if self._perfilador is not None:
+                self._perfilador.fechar()
     
-    def _registrar_interacao(self, mensagem_usuario: str, resposta_assistente: str, tokens_antes: int, tokens_depois: int, acoes: list = None):
+    def _registrar_interacao(self, mensagem_usuario: str, resposta_assistente: str, tokens_antes: int, tokens_depois: int, acoes: list = None,
+                             tempo_primeiro_token: float = None, removidas: int = 0,
+                             latencia_api: float = None, usage=None):
         """
         Registra uma interação completa no log de debug.
         
+        No modo de log 'completo' inclui uma prévia de todo o histórico anterior;
+        no modo 'delta' registra apenas o que mudou no turno (ver _registrar_delta).
+        
         Args:
             mensagem_usuario: Mensagem enviada pelo usuário
             resposta_assistente: Resposta gerada pelo assistente
             tokens_antes: Contagem de tokens antes da interação
             tokens_depois: Contagem de tokens depois da interação
             acoes: Lista de ações executadas (ex: ["Sliding window aplicado", "Alerta laranja"])
+            tempo_primeiro_token: Segundos até o primeiro token (apenas em streaming)
+            removidas: Quantidade de mensagens antigas removidas pelo sliding window
+            latencia_api: Segundos da chamada à API
+            usage: Uso de tokens informado pela API (resposta.usage)
         """
         if not self.modo_debug:
             return
         
         self.contador_interacoes += 1
         timestamp = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+        linha = "─" * 70
         
-        log = f"\n{'╔' + '═'*68 + '╗'}\n"
-        log += f"║  INTERAÇÃO #{self.contador_interacoes:<55} ║\n"
-        log += f"║  {timestamp:<66} ║\n"
-        log += f"{'╚' + '═'*68 + '╝'}\n\n"
-        
-        # Mensagem do usuário
-        log += f"{'─'*70}\n"
-        log += f"[MENSAGEM DO USUÁRIO]\n"
-        log += f"{'─'*70}\n"
-        log += f"{mensagem_usuario}\n\n"
-        
-        # System prompt atual
-        log += f"{'─'*70}\n"
-        log += f"[SYSTEM PROMPT]\n"
-        log += f"{'─'*70}\n"
-        log += f"{self.system_prompt}\n\n"
-        
-        # Parâmetros do modelo
-        log += f"{'─'*70}\n"
-        log += f"[PARÂMETROS DO MODELO]\n"
-        log += f"{'─'*70}\n"
-        log += f"  Modelo: {self.modelo}\n"
-        log += f"  Temperature: {self.temperature}\n"
-        log += f"  Max Tokens: {self.max_tokens}\n\n"
-        
-        # Histórico antes da mensagem
-        log += f"{'─'*70}\n"
-        log += f"[HISTÓRICO (antes da nova mensagem)]\n"
-        log += f"{'─'*70}\n"
-        log += f"  Total de mensagens: {len(self.historico) - 2}\n"  # -2 pois já adicionou user+assistant
-        log += f"  Tokens aproximados: {tokens_antes}\n\n"
-        
-        for i, msg in enumerate(self.historico[:-2] if len(self.historico) > 2 else [], 1):
-            role = "USUÁRIO" if msg["role"] == "user" else "ASSISTENTE"
-            log += f"  [{i}] {role}:\n"
-            conteudo = msg["content"][:100] + "..." if len(msg["content"]) > 100 else msg["content"]
-            log += f"      {conteudo}\n\n"
+        log = [
+            f"\n{'╔' + '═'*68 + '╗'}\n",
+            f"║  INTERAÇÃO #{self.contador_interacoes:<55} ║\n",
+            f"║  {timestamp:<66} ║\n",
+            f"{'╚' + '═'*68 + '╝'}\n\n",
+            
+            # Mensagem do usuário
+            f"{linha}\n[MENSAGEM DO USUÁRIO]\n{linha}\n",
+            f"{mensagem_usuario}\n\n",
+            
+            # System prompt atual
+            f"{linha}\n[SYSTEM PROMPT]\n{linha}\n",
+            f"{self.system_prompt}\n\n",
+            
+            # Parâmetros do modelo
+            f"{linha}\n[PARÂMETROS DO MODELO]\n{linha}\n",
+            f"  Modelo: {self.modelo}\n",
+            f"  Temperature: {self.temperature}\n",
+            f"  Max Tokens: {self.max_tokens}\n\n",
+        ]
+        
+        if self.config.log_modo == "delta":
+            # Apenas o que mudou: mensagens novas estão acima/abaixo, aqui as removidas
+            log.append(f"{linha}\n[MUDANÇAS NO HISTÓRICO]\n{linha}\n")
+            log.append("  Mensagens adicionadas: 2\n")
+            log.append(f"  Mensagens removidas (sliding window): {removidas}\n")
+            log.append(f"  Tokens antes: {tokens_antes}\n\n")
+        else:
+            # Histórico antes da mensagem
+            log.append(f"{linha}\n[HISTÓRICO (antes da nova mensagem)]\n{linha}\n")
+            log.append(f"  Total de mensagens: {len(self.historico) - 2}\n")  # -2 pois já adicionou user+assistant
+            log.append(f"  Tokens aproximados: {tokens_antes}\n\n")
+            
+            for i, msg in enumerate(islice(self._historico, max(0, len(self._historico) - 2)), 1):
+                role = "USUÁRIO" if msg["role"] == "user" else "ASSISTENTE"
+                conteudo = msg["content"][:100] + "..." if len(msg["content"]) > 100 else msg["content"]
+                log.append(f"  [{i}] {role}:\n      {conteudo}\n\n")
         
         # Resposta do assistente
-        log += f"{'─'*70}\n"
-        log += f"[RESPOSTA DO ASSISTENTE]\n"
-        log += f"{'─'*70}\n"
-        log += f"{resposta_assistente}\n\n"
+        log.append(f"{linha}\n[RESPOSTA DO ASSISTENTE]\n{linha}\n")
+        log.append(f"{resposta_assistente}\n\n")
         
         # Status de memória
-        log += f"{'─'*70}\n"
-        log += f"[STATUS DE MEMÓRIA]\n"
-        log += f"{'─'*70}\n"
-        log += f"  Total de mensagens: {len(self.historico)}\n"
-        log += f"  Tokens aproximados: {tokens_depois}\n"
+        log.append(f"{linha}\n[STATUS DE MEMÓRIA]\n{linha}\n")
+        log.append(f"  Total de mensagens: {len(self.historico)}\n")
+        log.append(f"  Tokens aproximados: {tokens_depois}\n")
         
         if self.tamanho_janela:
-            log += f"  Janela máxima: {self.tamanho_janela * 2} mensagens ({self.tamanho_janela} pares)\n"
+            log.append(f"  Janela máxima: {self.tamanho_janela * 2} mensagens ({self.tamanho_janela} pares)\n")
+        
+        if self.janela_tokens:
+            log.append(f"  Janela por tokens: {self.janela_tokens} tokens de contexto\n")
         
         if self.limite_maximo:
             percentual = (tokens_depois / self.limite_maximo) * 100
             nivel = self._calcular_nivel_alerta(tokens_depois)
-            log += f"  Limite máximo: {self.limite_maximo} tokens\n"
-            log += f"  Uso atual: {percentual:.1f}% {nivel}\n"
+            log.append(f"  Limite máximo: {self.limite_maximo} tokens\n")
+            log.append(f"  Uso atual: {percentual:.1f}% {nivel}\n")
         
-        log += "\n"
+        if tempo_primeiro_token is not None:
+            log.append(f"  Tempo até o primeiro token: {tempo_primeiro_token * 1000:.0f} ms\n")
+        
+        if latencia_api is not None:
+            log.append(f"  Latência da API: {latencia_api * 1000:.0f} ms\n")
+        
+        if usage is not None:
+            prompt, resposta, cache = _uso_tokens(usage)
+            log.append(f"  Tokens (API): prompt={prompt} resposta={resposta} em cache={cache}"
+                       f"{f' ({cache / prompt:.0%} do prompt)' if prompt else ''}\n")
+        
+        log.append("\n")
         
         # Ações executadas
         if acoes:
-            log += f"{'─'*70}\n"
-            log += f"[AÇÕES EXECUTADAS]\n"
-            log += f"{'─'*70}\n"
+            log.append(f"{linha}\n[AÇÕES EXECUTADAS]\n{linha}\n")
             for acao in acoes:
-                log += f"  ⚠️  {acao}\n"
-            log += "\n"
+                log.append(f"  ⚠️  {acao}\n")
+            log.append("\n")
+        
+        log.append(f"{'═'*70}\n\n")
+        
+        self._registrar_log("".join(log))
+        
+        self._registrar_delta(
+            "turno",
+            n=self.contador_interacoes,
+            user=mensagem_usuario,
+            assistant=resposta_assistente,
+            removidas=removidas,
+            acoes=acoes or [],
+            tokens=tokens_depois,
+            tokens_cache=_uso_tokens(usage)[2]
+        )
+    
+    def _registrar_delta(self, evento: str, **dados):
+        """
+        Registra um evento no log de deltas (logs/chat_debug_TIMESTAMP.deltas.jsonl).
         
-        log += f"{'═'*70}\n\n"
+        Ativo apenas com modo debug e LOG_MODO=delta. Cada linha é um JSON com o
+        evento, o horário e o total de mensagens após o evento; a sequência de
+        eventos permite reconstruir o histórico (ver log_debug.reconstruir_historico).
+        """
+        if not (self.modo_debug and self.arquivo_deltas):
+            return
+        if self._escritor_deltas is None:
+            self._escritor_deltas = EscritorLog(
+                self.arquivo_deltas,
+                intervalo_flush=self.config.log_intervalo_flush,
+                max_pendentes=self.config.log_max_pendentes,
+                modo="a"
+            )
+        registro = {"evento": evento, "ts": datetime.now().isoformat(timespec="seconds"), **dados,
+                    "total": len(self._historico)}
+        self._escritor_deltas.escrever(json.dumps(registro, ensure_ascii=False) + "\n")
+    
+    def registrar_snapshot(self):
+        """
+        Registra no log de deltas uma cópia completa do histórico atual.
         
-        self._registrar_log(log)
+        Útil como ponto de partida para reconstrução (ex: antes de uma análise)
+        ou após alterações feitas diretamente em chat.historico.
+        """
+        self._registrar_delta(
+            "snapshot",
+            system_prompt=self.system_prompt,
+            mensagens=[msg.como_dict() for msg in self._historico]
+        )
+    
+    @property
+    def historico(self) -> VisaoHistorico:
+        """
+        Mensagens (user/assistant) mantidas em memória, da mais antiga para a mais recente.
+        
+        Visão somente leitura: aceita iteração, len(), índices e fatias
+        (ex: chat.historico = chat.historico[-4:]).
+        """
+        return VisaoHistorico(self._historico)
+    
+    @historico.setter
+    def historico(self, mensagens: List[Dict[str, str]]):
+        """
+        Substitui o histórico e recalcula os totais acumulados.
+        
+        Para adicionar mensagens use adicionar_mensagem(), que mantém os
+        totais atualizados sem percorrer o histórico.
+        """
+        self._historico = deque(msg if isinstance(msg, Mensagem) else self._criar_mensagem(msg["role"], msg["content"])
+                                for msg in mensagens)
+        self._total_chars = sum(len(msg.content) for msg in self._historico)
+        self._total_tokens = sum(msg.tokens for msg in self._historico)
+        
+        # Alteração externa: registra o novo estado para a reconstrução pelos deltas
+        # e, no armazenamento, substitui o histórico da sessão (marco + novas mensagens)
+        self.registrar_snapshot()
+        if self._armazenamento is not None or self._log_binario is not None:
+            self._persistir_limpeza()
+            self._persistir(*self._historico)
+    
+    def _criar_mensagem(self, role: str, content: str) -> Mensagem:
+        """Cria uma mensagem já com a contagem de tokens em cache"""
+        return Mensagem(role, content, self.contador_tokens.contar(content))
     
     def adicionar_mensagem(self, role: str, content: str):
         """
@@ -307,10 +1024,16 @@ class ChatComMemoria:
             role: 'user' ou 'assistant'
             content: Conteúdo da mensagem
         """
-        self.historico.append({
-            "role": role,
-            "content": content
-        })
+        self._anexar_mensagem(role, content)
+        self._persistir(self._historico[-1])
+        self._registrar_delta("mensagem", role=role, content=content)
+    
+    def _anexar_mensagem(self, role: str, content: str):
+        """Adiciona mensagem ao histórico atualizando os totais (sem registro de delta)"""
+        mensagem = self._criar_mensagem(role, content)
+        self._historico.append(mensagem)
+        self._total_chars += len(content)
+        self._total_tokens += mensagem.tokens
     
     def _calcular_nivel_alerta(self, tokens: int) -> str:
         """
@@ -355,10 +1078,10 @@ class ChatComMemoria:
         
         if percentual >= 100:
             alertas.append(f"{nivel} CRÍTICO: {tokens} tokens ({percentual:.1f}% do limite)")
-            alertas.append(f"   Ação recomendada: Execute limpar_historico() ou ajuste JANELA_MAX no .env")
+            alertas.append("   Ação recomendada: Execute limpar_historico() ou ajuste JANELA_MAX no .env")
         elif percentual >= 66:
             alertas.append(f"{nivel} LARANJA: {tokens} tokens ({percentual:.1f}% do limite)")
-            alertas.append(f"   Atenção: Aproximando do limite máximo")
+            alertas.append("   Atenção: Aproximando do limite máximo")
         elif percentual >= 33:
             alertas.append(f"{nivel} AMARELO: {tokens} tokens ({percentual:.1f}% do limite)")
         else:
@@ -367,128 +1090,525 @@ class ChatComMemoria:
         
         return alertas
     
-    def _aplicar_janela_deslizante(self) -> bool:
+    def _tokens_system_prompt(self) -> int:
+        """Tokens do system prompt atual (recontado apenas quando o texto muda)"""
+        texto, tokens = self._system_prompt_contado
+        if texto is not self.system_prompt:
+            tokens = self.contador_tokens.contar(self.system_prompt)
+            self._system_prompt_contado = (self.system_prompt, tokens)
+        return tokens
+    
+    def _tokens_contexto_fixo(self) -> int:
+        """Tokens do contexto fixo (recontado apenas quando o texto muda)"""
+        if self.contexto_fixo is None:
+            return 0
+        texto, tokens = self._contexto_fixo_contado
+        if texto is not self.contexto_fixo:
+            tokens = self.contador_tokens.contar(self.contexto_fixo)
+            self._contexto_fixo_contado = (self.contexto_fixo, tokens)
+        return tokens
+    
+    def _remover_par_antigo(self, descartadas: list = None) -> int:
         """
-        Aplica sliding window mantendo apenas as últimas N pares de mensagens.
+        Remove do início do histórico a mensagem mais antiga e as respostas que a
+        seguem (um par user+assistant), atualizando os totais.
+        
+        Args:
+            descartadas: Se informada, recebe as mensagens removidas
         
         Returns:
-            True se a janela foi aplicada, False caso contrário
+            Quantidade de mensagens removidas
+        """
+        removidas = 0
+        while self._historico and (removidas == 0 or self._historico[0].role != "user"):
+            msg = self._historico.popleft()
+            self._total_chars -= len(msg.content)
+            self._total_tokens -= msg.tokens
+            if descartadas is not None:
+                descartadas.append(msg)
+            removidas += 1
+        return removidas
+    
+    def _aplicar_janela_deslizante(self, descartadas: list = None) -> int:
         """
-        if not self.tamanho_janela:
-            return False
+        Aplica o sliding window, removendo pares inteiros do início do histórico.
         
-        max_mensagens = self.tamanho_janela * 2  # user + assistant = 1 par
+        - tamanho_janela: mantém apenas os últimos N pares de mensagens
+        - janela_tokens: remove pares até system prompt + histórico caberem no
+          orçamento (usa a contagem em cache de cada mensagem; o par mais recente
+          é sempre mantido)
         
-        if len(self.historico) > max_mensagens:
-            mensagens_removidas = len(self.historico) - max_mensagens
-            self.historico = self.historico[-max_mensagens:]
-            
-            if self.modo_debug:
-                self._registrar_log(f"[SLIDING WINDOW] Removidas {mensagens_removidas} mensagens antigas. "
-                                   f"Mantendo {len(self.historico)} mensagens.\n")
-            
-            return True
+        Cada remoção é um popleft() do deque, sem copiar as mensagens mantidas.
+        Com a memória de resumo ou semântica, as mensagens removidas são
+        entregues a elas em vez de simplesmente descartadas.
         
-        return False
+        Com contexto_estavel, ao exceder um limite a remoção continua até
+        liberar CONTEXTO_FOLGA da janela: o início do histórico (e portanto o
+        prefixo do prompt) só muda a cada bloco, não a cada turno.
+        
+        Args:
+            descartadas: Se informada, recebe as mensagens removidas (ex: para o gancho ao_remover)
+        
+        Returns:
+            Quantidade de mensagens removidas (0 se a janela não foi aplicada)
+        """
+        if not (self.tamanho_janela or self.janela_tokens):
+            return 0
+        
+        mensagens_removidas = 0
+        if descartadas is None and (self._resumidor or self._memoria_semantica):
+            descartadas = []
+        
+        # Fração mantida após uma remoção (1.0 = apenas o excedente)
+        manter = 1 - self.config.contexto_folga if self.contexto_estavel else 1.0
+        
+        if self.tamanho_janela:
+            max_mensagens = self.tamanho_janela * 2  # user + assistant = 1 par
+            if len(self._historico) > max_mensagens:
+                alvo = max(1, int(self.tamanho_janela * manter)) * 2
+                while len(self._historico) > alvo:
+                    mensagens_removidas += self._remover_par_antigo(descartadas)
+        
+        if self.janela_tokens:
+            # O contexto fixo e o resumo também são enviados no prompt, então consomem parte do orçamento
+            orcamento = (self.janela_tokens - self._tokens_system_prompt() - self._tokens_contexto_fixo()
+                         - self._tokens_resumo)
+            if self._total_tokens > orcamento:
+                alvo = orcamento * manter
+                while self._total_tokens > alvo and len(self._historico) > 2:
+                    mensagens_removidas += self._remover_par_antigo(descartadas)
+        
+        if descartadas:
+            if self._resumidor:
+                self._resumidor.resumir(descartadas)
+            if self._memoria_semantica:
+                self._memoria_semantica.memorizar(descartadas)
+        
+        if mensagens_removidas and self.modo_debug:
+            self._registrar_log(f"[SLIDING WINDOW] Removidas {mensagens_removidas} mensagens antigas. "
+                               f"Mantendo {len(self._historico)} mensagens ({self._total_tokens} tokens).\n")
+        
+        return mensagens_removidas
     
-    def enviar_mensagem(self, mensagem: str) -> str:
+    def _recuperar_memoria(self, mensagem: str) -> List[str]:
         """
-        Envia mensagem para a API mantendo o contexto completo.
+        Busca na memória semântica os turnos antigos relevantes para a mensagem.
+        
+        Falhas (ex: endpoint de embeddings indisponível) não interrompem o
+        envio: são registradas no log e o turno segue sem os trechos antigos.
+        
+        Returns:
+            Textos dos turnos recuperados ([] se a memória semântica estiver desativada)
+        """
+        if self._memoria_semantica is None:
+            return []
+        inicio = time.perf_counter()
+        try:
+            recuperados = self._memoria_semantica.recuperar(mensagem)
+        except Exception as e:
+            if self.modo_debug:
+                self._registrar_log(f"\n[MEMÓRIA SEMÂNTICA] Falha na recuperação: {e}\n")
+            return []
+        self._m_recuperacao.observar(time.perf_counter() - inicio)
+        return recuperados
+    
+    def _iniciar_turno(self, mensagem: str, recuperados: List[str] = None) -> tuple:
+        """
+        Prepara um turno: adiciona a mensagem do usuário e monta o prompt.
         
         Args:
             mensagem: Mensagem do usuário
+            recuperados: Turnos antigos a incluir no prompt (ver _recuperar_memoria)
             
         Returns:
-            Resposta do assistente
+            Tupla (tokens_antes, mensagens) com a contagem anterior ao turno e
+            o Prompt (system prompt + histórico) a ser enviado à API
         """
         # Contagem de tokens antes
+        inicio = time.perf_counter()
         tokens_antes = self.contar_tokens_aproximado()
-        acoes_executadas = []
         
         # Adiciona mensagem do usuário ao histórico
-        self.adicionar_mensagem("user", mensagem)
+        inicio_anexar = time.perf_counter()
+        self._anexar_mensagem("user", mensagem)
+        
+        inicio_prompt = time.perf_counter()
+        mensagens = self._montar_prompt(recuperados)
+        self.ultimos_tempos = {
+            "verificar_tokens": inicio_anexar - inicio,
+            "anexar": inicio_prompt - inicio_anexar,
+            "montar_prompt": time.perf_counter() - inicio_prompt,
+        }
+        return tokens_antes, mensagens
+    
+    def _montar_prompt(self, recuperados: List[str] = None) -> Prompt:
+        """
+        Mensagens enviadas à API: system prompt (+ contexto fixo, resumo e
+        turnos antigos relevantes) + histórico completo, já com a nova mensagem.
         
-        # Prepara mensagens com system prompt + histórico completo
-        mensagens = [
-            {"role": "system", "content": self.system_prompt}
-        ] + self.historico
+        O histórico não é copiado (ver Prompt) e as mensagens system só são
+        recriadas quando algum dos textos muda.
+        """
+        trechos = None
+        if recuperados:
+            trechos = "Trechos relevantes de conversas anteriores:\n" + "\n\n".join(recuperados)
+        # Com CONTEXTO_ESTAVEL, os trechos mudam a cada envio: vão logo antes da nova
+        # mensagem, para não alterar o prefixo (system + histórico) já em cache
+        estavel = trechos is not None and self.contexto_estavel
+        textos = (self.system_prompt, self.contexto_fixo, self.resumo, None if estavel else trechos)
+        
+        anteriores, prefixo = self._prefixo_prompt
+        if len(anteriores) != len(textos) or any(a is not b for a, b in zip(anteriores, textos)):
+            prefixo = [{"role": "system", "content": self.system_prompt}]
+            if self.contexto_fixo:
+                prefixo.append({"role": "system", "content": self.contexto_fixo})
+            if textos[2]:
+                prefixo.append({"role": "system", "content": f"Resumo da conversa anterior:\n{textos[2]}"})
+            if textos[3]:
+                prefixo.append({"role": "system", "content": textos[3]})
+            self._prefixo_prompt = (textos, prefixo)
+        
+        if estavel:
+            return Prompt(prefixo, self._historico, {"role": "system", "content": trechos})
+        return Prompt(prefixo, self._historico)
+    
+    def _concluir_turno(self, mensagem: str, resposta_texto: str, tokens_antes: int,
+                        tempo_primeiro_token: float = None, latencia_api: float = None, usage=None):
+        """
+        Registra a resposta no histórico e executa as regras de memória do turno
+        (sliding window, alertas de tokens e log de debug).
         
-        try:
-            # Chama a API
-            resposta = self.client.chat.completions.create(
-                model=self.modelo,
-                messages=mensagens,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens
-            )
-            
-            # Extrai resposta
-            resposta_texto = resposta.choices[0].message.content
-            
-            # Adiciona resposta ao histórico
-            self.adicionar_mensagem("assistant", resposta_texto)
-            
-            # Aplica sliding window se configurado
-            if self._aplicar_janela_deslizante():
-                acoes_executadas.append(f"Sliding window aplicado: mantendo {self.tamanho_janela} pares de mensagens")
-            
-            # Contagem de tokens depois
-            tokens_depois = self.contar_tokens_aproximado()
-            
-            # Verifica alertas de tokens
-            alertas = self._verificar_tokens(tokens_depois)
-            if alertas:
-                for alerta in alertas:
-                    print(f"\n⚠️  {alerta}")
-                    acoes_executadas.append(alerta)
-                print()
-            
-            # Registra interação completa no log
-            if self.modo_debug:
-                self._registrar_interacao(mensagem, resposta_texto, tokens_antes, tokens_depois, acoes_executadas if acoes_executadas else None)
-            
-            return resposta_texto
-            
-        except Exception as e:
-            erro = f"Erro ao chamar API OpenAI: {e}"
-            if self.modo_debug:
-                self._registrar_log(f"\n[ERRO] {erro}\n")
-            raise Exception(erro)
+        Args:
+            mensagem: Mensagem do usuário
+            resposta_texto: Resposta completa do assistente
+            tokens_antes: Contagem de tokens antes do turno
+            tempo_primeiro_token: Segundos até o primeiro token (apenas em streaming)
+            latencia_api: Segundos da chamada à API (registrado no log de debug)
+            usage: Uso de tokens informado pela API (registrado no log de debug)
+        """
+        acoes_executadas = []
+        tempos = self.ultimos_tempos
+        if latencia_api is not None:
+            tempos["api"] = latencia_api
+        
+        # Adiciona resposta ao histórico e grava o turno concluído
+        inicio = time.perf_counter()
+        self._anexar_mensagem("assistant", resposta_texto)
+        inicio_persistir = time.perf_counter()
+        self._persistir(self._historico[-2], self._historico[-1])
+        
+        # Aplica sliding window se configurado
+        inicio_janela = time.perf_counter()
+        descartadas = [] if self.ganchos.ativo("ao_remover") else None
+        removidas = self._aplicar_janela_deslizante(descartadas)
+        tempos["anexar"] = tempos.get("anexar", 0.0) + (inicio_persistir - inicio)
+        tempos["persistir"] = inicio_janela - inicio_persistir
+        tempos["janela"] = time.perf_counter() - inicio_janela
+        if removidas:
+            acoes_executadas.append(f"Sliding window aplicado: {removidas} mensagens removidas, "
+                                    f"mantendo {len(self._historico)} mensagens ({self._total_tokens} tokens)")
+            self._emitir("ao_remover", removidas=descartadas)
+        
+        # Contagem de tokens depois
+        inicio_contagem = time.perf_counter()
+        tokens_depois = self.contar_tokens_aproximado()
+        
+        # Verifica alertas de tokens
+        alertas = self._verificar_tokens(tokens_depois)
+        if alertas:
+            for alerta in alertas:
+                print(f"\n⚠️  {alerta}")
+                acoes_executadas.append(alerta)
+            print()
+        tempos["verificar_tokens"] = tempos.get("verificar_tokens", 0.0) + (time.perf_counter() - inicio_contagem)
+        if alertas:
+            self._emitir("ao_alertar", alertas=alertas, tokens=tokens_depois)
+        
+        # Registra interação completa no log
+        if self.modo_debug:
+            inicio_log = time.perf_counter()
+            self._registrar_interacao(mensagem, resposta_texto, tokens_antes, tokens_depois,
+                                      acoes_executadas if acoes_executadas else None,
+                                      tempo_primeiro_token, removidas, latencia_api, usage)
+            tempos["log"] = time.perf_counter() - inicio_log
+        
+        self._emitir("pos_resposta", mensagem=mensagem, resposta=resposta_texto, usage=usage)
+    
+    def _emitir(self, evento: str, **dados):
+        """Chama os ganchos do evento com os dados e os tempos do turno (nada é montado sem ganchos)"""
+        if self.ganchos.ativo(evento):
+            self.ganchos.emitir(evento, {"evento": evento, "sessao_id": self.sessao_id,
+                                         "tempos": dict(self.ultimos_tempos), **dados})
+    
+    def _perfil_turno(self):
+        """Contexto que perfila o turno com MODO_PROFILE (sem efeito quando desativado)"""
+        return self._perfilador.turno() if self._perfilador is not None else nullcontext()
+    
+    def _consultar_cache(self, mensagens: list) -> tuple:
+        """
+        Procura no cache a resposta para a requisição que seria enviada.
+        
+        Returns:
+            Tupla (chave, resposta); chave é None sem cache e resposta é None se
+            a requisição ainda não foi respondida
+        """
+        if self._cache is None:
+            return None, None
+        chave = calcular_chave(self.modelo, self.temperature, self.max_tokens, mensagens)
+        resposta = self._cache.obter(chave)
+        (self._m_cache_acertos if resposta is not None else self._m_cache_falhas).incrementar()
+        return chave, resposta
+    
+    def _guardar_cache(self, chave: str, resposta_texto: str):
+        """Guarda a resposta da API no cache (respostas vazias não são guardadas)"""
+        if chave is not None and resposta_texto:
+            self._cache.guardar(chave, resposta_texto)
+    
+    def _concluir_turno_cache(self, mensagem: str, resposta_texto: str, tokens_antes: int,
+                              inicio: float, tempo_primeiro_token: float = None):
+        """
+        Conclui um turno respondido pelo cache: mesmas regras de memória de um
+        turno normal, sem métricas de API (latência e tokens)
+        """
+        self._concluir_turno(mensagem, resposta_texto, tokens_antes, tempo_primeiro_token, latencia_api=0.0)
+        self._m_turnos.incrementar()
+        self._m_tempo_local.observar(time.perf_counter() - inicio)
+    
+    def _estimar_tokens_turno(self) -> int:
+        """Tokens reservados no limitador: contexto atual (com a nova mensagem) + max_tokens"""
+        return (self._total_tokens + self._tokens_system_prompt() + self._tokens_contexto_fixo()
+                + self.max_tokens)
+    
+    def _cliente_chamadas(self):
+        """
+        Cliente usado nas chamadas de chat, sem as retentativas internas do SDK
+        (as retentativas são feitas por _espera_retentativa, com as métricas e o
+        limitador). A cópia compartilha o pool de conexões do cliente original.
+        """
+        client = self.client
+        original, copia = self._cliente_sem_retentativas
+        if original is not client:
+            copia = client.with_options(max_retries=0) if hasattr(client, "with_options") else client
+            self._cliente_sem_retentativas = (client, copia)
+        return copia
+    
+    def _iniciar_requisicao(self, anterior: Requisicao = None, assincrono: bool = False) -> tuple:
+        """
+        Cliente para a próxima tentativa de chamada de chat.
+        
+        Com balanceador, escolhe o endpoint (evitando o da tentativa anterior,
+        que falhou) e registra a requisição em andamento nele.
+        
+        Returns:
+            Tupla (cliente, requisicao); requisicao é None sem balanceador
+        """
+        if self._balanceador is None:
+            return self._cliente_chamadas(), None
+        requisicao = self._balanceador.iniciar(self.sessao_id, anterior.endpoint if anterior else None)
+        return self._balanceador.cliente(requisicao.endpoint, assincrono), requisicao
+    
+    def _atraso_hedge(self, stream: bool = False):
+        """
+        Segundos de espera pela primeira resposta antes de duplicar a requisição.
+        
+        É o percentil HEDGE_PERCENTIL dos tempos recentes até o primeiro token
+        (streaming) ou da latência da API (sem streaming).
+        
+        Returns:
+            Segundos, ou None sem hedge (desativado ou menos de HEDGE_MIN_AMOSTRAS observações)
+        """
+        if not self.config.hedge:
+            return None
+        histograma = self._m_primeiro_token if stream else self._m_latencia_api
+        if histograma.total < self.config.hedge_min_amostras:
+            return None
+        return histograma.percentil(self.config.hedge_percentil)
+    
+    def _pode_duplicar(self, estimativa: int) -> bool:
+        """A duplicata só é enviada se o limitador tiver saldo agora (nunca espera por ela)"""
+        return self._limitador is None or self._limitador.tentar_reservar(estimativa)
+    
+    def _devolver_duplicata(self, estimativa: int):
+        """
+        Devolve ao limitador a reserva extra da duplicata, decidida a disputa:
+        apenas a vencedora é acertada com o uso real (ou devolvida, se ambas falharem)
+        """
+        if self._limitador is not None:
+            self._limitador.ajustar(-estimativa)
+    
+    def _espera_retentativa(self, e: Exception, tentativa: int):
+        """
+        Decide se a requisição que falhou deve ser repetida.
+        
+        Um 429 pausa o limitador (se houver) pelo tempo de espera, segurando
+        todas as sessões que o compartilham; nesse caso a espera acontece na
+        próxima reserva e o retorno é 0.
+        
+        Args:
+            e: Exceção da tentativa
+            tentativa: Retentativas já feitas nesta requisição
+        
+        Returns:
+            Segundos a esperar antes de repetir, ou None se o erro não deve ser repetido
+        """
+        repetivel, retry_after = classificar_erro(e)
+        if not repetivel or tentativa >= self.config.retentativas_max:
+            return None
+        espera = calcular_espera(tentativa, self.config.retentativa_espera_base,
+                                 self.config.retentativa_espera_max, retry_after)
+        self._m_retentativas.incrementar()
+        if self.modo_debug:
+            self._registrar_log(f"\n[RETENTATIVA {tentativa + 1}/{self.config.retentativas_max}] {e} "
+                                f"(nova tentativa em {espera:.2f} s)\n")
+        if self._limitador is not None and getattr(e, "status_code", None) == 429:
+            self._limitador.pausar(espera)
+            return 0.0
+        return espera
+    
+    def _acertar_limitador(self, estimativa: int, usage=None):
+        """
+        Acerta no limitador a diferença entre os tokens reservados e os usados
+        de fato (sem o uso informado pela API, a estimativa é mantida)
+        """
+        if self._limitador is None or usage is None:
+            return
+        prompt, resposta, _ = _uso_tokens(usage)
+        self._limitador.ajustar(prompt + resposta - estimativa)
+    
+    def _tentativa_falhou(self, e: Exception, mensagem: str, tentativa: int, estimativa: int) -> float:
+        """
+        Trata a falha de uma tentativa de chamada à API.
+        
+        Returns:
+            Segundos a esperar antes de repetir
+        
+        Raises:
+            ErroAPI: Se o erro não deve ser repetido (o turno é desfeito)
+        """
+        if self._limitador is not None:
+            self._limitador.ajustar(-estimativa)  # A requisição com erro não consumiu os tokens
+        espera = self._espera_retentativa(e, tentativa)
+        if espera is None:
+            raise self._erro_api(e, mensagem, tentativa + 1) from e
+        return espera
+    
+    def _desfazer_mensagem_usuario(self, mensagem: str):
+        """Remove do histórico a mensagem do usuário de um turno que não foi concluído"""
+        if not self._historico:
+            return
+        ultima = self._historico[-1]
+        if ultima.role == "user" and ultima.content == mensagem:
+            self._historico.pop()
+            self._total_chars -= len(ultima.content)
+            self._total_tokens -= ultima.tokens
+    
+    def _interromper_turno(self, mensagem: str, recebido: str):
+        """
+        Desfaz o turno de streaming abandonado pelo consumidor antes do fim
+        (break, close() do gerador, Ctrl+C): a resposta parcial é descartada e
+        a mensagem do usuário sai do histórico, como em um erro da API.
+        
+        Args:
+            mensagem: Mensagem do usuário do turno
+            recebido: Parte da resposta já entregue (apenas para o log)
+        """
+        self._desfazer_mensagem_usuario(mensagem)
+        self._m_interrompidos.incrementar()
+        if self.modo_debug:
+            self._registrar_log(f"\n[TURNO INTERROMPIDO] Streaming abandonado após {len(recebido)} caracteres; "
+                                "mensagem do usuário removida do histórico\n")
+            self._registrar_delta("interrompido", user=mensagem, recebido=recebido)
+    
+    def _erro_api(self, e: Exception, mensagem: str = None, tentativas: int = 1) -> ErroAPI:
+        """
+        Desfaz o turno, registra o erro no log e retorna a exceção a ser lançada.
+        
+        Args:
+            e: Exceção original
+            mensagem: Mensagem do usuário do turno que falhou (removida do histórico)
+            tentativas: Quantas vezes a requisição foi enviada
+        """
+        if mensagem is not None:
+            self._desfazer_mensagem_usuario(mensagem)
+        erro = f"Erro ao chamar API OpenAI: {e}"
+        self._m_erros.incrementar()
+        if self.modo_debug:
+            self._registrar_log(f"\n[ERRO] {erro}\n")
+            self._registrar_delta("erro", user=mensagem, erro=str(e))
+        repetivel, _ = classificar_erro(e)
+        return ErroAPI(erro, status=getattr(e, "status_code", None), repetivel=repetivel, tentativas=tentativas)
     
     def limpar_historico(self):
         """Limpa todo o histórico de conversação"""
-        mensagens_removidas = len(self.historico)
-        self.historico = []
+        mensagens_removidas = len(self._historico)
+        self._historico = deque()
+        self._total_chars = 0
+        self._total_tokens = 0
+        if self._resumidor:
+            self._resumidor.limpar()
+            self._tokens_resumo = 0
+        if self._memoria_semantica:
+            self._memoria_semantica.limpar()
+        self._persistir_limpeza()
         print("Histórico limpo - memória apagada\n")
         
         if self.modo_debug:
-            self._registrar_log(f"\n{'═'*70}\n")
-            self._registrar_log(f"[LIMPEZA DE HISTÓRICO]\n")
-            self._registrar_log(f"{'═'*70}\n")
-            self._registrar_log(f"Removidas {mensagens_removidas} mensagens do histórico\n")
-            self._registrar_log(f"Timestamp: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n")
-            self._registrar_log(f"{'═'*70}\n\n")
-    
-    def mostrar_historico(self):
-        """Exibe todo o histórico de conversação"""
+            self._registrar_log(
+                f"\n{'═'*70}\n"
+                f"[LIMPEZA DE HISTÓRICO]\n"
+                f"{'═'*70}\n"
+                f"Removidas {mensagens_removidas} mensagens do histórico\n"
+                f"Timestamp: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n"
+                f"{'═'*70}\n\n"
+            )
+            self._registrar_delta("limpeza", removidas=mensagens_removidas)
+    
+    def _mensagens_completas(self, completo: bool) -> Iterator:
+        """
+        Mensagens (role, content) a exibir ou exportar: o histórico em memória
+        ou, com completo=True e log binário, toda a conversa lida do disco
+        (uma mensagem por vez, sem carregar o log inteiro)
+        """
+        if completo and self._log_binario is not None:
+            return ((role, content) for role, content, _ in self._log_binario.conversa())
+        return ((msg.role, msg.content) for msg in self._historico)
+    
+    def mostrar_historico(self, completo: bool = False):
+        """
+        Exibe o histórico de conversação.
+        
+        Args:
+            completo: Se True e houver log binário (LOG_BINARIO), exibe toda a
+                     conversa, inclusive as mensagens já removidas pelo sliding window
+        """
         print("\n" + "="*60)
         print("HISTÓRICO DA CONVERSAÇÃO")
         print("="*60)
         
-        for i, msg in enumerate(self.historico, 1):
-            role = "VOCÊ" if msg["role"] == "user" else "ASSISTENTE"
+        if completo and self._log_binario is None:
+            print("\n(Sem LOG_BINARIO: exibindo apenas as mensagens em memória)")
+        elif self.resumo and not completo:
+            print("\n[RESUMO DAS MENSAGENS ANTERIORES]:")
+            print(self.resumo)
+        
+        for i, (role, content) in enumerate(self._mensagens_completas(completo), 1):
+            role = "VOCÊ" if role == "user" else "ASSISTENTE"
             print(f"\n[{i}] {role}:")
-            print(f"{msg['content']}")
+            print(f"{content}")
         
         print("\n" + "="*60 + "\n")
     
     def contar_tokens_aproximado(self) -> int:
         """
-        Conta aproximadamente quantos tokens estão no histórico.
-        Estimativa simples: ~4 caracteres por token
+        Conta quantos tokens estão no histórico.
+        
+        Cada mensagem é medida uma única vez pelo contador_tokens (BPE do modelo,
+        ou ~4 caracteres por token como fallback) ao entrar no histórico. O total
+        é mantido incrementalmente por adicionar_mensagem(),
+        _aplicar_janela_deslizante() e limpar_historico(), então o custo é
+        constante independente do tamanho do histórico.
         """
-        total_chars = sum(len(msg["content"]) for msg in self.historico)
-        return total_chars // 4
+        return self._total_tokens
     
     def debug_memoria(self):
         """Exibe informações detalhadas sobre o estado atual da memória"""
@@ -498,24 +1618,34 @@ class ChatComMemoria:
         print("║" + " "*22 + "DEBUG DE MEMÓRIA" + " "*30 + "║")
         print("╚" + "═"*68 + "╝\n")
         
-        print(f"📊 Status Geral:")
+        print("📊 Status Geral:")
         print(f"   • Total de mensagens: {len(self.historico)}")
         print(f"   • Pares (user+assistant): {len(self.historico) // 2}")
-        print(f"   • Tokens aproximados: {tokens}\n")
+        print(f"   • Tokens aproximados: {tokens}")
+        print(f"   • Contador: {self.contador_tokens.descricao}\n")
         
         if self.tamanho_janela:
-            print(f"🪟 Sliding Window:")
+            print("🪟 Sliding Window:")
             print(f"   • Limite: {self.tamanho_janela} pares ({self.tamanho_janela * 2} mensagens)")
             print(f"   • Uso atual: {len(self.historico) // 2} pares ({len(self.historico)} mensagens)")
             uso_percentual = (len(self.historico) / (self.tamanho_janela * 2)) * 100
-            print(f"   • Percentual: {uso_percentual:.1f}%\n")
+            print(f"   • Percentual: {uso_percentual:.1f}%")
+            if self.contexto_estavel:
+                print(f"   • Contexto estável: remove blocos de {self.config.contexto_folga:.0%} da janela")
+            print()
         else:
-            print(f"🪟 Sliding Window: Desabilitado\n")
+            print("🪟 Sliding Window: Desabilitado\n")
+        
+        if self.janela_tokens:
+            contexto = tokens + self._tokens_system_prompt() + self._tokens_contexto_fixo()
+            print("🪙 Sliding Window por tokens:")
+            print(f"   • Orçamento: {self.janela_tokens} tokens (system prompt + contexto fixo + histórico)")
+            print(f"   • Uso atual: {contexto} tokens ({contexto / self.janela_tokens * 100:.1f}%)\n")
         
         if self.limite_maximo:
             nivel = self._calcular_nivel_alerta(tokens)
             percentual = (tokens / self.limite_maximo) * 100
-            print(f"📈 Monitoramento:")
+            print("📈 Monitoramento:")
             print(f"   • Limite máximo: {self.limite_maximo} tokens")
             print(f"   • Uso atual: {tokens} tokens ({percentual:.1f}%)")
             print(f"   • Nível: {nivel}")
@@ -527,17 +1657,122 @@ class ChatComMemoria:
             barra = "█" * barra_preenchida + "░" * (barra_total - barra_preenchida)
             print(f"   • Progresso: [{barra}]\n")
         else:
-            print(f"📈 Monitoramento: Desabilitado\n")
+            print("📈 Monitoramento: Desabilitado\n")
+        
+        if self._resumidor:
+            print("🧾 Memória de Resumo:")
+            print(f"   • Modelo: {self._resumidor.modelo}")
+            print(f"   • Resumo atual: {self._tokens_resumo} tokens")
+            print(f"   • Mensagens aguardando resumo: {self._resumidor.pendentes}")
+            if self._resumidor.ultimo_erro:
+                print(f"   • Último erro: {self._resumidor.ultimo_erro}")
+            print()
+        
+        if self._armazenamento is not None:
+            print("💾 Armazenamento:")
+            print(f"   • Sessão: {self.sessao_id}")
+            print(f"   • Banco: {self._armazenamento.caminho}\n")
+        
+        if self._cache is not None:
+            estatisticas = self._cache.resumo()
+            print("🗄️  Cache de Respostas (compartilhado pelo processo):")
+            print(f"   • Itens em memória: {estatisticas['itens']}/{estatisticas['max_itens']} "
+                  f"(TTL: {f'{self._cache.ttl:g} s' if self._cache.ttl else 'sem expiração'})")
+            if self._cache.arquivo:
+                print(f"   • Disco: {self._cache.arquivo}")
+            print(f"   • Acertos: {self._cache.acertos} (memória {estatisticas['acertos_memoria']}, "
+                  f"disco {estatisticas['acertos_disco']}) | Falhas: {estatisticas['falhas']} | "
+                  f"Taxa: {estatisticas['taxa_acerto'] * 100:.1f}%")
+            print(f"   • Expirados: {estatisticas['expirados']} | Removidos (LRU): {estatisticas['removidos']}")
+            print(f"   • Nesta sessão: {self._m_cache_acertos.valor} acertos, {self._m_cache_falhas.valor} falhas\n")
+        
+        if self._limitador is not None:
+            estatisticas = self._limitador.resumo()
+            limites = [f"{estatisticas[chave]} {nome}/min" for chave, nome in (("rpm", "requisições"), ("tpm", "tokens"))
+                       if estatisticas[chave]]
+            print(f"🚦 Limite de Taxa (compartilhado pelo processo): {', '.join(limites)}")
+            print(f"   • Requisições: {estatisticas['reservas']} | Com espera: {estatisticas['esperas']} "
+                  f"({estatisticas['tempo_espera']:.1f} s no total) | Pausas por 429: {estatisticas['pausas']}")
+            print(f"   • Nesta sessão: {self._m_retentativas.valor} retentativas\n")
+        
+        if self._balanceador is not None:
+            print(f"🔀 Balanceador ({len(self._balanceador)} endpoints, compartilhado pelo processo):")
+            for endpoint in self._balanceador.resumo():
+                latencia = f"{endpoint['latencia_media'] * 1000:.0f} ms" if endpoint["latencia_media"] is not None else "-"
+                print(f"   • {'✓' if endpoint['saudavel'] else '✗ ejetado'} {endpoint['url']} "
+                      f"(peso {endpoint['peso']:g}) | em andamento: {endpoint['em_andamento']} | "
+                      f"latência: {latencia} | requisições: {endpoint['requisicoes']} | falhas: {endpoint['falhas']}")
+            print()
+        
+        ganchos = self.ganchos.resumo()
+        if any(ganchos["callbacks"].values()):
+            print("🪝 Ganchos:")
+            print("   • Callbacks: " + ", ".join(f"{evento} {quantidade}"
+                                                 for evento, quantidade in ganchos["callbacks"].items()))
+            if ganchos["falhas"]:
+                print(f"   • Falhas: {ganchos['falhas']} (última: {ganchos['ultimo_erro']})")
+            if self.ultimos_tempos:
+                print("   • Último turno: " + " | ".join(f"{fase} {segundos * 1000:.2f} ms"
+                                                        for fase, segundos in self.ultimos_tempos.items()))
+            print()
+        
+        if self._perfilador is not None:
+            perfil = self._perfilador.resumo()
+            print(f"🔬 Perfil ({perfil['modo']}):")
+            print(f"   • Turnos perfilados: {perfil['turnos']} (ignorados: {perfil['ignorados']})")
+            print(f"   • Arquivo: {perfil['arquivo']} (gravado em fechar() e ao sair)\n")
+        
+        if self._log_binario is not None:
+            print("📜 Log Binário:")
+            print(f"   • Arquivo: {self._log_binario.arquivo_log}")
+            print(f"   • Registros: {self._log_binario.total} "
+                  f"({self._log_binario.tamanho_bytes / 1024:.1f} KiB com o índice)\n")
+        
+        if self._memoria_semantica:
+            print("🔎 Memória Semântica:")
+            print(f"   • Embeddings: {self._memoria_semantica.embedder.descricao}")
+            print(f"   • Turnos guardados: {self._memoria_semantica.total}")
+            print(f"   • Recuperados por envio: até {self._memoria_semantica.top_k}")
+            if self._memoria_semantica.arquivo:
+                print(f"   • Arquivo: {self._memoria_semantica.arquivo}.npy / .json")
+            print()
+        
+        self._exibir_metricas()
         
         if self.modo_debug:
-            print(f"🐛 Modo Debug: Ativo")
+            print("🐛 Modo Debug: Ativo")
             print(f"   • Arquivo de log: {self.arquivo_log}")
             print(f"   • Interações registradas: {self.contador_interacoes}\n")
         else:
-            print(f"🐛 Modo Debug: Desabilitado\n")
+            print("🐛 Modo Debug: Desabilitado\n")
         
         print("═"*70 + "\n")
     
+    def _exibir_metricas(self):
+        """Exibe o resumo das métricas de turno (usado por debug_memoria)"""
+        if not self._m_turnos.valor and not self._m_erros.valor:
+            print("⏱️  Métricas: Nenhum turno registrado\n")
+            return
+        
+        print("⏱️  Métricas:")
+        print(f"   • Turnos: {self._m_turnos.valor} (erros: {self._m_erros.valor})")
+        for titulo, histograma in (("Latência da API", self._m_latencia_api),
+                                   ("Tempo local", self._m_tempo_local),
+                                   ("Primeiro token", self._m_primeiro_token)):
+            if histograma.total:
+                print(f"   • {titulo}: p50 {histograma.percentil(50) * 1000:.1f} ms | "
+                      f"p95 {histograma.percentil(95) * 1000:.1f} ms | "
+                      f"p99 {histograma.percentil(99) * 1000:.1f} ms")
+        if self.config.hedge:
+            print(f"   • Hedge: {self._m_hedges.valor} requisições duplicadas "
+                  f"({self._m_hedges_vitorias.valor} vencidas pela duplicata)")
+        print(f"   • Tokens (API): prompt {self._m_tokens_prompt.valor} | "
+              f"resposta {self._m_tokens_resposta.valor} | em cache {self._m_tokens_cache.valor}")
+        if self._m_tokens_prompt.valor:
+            print(f"   • Prompt em cache: {self._m_tokens_cache.valor / self._m_tokens_prompt.valor:.1%} dos tokens "
+                  f"(contexto estável: {'ativo' if self.contexto_estavel else 'desativado'})")
+        print()
+    
     def grafico_tokens(self):
         """Gera um gráfico ASCII da evolução de tokens no histórico"""
         if len(self.historico) == 0:
@@ -550,11 +1785,11 @@ class ChatComMemoria:
         
         # Calcula tokens acumulados a cada mensagem
         tokens_acumulados = []
-        total_chars = 0
+        total_tokens = 0
         
         for msg in self.historico:
-            total_chars += len(msg["content"])
-            tokens_acumulados.append(total_chars // 4)
+            total_tokens += msg.tokens
+            tokens_acumulados.append(total_tokens)
         
         if not tokens_acumulados:
             print("⚠️  Nenhum dado para exibir\n")
@@ -589,8 +1824,8 @@ class ChatComMemoria:
                 print(f"     |{linha}")
         
         # Linha de base
-        print(f"     └" + "─" * largura_grafico)
-        print(f"      Mensagens: 1" + " " * (largura_grafico - 13) + f"{len(self.historico)}")
+        print("     └" + "─" * largura_grafico)
+        print("      Mensagens: 1" + " " * (largura_grafico - 13) + f"{len(self.historico)}")
         
         if self.limite_maximo:
             percentual = (max_tokens / self.limite_maximo) * 100
@@ -599,12 +1834,14 @@ class ChatComMemoria:
         
         print("\n" + "═"*70 + "\n")
     
-    def exportar_conversa(self, arquivo: str = None):
+    def exportar_conversa(self, arquivo: str = None, completo: bool = False):
         """
         Exporta a conversa para um arquivo de texto.
         
         Args:
             arquivo: Nome do arquivo (se None, usa timestamp)
+            completo: Se True e houver log binário (LOG_BINARIO), exporta toda a
+                     conversa, lida do disco em sequência (sem carregá-la na memória)
         """
         if not arquivo:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -615,13 +1852,544 @@ class ChatComMemoria:
             f.write(f"Modelo: {self.modelo}\n")
             f.write("="*60 + "\n\n")
             
-            for msg in self.historico:
-                role = "VOCÊ" if msg["role"] == "user" else "ASSISTENTE"
-                f.write(f"{role}:\n{msg['content']}\n\n")
+            for role, content in self._mensagens_completas(completo):
+                role = "VOCÊ" if role == "user" else "ASSISTENTE"
+                f.write(f"{role}:\n{content}\n\n")
         
         print(f"Conversa exportada para: {arquivo}\n")
 
 
+class ChatComMemoria(ChatMemoriaBase):
+    """Classe para gerenciar chat com memória usando OpenAI API
+       Todas as configurações são carregadas do arquivo .env"""
+    
+    def _criar_cliente(self):
+        """Cria o cliente síncrono da API"""
+        from openai import OpenAI
+        
+        if self.base_url:
+            return OpenAI(api_key=self.api_key, base_url=self.base_url)
+        return OpenAI(api_key=self.api_key)
+    
+    def _criar(self, cliente, parametros: dict, aguardar_primeiro: bool = True) -> tuple:
+        """
+        Uma chamada de chat.completions.create.
+        
+        Args:
+            aguardar_primeiro: Em streaming, já lê o primeiro trecho (a disputa
+                              do hedge é decidida pela chegada dele)
+        
+        Returns:
+            Tupla (resposta, iteravel): a resposta da API (ou o stream, que pode
+            ser fechado) e o que deve ser consumido (a mesma resposta sem streaming)
+        """
+        resposta = cliente.chat.completions.create(
+            model=self.modelo,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            **parametros
+        )
+        if not (parametros.get("stream") and aguardar_primeiro):
+            return resposta, resposta
+        iterador = iter(resposta)
+        primeiro = next(iterador, None)
+        return resposta, _com_primeiro_trecho(primeiro, resposta, iterador)
+    
+    def _criar_com_hedge(self, cliente, requisicao: Requisicao, atraso: float, estimativa: int,
+                         parametros: dict) -> tuple:
+        """
+        Envia a requisição e, se a primeira resposta (ou o primeiro trecho) não
+        chegar em atraso segundos, envia uma duplicata (em outro endpoint, com
+        balanceador). Vence a primeira que responder; a outra é descartada.
+        
+        Returns:
+            Tupla (resposta ou stream, requisicao da vencedora no balanceador)
+        
+        Raises:
+            Exception: Erro da última a falhar, se ambas falharem
+        """
+        executor = _obter_executor_hedge()
+        primaria = executor.submit(self._criar, cliente, parametros)
+        try:
+            return primaria.result(timeout=atraso)[1], requisicao
+        except TempoEsgotado:
+            pass
+        if not self._pode_duplicar(estimativa):
+            return primaria.result()[1], requisicao
+        
+        try:
+            cliente_duplicata, requisicao_duplicata = self._iniciar_requisicao(requisicao)
+            self._m_hedges.incrementar()
+            duplicata = executor.submit(self._criar, cliente_duplicata, parametros)
+            requisicoes = {primaria: requisicao, duplicata: requisicao_duplicata}
+            
+            pendentes = set(requisicoes)
+            while pendentes:
+                concluidas, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                for futuro in concluidas:
+                    erro = futuro.exception()
+                    if erro is None:
+                        for perdedora in pendentes | (concluidas - {futuro}):
+                            _descartar_perdedora(perdedora, requisicoes[perdedora])
+                        if futuro is duplicata:
+                            self._m_hedges_vitorias.incrementar()
+                        return futuro.result()[1], requisicoes[futuro]
+                    if requisicoes[futuro] is not None:
+                        requisicoes[futuro].concluir(erro)
+            raise erro
+        finally:
+            self._devolver_duplicata(estimativa)
+    
+    def _chamar_api(self, mensagem: str, **parametros) -> tuple:
+        """
+        Chama chat.completions.create respeitando o limite de taxa e repetindo
+        erros temporários (429, 5xx, conexão) com espera exponencial.
+        
+        Args:
+            mensagem: Mensagem do usuário do turno (desfeita se a chamada falhar)
+            **parametros: messages e demais parâmetros da chamada (ex: stream=True)
+        
+        Returns:
+            Tupla (resposta, estimativa) com a resposta da API (ou o stream) e
+            os tokens reservados no limitador
+        
+        Raises:
+            ErroAPI: Erro permanente ou retentativas esgotadas
+        """
+        self._emitir("pre_requisicao", mensagem=mensagem, mensagens=parametros.get("messages"))
+        estimativa = self._estimar_tokens_turno()
+        tentativa = 0
+        requisicao = None
+        while True:
+            if self._limitador is not None:
+                self._m_espera_limitador.observar(self._limitador.aguardar(estimativa))
+            cliente, requisicao = self._iniciar_requisicao(requisicao)
+            atraso = self._atraso_hedge(parametros.get("stream", False))
+            try:
+                if atraso is None:
+                    resposta = self._criar(cliente, parametros, aguardar_primeiro=False)[1]
+                else:
+                    resposta, requisicao = self._criar_com_hedge(cliente, requisicao, atraso, estimativa, parametros)
+            except Exception as e:
+                if requisicao is not None:
+                    requisicao.concluir(e)
+                time.sleep(self._tentativa_falhou(e, mensagem, tentativa, estimativa))
+                tentativa += 1
+                continue
+            if requisicao is not None:
+                requisicao.respondida()
+                if parametros.get("stream"):
+                    # O endpoint só é liberado quando o streaming termina
+                    return _acompanhar_stream(resposta, requisicao), estimativa
+                requisicao.concluir()
+            return resposta, estimativa
+    
+    def enviar_mensagem(self, mensagem: str) -> str:
+        """
+        Envia mensagem para a API mantendo o contexto completo.
+        
+        Args:
+            mensagem: Mensagem do usuário
+            
+        Returns:
+            Resposta do assistente
+        """
+        with self._perfil_turno():
+            return self._enviar_mensagem(mensagem)
+    
+    def _enviar_mensagem(self, mensagem: str) -> str:
+        """Turno de enviar_mensagem() (ver _perfil_turno)"""
+        recuperados = self._recuperar_memoria(mensagem)
+        inicio = time.perf_counter()
+        tokens_antes, mensagens = self._iniciar_turno(mensagem, recuperados)
+        
+        chave_cache, resposta_cache = self._consultar_cache(mensagens)
+        if resposta_cache is not None:
+            self._concluir_turno_cache(mensagem, resposta_cache, tokens_antes, inicio)
+            return resposta_cache
+        
+        try:
+            # Chama a API (limite de taxa e retentativas em _chamar_api)
+            inicio_api = time.perf_counter()
+            resposta, estimativa = self._chamar_api(mensagem, messages=mensagens)
+            fim_api = time.perf_counter()
+            
+            # Extrai resposta
+            resposta_texto = resposta.choices[0].message.content
+            self._acertar_limitador(estimativa, resposta.usage)
+            self._guardar_cache(chave_cache, resposta_texto)
+            
+            self._concluir_turno(mensagem, resposta_texto, tokens_antes,
+                                 latencia_api=fim_api - inicio_api, usage=resposta.usage)
+            self._registrar_metricas_turno(fim_api - inicio_api,
+                                           (inicio_api - inicio) + (time.perf_counter() - fim_api),
+                                           resposta.usage)
+            
+            return resposta_texto
+            
+        except ErroAPI:
+            raise
+        except Exception as e:
+            raise self._erro_api(e, mensagem)
+    
+    def enviar_mensagem_stream(self, mensagem: str) -> Iterator[str]:
+        """
+        Envia mensagem para a API e devolve a resposta em partes (streaming).
+        
+        A resposta completa só é adicionada ao histórico, e as regras de memória
+        (sliding window, alertas e log) só são executadas, quando o gerador
+        termina de ser consumido. O tempo até o primeiro token fica em
+        ultimo_tempo_primeiro_token. Se o gerador for abandonado antes do fim
+        (break, close(), Ctrl+C), o streaming é fechado e o turno é desfeito:
+        a mensagem do usuário não fica no histórico sem resposta.
+        
+        Args:
+            mensagem: Mensagem do usuário
+            
+        Yields:
+            Trechos da resposta do assistente, na ordem em que chegam
+        """
+        with self._perfil_turno():
+            yield from self._enviar_mensagem_stream(mensagem)
+    
+    def _enviar_mensagem_stream(self, mensagem: str) -> Iterator[str]:
+        """Turno de enviar_mensagem_stream() (ver _perfil_turno)"""
+        recuperados = self._recuperar_memoria(mensagem)
+        inicio_turno = time.perf_counter()
+        tokens_antes, mensagens = self._iniciar_turno(mensagem, recuperados)
+        partes = []
+        tempo_primeiro_token = None
+        usage = None
+        
+        chave_cache, resposta_cache = self._consultar_cache(mensagens)
+        if resposta_cache is not None:
+            # Resposta inteira em um único trecho
+            self.ultimo_tempo_primeiro_token = time.perf_counter() - inicio_turno
+            try:
+                yield resposta_cache
+            finally:
+                # Entregue o único trecho, o turno está completo mesmo que o gerador seja abandonado
+                self._concluir_turno_cache(mensagem, resposta_cache, tokens_antes, inicio_turno,
+                                           self.ultimo_tempo_primeiro_token)
+            return
+        
+        inicio = time.perf_counter()
+        stream = None
+        
+        try:
+            stream, estimativa = self._chamar_api(mensagem, messages=mensagens, stream=True,
+                                                  stream_options={"include_usage": True})
+            
+            for chunk in stream:
+                # O último chunk traz apenas o uso de tokens (choices vazio)
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                trecho = chunk.choices[0].delta.content
+                if not trecho:
+                    continue
+                if tempo_primeiro_token is None:
+                    tempo_primeiro_token = time.perf_counter() - inicio
+                    self.ultimo_tempo_primeiro_token = tempo_primeiro_token
+                partes.append(trecho)
+                yield trecho
+            
+        except ErroAPI:
+            raise
+        except Exception as e:
+            raise self._erro_api(e, mensagem)
+        except BaseException:
+            # Gerador abandonado (GeneratorExit) ou interrompido (KeyboardInterrupt)
+            if stream is not None:
+                _fechar_stream(stream)
+            self._interromper_turno(mensagem, "".join(partes))
+            raise
+        
+        fim_api = time.perf_counter()
+        resposta_texto = "".join(partes)
+        self._acertar_limitador(estimativa, usage)
+        self._guardar_cache(chave_cache, resposta_texto)
+        self._concluir_turno(mensagem, resposta_texto, tokens_antes, tempo_primeiro_token,
+                             latencia_api=fim_api - inicio, usage=usage)
+        self._registrar_metricas_turno(fim_api - inicio,
+                                       (inicio - inicio_turno) + (time.perf_counter() - fim_api),
+                                       usage, tempo_primeiro_token)
+
+
+class ChatComMemoriaAsync(ChatMemoriaBase):
+    """Versão assíncrona do chat com memória usando AsyncOpenAI.
+       Permite manter muitas sessões em um único event loop (asyncio)."""
+    
+    _cliente_sincrono = None  # Usado apenas pelas memórias de resumo e semântica
+    
+    def _criar_trava(self):
+        """Trava de turno da sessão (asyncio.Lock, para uso no event loop)"""
+        return asyncio.Lock()
+    
+    def _criar_cliente(self):
+        """Cria o cliente assíncrono da API"""
+        from openai import AsyncOpenAI
+        
+        if self.base_url:
+            return AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+        return AsyncOpenAI(api_key=self.api_key)
+    
+    def _cliente_auxiliar(self):
+        """
+        Cliente síncrono para as memórias de resumo e semântica, que rodam em
+        threads próprias (fora do event loop); criado apenas no primeiro uso.
+        """
+        if self._cliente_sincrono is None:
+            self._cliente_sincrono = ChatComMemoria._criar_cliente(self)
+        return self._cliente_sincrono
+    
+    async def _recuperar_memoria_async(self, mensagem: str) -> List[str]:
+        """_recuperar_memoria() em uma thread, sem bloquear o event loop"""
+        if self._memoria_semantica is None:
+            return []
+        return await asyncio.to_thread(self._recuperar_memoria, mensagem)
+    
+    async def _criar(self, cliente, parametros: dict, aguardar_primeiro: bool = True) -> tuple:
+        """Mesmo comportamento de ChatComMemoria._criar(), no event loop"""
+        resposta = await cliente.chat.completions.create(
+            model=self.modelo,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            **parametros
+        )
+        if not (parametros.get("stream") and aguardar_primeiro):
+            return resposta, resposta
+        iterador = resposta.__aiter__()
+        try:
+            primeiro = await iterador.__anext__()
+        except StopAsyncIteration:
+            primeiro = None
+        return resposta, _com_primeiro_trecho_async(primeiro, resposta, iterador)
+    
+    async def _criar_com_hedge(self, cliente, requisicao: Requisicao, atraso: float, estimativa: int,
+                               parametros: dict) -> tuple:
+        """
+        Mesmo comportamento de ChatComMemoria._criar_com_hedge(); a requisição
+        perdedora é cancelada (a conexão é fechada), com ou sem streaming.
+        """
+        primaria = asyncio.ensure_future(self._criar(cliente, parametros))
+        requisicoes = {primaria: requisicao}
+        vencedora = None
+        duplicada = False
+        try:
+            concluidas, _ = await asyncio.wait({primaria}, timeout=atraso)
+            if concluidas or not self._pode_duplicar(estimativa):
+                resultado = await primaria
+                vencedora = primaria
+                return resultado[1], requisicao
+            
+            duplicada = True
+            cliente_duplicata, requisicao_duplicata = self._iniciar_requisicao(requisicao, assincrono=True)
+            self._m_hedges.incrementar()
+            duplicata = asyncio.ensure_future(self._criar(cliente_duplicata, parametros))
+            requisicoes[duplicata] = requisicao_duplicata
+            
+            pendentes = set(requisicoes)
+            while pendentes:
+                concluidas, pendentes = await asyncio.wait(pendentes, return_when=asyncio.FIRST_COMPLETED)
+                for tarefa in concluidas:
+                    erro = tarefa.exception()
+                    if erro is None:
+                        vencedora = tarefa
+                        if tarefa is duplicata:
+                            self._m_hedges_vitorias.incrementar()
+                        return tarefa.result()[1], requisicoes[tarefa]
+                    if requisicoes[tarefa] is not None:
+                        requisicoes[tarefa].concluir(erro)
+            raise erro
+        finally:
+            if duplicada:
+                self._devolver_duplicata(estimativa)
+            for tarefa, requisicao_tarefa in requisicoes.items():
+                if tarefa is vencedora:
+                    continue
+                if not tarefa.done():
+                    # Perdedora em andamento: a conexão é fechada e, sem resposta,
+                    # o endpoint é liberado sem registrar sucesso nem latência
+                    tarefa.cancel()
+                    if requisicao_tarefa is not None:
+                        requisicao_tarefa.descartar()
+                elif vencedora is None or tarefa.exception() is not None:
+                    continue  # Falhou: o erro já foi registrado (aqui ou pelo chamador)
+                else:
+                    # Terminou junto com a vencedora: fecha o streaming sem consumi-lo
+                    resposta = tarefa.result()[0]
+                    if not hasattr(resposta, "choices"):
+                        await resposta.close()
+                    if requisicao_tarefa is not None:
+                        requisicao_tarefa.concluir()
+    
+    async def _chamar_api(self, mensagem: str, **parametros) -> tuple:
+        """Mesmo comportamento de ChatComMemoria._chamar_api(), sem bloquear o event loop"""
+        self._emitir("pre_requisicao", mensagem=mensagem, mensagens=parametros.get("messages"))
+        estimativa = self._estimar_tokens_turno()
+        tentativa = 0
+        requisicao = None
+        while True:
+            if self._limitador is not None:
+                self._m_espera_limitador.observar(await self._limitador.aguardar_async(estimativa))
+            cliente, requisicao = self._iniciar_requisicao(requisicao, assincrono=True)
+            atraso = self._atraso_hedge(parametros.get("stream", False))
+            try:
+                if atraso is None:
+                    resposta = (await self._criar(cliente, parametros, aguardar_primeiro=False))[1]
+                else:
+                    resposta, requisicao = await self._criar_com_hedge(cliente, requisicao, atraso, estimativa,
+                                                                       parametros)
+            except Exception as e:
+                if requisicao is not None:
+                    requisicao.concluir(e)
+                await asyncio.sleep(self._tentativa_falhou(e, mensagem, tentativa, estimativa))
+                tentativa += 1
+                continue
+            if requisicao is not None:
+                requisicao.respondida()
+                if parametros.get("stream"):
+                    return _acompanhar_stream_async(resposta, requisicao), estimativa
+                requisicao.concluir()
+            return resposta, estimativa
+    
+    async def enviar_mensagem(self, mensagem: str) -> str:
+        """
+        Envia mensagem para a API mantendo o contexto completo (assíncrono).
+        
+        Args:
+            mensagem: Mensagem do usuário
+            
+        Returns:
+            Resposta do assistente
+        """
+        with self._perfil_turno():
+            return await self._enviar_mensagem(mensagem)
+    
+    async def _enviar_mensagem(self, mensagem: str) -> str:
+        """Turno de enviar_mensagem() (ver _perfil_turno)"""
+        recuperados = await self._recuperar_memoria_async(mensagem)
+        inicio = time.perf_counter()
+        tokens_antes, mensagens = self._iniciar_turno(mensagem, recuperados)
+        
+        chave_cache, resposta_cache = self._consultar_cache(mensagens)
+        if resposta_cache is not None:
+            self._concluir_turno_cache(mensagem, resposta_cache, tokens_antes, inicio)
+            return resposta_cache
+        
+        try:
+            inicio_api = time.perf_counter()
+            resposta, estimativa = await self._chamar_api(mensagem, messages=mensagens)
+            fim_api = time.perf_counter()
+            
+            resposta_texto = resposta.choices[0].message.content
+            self._acertar_limitador(estimativa, resposta.usage)
+            self._guardar_cache(chave_cache, resposta_texto)
+            
+            self._concluir_turno(mensagem, resposta_texto, tokens_antes,
+                                 latencia_api=fim_api - inicio_api, usage=resposta.usage)
+            self._registrar_metricas_turno(fim_api - inicio_api,
+                                           (inicio_api - inicio) + (time.perf_counter() - fim_api),
+                                           resposta.usage)
+            
+            return resposta_texto
+            
+        except ErroAPI:
+            raise
+        except Exception as e:
+            raise self._erro_api(e, mensagem)
+    
+    async def enviar_mensagem_stream(self, mensagem: str) -> AsyncIterator[str]:
+        """
+        Envia mensagem para a API e devolve a resposta em partes (assíncrono).
+        
+        Mesmo comportamento de ChatComMemoria.enviar_mensagem_stream(): a resposta
+        só é adicionada ao histórico quando o gerador termina de ser consumido.
+        Um gerador abandonado só é desfeito ao ser fechado (aclose(), ou
+        contextlib.aclosing); sem isso, quando o event loop o finalizar.
+        
+        Args:
+            mensagem: Mensagem do usuário
+            
+        Yields:
+            Trechos da resposta do assistente, na ordem em que chegam
+        """
+        turno = self._enviar_mensagem_stream(mensagem)
+        with self._perfil_turno():
+            try:
+                async for trecho in turno:
+                    yield trecho
+            finally:
+                # async for não fecha o gerador interno se este for abandonado
+                await turno.aclose()
+    
+    async def _enviar_mensagem_stream(self, mensagem: str) -> AsyncIterator[str]:
+        """Turno de enviar_mensagem_stream() (ver _perfil_turno)"""
+        recuperados = await self._recuperar_memoria_async(mensagem)
+        inicio_turno = time.perf_counter()
+        tokens_antes, mensagens = self._iniciar_turno(mensagem, recuperados)
+        partes = []
+        tempo_primeiro_token = None
+        usage = None
+        
+        chave_cache, resposta_cache = self._consultar_cache(mensagens)
+        if resposta_cache is not None:
+            # Resposta inteira em um único trecho
+            self.ultimo_tempo_primeiro_token = time.perf_counter() - inicio_turno
+            try:
+                yield resposta_cache
+            finally:
+                # Entregue o único trecho, o turno está completo mesmo que o gerador seja abandonado
+                self._concluir_turno_cache(mensagem, resposta_cache, tokens_antes, inicio_turno,
+                                           self.ultimo_tempo_primeiro_token)
+            return
+        
+        inicio = time.perf_counter()
+        stream = None
+        
+        try:
+            stream, estimativa = await self._chamar_api(mensagem, messages=mensagens, stream=True,
+                                                        stream_options={"include_usage": True})
+            
+            async for chunk in stream:
+                # O último chunk traz apenas o uso de tokens (choices vazio)
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                trecho = chunk.choices[0].delta.content
+                if not trecho:
+                    continue
+                if tempo_primeiro_token is None:
+                    tempo_primeiro_token = time.perf_counter() - inicio
+                    self.ultimo_tempo_primeiro_token = tempo_primeiro_token
+                partes.append(trecho)
+                yield trecho
+            
+        except ErroAPI:
+            raise
+        except Exception as e:
+            raise self._erro_api(e, mensagem)
+        except BaseException:
+            # Gerador abandonado (GeneratorExit) ou tarefa cancelada (CancelledError)
+            if stream is not None:
+                await _fechar_stream_async(stream)
+            self._interromper_turno(mensagem, "".join(partes))
+            raise
+        
+        fim_api = time.perf_counter()
+        resposta_texto = "".join(partes)
+        self._acertar_limitador(estimativa, usage)
+        self._guardar_cache(chave_cache, resposta_texto)
+        self._concluir_turno(mensagem, resposta_texto, tokens_antes, tempo_primeiro_token,
+                             latencia_api=fim_api - inicio, usage=usage)
+        self._registrar_metricas_turno(fim_api - inicio,
+                                       (inicio - inicio_turno) + (time.perf_counter() - fim_api),
+                                       usage, tempo_primeiro_token)
+
+
 def chat_interativo():
     """Função principal para chat interativo no terminal"""
     
@@ -630,11 +2398,12 @@ def chat_interativo():
     print("="*60)
     print("\nComandos especiais:")
     print("  /limpar    - Limpa a memória do chat")
-    print("  /historico - Mostra todo o histórico")
+    print("  /historico - Mostra todo o histórico (/historico completo: inclui o log binário)")
     print("  /tokens    - Mostra quantidade aproximada de tokens")
     print("  /debug     - Exibe informações detalhadas de memória")
     print("  /grafico   - Mostra gráfico de evolução de tokens")
-    print("  /exportar  - Exporta a conversa para arquivo")
+    print("  /metricas  - Exibe as métricas no formato Prometheus")
+    print("  /exportar  - Exporta a conversa para arquivo (/exportar completo: inclui o log binário)")
     print("  /sair      - Encerra o chat")
     print("="*60 + "\n")
     
@@ -654,6 +2423,7 @@ def chat_interativo():
             
             # Processa comandos especiais
             if mensagem.lower() == "/sair":
+                chat.fechar()
                 print("\nEncerrando chat. Até logo")
                 break
             
@@ -661,8 +2431,8 @@ def chat_interativo():
                 chat.limpar_historico()
                 continue
             
-            elif mensagem.lower() == "/historico":
-                chat.mostrar_historico()
+            elif mensagem.lower() in ("/historico", "/historico completo"):
+                chat.mostrar_historico(completo=mensagem.lower().endswith("completo"))
                 continue
             
             elif mensagem.lower() == "/tokens":
@@ -678,16 +2448,27 @@ def chat_interativo():
                 chat.grafico_tokens()
                 continue
             
-            elif mensagem.lower() == "/exportar":
-                chat.exportar_conversa()
+            elif mensagem.lower() == "/metricas":
+                print()
+                print(chat.metricas.exportar_prometheus())
+                continue
+            
+            elif mensagem.lower() in ("/exportar", "/exportar completo"):
+                chat.exportar_conversa(completo=mensagem.lower().endswith("completo"))
                 continue
             
             # Envia mensagem e recebe resposta
             try:
                 print("\nAssistente: ", end="", flush=True)
-                resposta = chat.enviar_mensagem(mensagem)
-                print(resposta + "\n")
+                for trecho in chat.enviar_mensagem_stream(mensagem):
+                    print(trecho, end="", flush=True)
+                print("\n")
                 
+            except ErroAPI as e:
+                # O turno foi desfeito: a conversa continua como estava
+                print(f"\nErro: {e}")
+                print("A mensagem não entrou no histórico; envie novamente para tentar outra vez.\n")
+            
             except Exception as e:
                 print(f"\nErro: {e}\n")
                 break
@@ -740,8 +2521,6 @@ def exemplo_programatico():
 
 
 if __name__ == "__main__":
-    import sys
-    
     # Se receber argumento --exemplo, roda exemplo programático
     if len(sys.argv) > 1 and sys.argv[1] == "--exemplo":
         exemplo_programatico()
@@ -0,0 +1,320 @@
+"""
+Configuração - Carregamento e validação únicos do arquivo .env
+
+O .env é lido e validado uma única vez por processo (carregar_configuracao).
+O resultado é um objeto imutável compartilhado por todas as instâncias de
+ChatComMemoria; ajustes por sessão são feitos com config.com(...), que cria
+uma cópia validada sem reler o arquivo.
+"""
+
+import os
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+
+
+def _ler_inteiro_opcional(nome: str, padrao: Optional[int] = None) -> Optional[int]:
+    """Lê uma variável inteira opcional do ambiente (padrao se ausente)"""
+    valor = os.getenv(nome)
+    if not valor:
+        return padrao
+    try:
+        return int(valor)
+    except ValueError as e:
+        raise ValueError(f"{nome} inválida: '{valor}'. Use um número inteiro") from e
+
+
+def _ler_decimal_opcional(nome: str, padrao: Optional[float] = None) -> Optional[float]:
+    """Lê uma variável decimal opcional do ambiente (padrao se ausente)"""
+    valor = os.getenv(nome)
+    if not valor:
+        return padrao
+    try:
+        return float(valor)
+    except ValueError as e:
+        raise ValueError(f"{nome} inválida: '{valor}'. Use um número") from e
+
+
+def _ler_endpoints(nome: str) -> Tuple[Tuple[str, float, Optional[str]], ...]:
+    """
+    Lê uma lista de endpoints "url|peso[|VARIAVEL_DA_CHAVE],..." do ambiente.
+
+    O peso é opcional (padrão 1). Returns: tupla de (url, peso, variavel_chave).
+    """
+    valor = os.getenv(nome)
+    if not valor:
+        return ()
+    endpoints = []
+    for item in valor.split(","):
+        campos = [campo.strip() for campo in item.strip().split("|")]
+        if not campos[0]:
+            continue
+        try:
+            peso = float(campos[1]) if len(campos) > 1 and campos[1] else 1.0
+        except ValueError as e:
+            raise ValueError(f"{nome} inválida: peso '{campos[1]}' em '{item.strip()}'. Use um número") from e
+        endpoints.append((campos[0], peso, campos[2] if len(campos) > 2 and campos[2] else None))
+    return tuple(endpoints)
+
+
+@dataclass(frozen=True)
+class ConfiguracaoChat:
+    """Configurações do chat, validadas na criação e imutáveis depois disso"""
+
+    api_key: str
+    modelo: str
+    temperature: float
+    max_tokens: int
+    base_url: Optional[str] = None
+    tamanho_janela: Optional[int] = None
+    janela_tokens: Optional[int] = None
+    limite_maximo: Optional[int] = None
+    modo_debug: bool = False
+    tipo_contador_tokens: str = "bpe"
+    exibir_banner: bool = True
+    pool_max_conexoes: int = 100
+    pool_max_ociosas: int = 20
+    pool_aquecer: int = 0
+    log_intervalo_flush: float = 1.0
+    log_max_pendentes: int = 10000
+    log_modo: str = "completo"
+    memoria_resumo: bool = False
+    resumo_modelo: Optional[str] = None
+    resumo_max_tokens: int = 300
+    memoria_semantica: bool = False
+    semantica_top_k: int = 3
+    embeddings_modelo: str = "text-embedding-3-small"
+    semantica_diretorio: Optional[str] = None
+    armazenamento_sqlite: Optional[str] = None
+    armazenamento_intervalo_commit: float = 0.5
+    log_binario: Optional[str] = None
+    log_binario_fsync: bool = False
+    cache_respostas: bool = False
+    cache_max_itens: int = 1000
+    cache_ttl: float = 3600.0
+    cache_arquivo: Optional[str] = None
+    contexto_estavel: bool = False
+    contexto_folga: float = 0.5
+    lote_intervalo_consulta: float = 10.0
+    limite_rpm: Optional[int] = None
+    limite_tpm: Optional[int] = None
+    retentativas_max: int = 3
+    retentativa_espera_base: float = 0.5
+    retentativa_espera_max: float = 30.0
+    base_urls: Tuple[Tuple[str, float, Optional[str]], ...] = ()
+    balanceador_falhas_ejecao: int = 3
+    balanceador_tempo_ejecao: float = 30.0
+    balanceador_intervalo_saude: float = 10.0
+    balanceador_afinidade: bool = True
+    hedge: bool = False
+    hedge_percentil: float = 95.0
+    hedge_min_amostras: int = 20
+    modo_profile: Optional[str] = None
+
+    def __post_init__(self):
+        if not self.api_key:
+            raise ValueError(
+                "OPENAI_API_KEY não configurada. "
+                "Crie o arquivo .env com: OPENAI_API_KEY=sua-chave-aqui"
+            )
+        if not self.modelo:
+            raise ValueError(
+                "OPENAI_MODEL não configurada. "
+                "Adicione no arquivo .env: OPENAI_MODEL=gpt-4o-mini"
+            )
+        if not 0.0 <= self.temperature <= 2.0:
+            raise ValueError(f"OPENAI_TEMPERATURE deve estar entre 0.0 e 2.0, recebido: {self.temperature}")
+        if self.max_tokens <= 0:
+            raise ValueError(f"OPENAI_MAX_TOKENS deve ser maior que 0, recebido: {self.max_tokens}")
+        if self.base_url and not (self.base_url.startswith("http://") or self.base_url.startswith("https://")):
+            raise ValueError(
+                f"OPENAI_BASE_URL inválida: '{self.base_url}'. "
+                f"A URL deve começar com http:// ou https://"
+            )
+        if self.janela_tokens is not None and self.janela_tokens <= 0:
+            raise ValueError(f"JANELA_TOKENS deve ser maior que 0, recebido: {self.janela_tokens}")
+        if self.pool_max_conexoes <= 0 or self.pool_max_ociosas < 0:
+            raise ValueError(
+                f"Limites do pool inválidos: POOL_MAX_CONEXOES={self.pool_max_conexoes}, "
+                f"POOL_MAX_OCIOSAS={self.pool_max_ociosas}"
+            )
+        if self.log_intervalo_flush <= 0 or self.log_max_pendentes <= 0:
+            raise ValueError(
+                f"Configuração de log inválida: LOG_INTERVALO_FLUSH={self.log_intervalo_flush}, "
+                f"LOG_MAX_PENDENTES={self.log_max_pendentes} (ambos devem ser maiores que 0)"
+            )
+        if self.resumo_max_tokens <= 0:
+            raise ValueError(f"RESUMO_MAX_TOKENS deve ser maior que 0, recebido: {self.resumo_max_tokens}")
+        if self.semantica_top_k <= 0:
+            raise ValueError(f"SEMANTICA_TOP_K deve ser maior que 0, recebido: {self.semantica_top_k}")
+        if self.armazenamento_intervalo_commit < 0:
+            raise ValueError(
+                f"ARMAZENAMENTO_INTERVALO_COMMIT não pode ser negativo, recebido: "
+                f"{self.armazenamento_intervalo_commit}"
+            )
+        if self.cache_max_itens <= 0 or self.cache_ttl < 0:
+            raise ValueError(
+                f"Configuração do cache inválida: CACHE_MAX_ITENS={self.cache_max_itens} "
+                f"(deve ser maior que 0), CACHE_TTL={self.cache_ttl} (não pode ser negativo)"
+            )
+        if not 0 < self.contexto_folga < 1:
+            raise ValueError(f"CONTEXTO_FOLGA deve estar entre 0 e 1 (exclusive), recebido: {self.contexto_folga}")
+        if self.lote_intervalo_consulta <= 0:
+            raise ValueError(
+                f"LOTE_INTERVALO_CONSULTA deve ser maior que 0, recebido: {self.lote_intervalo_consulta}"
+            )
+        if (self.limite_rpm is not None and self.limite_rpm <= 0) or (self.limite_tpm is not None and self.limite_tpm <= 0):
+            raise ValueError(
+                f"Limites de taxa inválidos: LIMITE_RPM={self.limite_rpm}, LIMITE_TPM={self.limite_tpm} "
+                f"(devem ser maiores que 0)"
+            )
+        if self.retentativas_max < 0 or self.retentativa_espera_base <= 0 or self.retentativa_espera_max <= 0:
+            raise ValueError(
+                f"Configuração de retentativas inválida: RETENTATIVAS_MAX={self.retentativas_max} "
+                f"(não pode ser negativo), RETENTATIVA_ESPERA_BASE={self.retentativa_espera_base}, "
+                f"RETENTATIVA_ESPERA_MAX={self.retentativa_espera_max} (devem ser maiores que 0)"
+            )
+        for url, peso, _ in self.base_urls:
+            if not (url.startswith("http://") or url.startswith("https://")) or peso <= 0:
+                raise ValueError(
+                    f"OPENAI_BASE_URLS inválida: '{url}|{peso:g}'. "
+                    f"Cada URL deve começar com http:// ou https:// e ter peso maior que 0"
+                )
+        if (self.balanceador_falhas_ejecao <= 0 or self.balanceador_tempo_ejecao < 0
+                or self.balanceador_intervalo_saude < 0):
+            raise ValueError(
+                f"Configuração do balanceador inválida: BALANCEADOR_FALHAS_EJECAO={self.balanceador_falhas_ejecao} "
+                f"(deve ser maior que 0), BALANCEADOR_TEMPO_EJECAO={self.balanceador_tempo_ejecao}, "
+                f"BALANCEADOR_INTERVALO_SAUDE={self.balanceador_intervalo_saude} (não podem ser negativos)"
+            )
+        if not 0 < self.hedge_percentil < 100 or self.hedge_min_amostras < 1:
+            raise ValueError(
+                f"Configuração de hedge inválida: HEDGE_PERCENTIL={self.hedge_percentil} "
+                f"(deve estar entre 0 e 100, exclusive), HEDGE_MIN_AMOSTRAS={self.hedge_min_amostras} "
+                f"(deve ser maior que 0)"
+            )
+        if self.log_modo not in ("completo", "delta"):
+            raise ValueError(f"LOG_MODO inválido: '{self.log_modo}'. Use 'completo' ou 'delta'")
+        if self.modo_profile not in (None, "cprofile", "tracemalloc"):
+            raise ValueError(f"MODO_PROFILE inválido: '{self.modo_profile}'. Use 'cprofile' ou 'tracemalloc'")
+
+    @classmethod
+    def do_ambiente(cls) -> "ConfiguracaoChat":
+        """
+        Lê e valida as configurações do arquivo .env (e variáveis de ambiente).
+
+        O sistema falhará se qualquer variável obrigatória estiver faltando ou inválida.
+
+        Returns:
+            Nova instância de ConfiguracaoChat
+        """
+        # Carregar .env OBRIGATORIAMENTE
+        load_dotenv()
+
+        # Validar Temperature
+        temp_str = os.getenv("OPENAI_TEMPERATURE")
+        if not temp_str:
+            raise ValueError(
+                "OPENAI_TEMPERATURE não configurada. "
+                "Adicione no arquivo .env: OPENAI_TEMPERATURE=0.7"
+            )
+        try:
+            temperature = float(temp_str)
+        except ValueError as e:
+            raise ValueError(
+                f"OPENAI_TEMPERATURE inválida: '{temp_str}'. "
+                f"Use um número entre 0.0 e 2.0"
+            ) from e
+
+        # Validar Max Tokens
+        tokens_str = os.getenv("OPENAI_MAX_TOKENS")
+        if not tokens_str:
+            raise ValueError(
+                "OPENAI_MAX_TOKENS não configurada. "
+                "Adicione no arquivo .env: OPENAI_MAX_TOKENS=1000"
+            )
+        try:
+            max_tokens = int(tokens_str)
+        except ValueError as e:
+            raise ValueError(
+                f"OPENAI_MAX_TOKENS inválida: '{tokens_str}'. "
+                f"Use um número inteiro positivo"
+            ) from e
+
+        return cls(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            modelo=os.getenv("OPENAI_MODEL"),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            tamanho_janela=_ler_inteiro_opcional("JANELA_MAX"),
+            janela_tokens=_ler_inteiro_opcional("JANELA_TOKENS"),
+            limite_maximo=_ler_inteiro_opcional("LIMITE_MAXIMO"),
+            modo_debug=os.getenv("MODO_DEBUG", "false").lower() == "true",
+            tipo_contador_tokens=os.getenv("CONTADOR_TOKENS", "bpe"),
+            pool_max_conexoes=_ler_inteiro_opcional("POOL_MAX_CONEXOES", 100),
+            pool_max_ociosas=_ler_inteiro_opcional("POOL_MAX_OCIOSAS", 20),
+            pool_aquecer=_ler_inteiro_opcional("POOL_AQUECER", 0),
+            log_intervalo_flush=_ler_decimal_opcional("LOG_INTERVALO_FLUSH", 1.0),
+            log_max_pendentes=_ler_inteiro_opcional("LOG_MAX_PENDENTES", 10000),
+            log_modo=os.getenv("LOG_MODO", "completo").lower(),
+            memoria_resumo=os.getenv("MEMORIA_RESUMO", "false").lower() == "true",
+            resumo_modelo=os.getenv("RESUMO_MODELO") or None,
+            resumo_max_tokens=_ler_inteiro_opcional("RESUMO_MAX_TOKENS", 300),
+            memoria_semantica=os.getenv("MEMORIA_SEMANTICA", "false").lower() == "true",
+            semantica_top_k=_ler_inteiro_opcional("SEMANTICA_TOP_K", 3),
+            embeddings_modelo=os.getenv("EMBEDDINGS_MODELO") or "text-embedding-3-small",
+            semantica_diretorio=os.getenv("SEMANTICA_DIRETORIO") or None,
+            armazenamento_sqlite=os.getenv("ARMAZENAMENTO_SQLITE") or None,
+            armazenamento_intervalo_commit=_ler_decimal_opcional("ARMAZENAMENTO_INTERVALO_COMMIT", 0.5),
+            log_binario=os.getenv("LOG_BINARIO") or None,
+            log_binario_fsync=os.getenv("LOG_BINARIO_FSYNC", "false").lower() == "true",
+            cache_respostas=os.getenv("CACHE_RESPOSTAS", "false").lower() == "true",
+            cache_max_itens=_ler_inteiro_opcional("CACHE_MAX_ITENS", 1000),
+            cache_ttl=_ler_decimal_opcional("CACHE_TTL", 3600.0),
+            cache_arquivo=os.getenv("CACHE_ARQUIVO") or None,
+            contexto_estavel=os.getenv("CONTEXTO_ESTAVEL", "false").lower() == "true",
+            contexto_folga=_ler_decimal_opcional("CONTEXTO_FOLGA", 0.5),
+            lote_intervalo_consulta=_ler_decimal_opcional("LOTE_INTERVALO_CONSULTA", 10.0),
+            limite_rpm=_ler_inteiro_opcional("LIMITE_RPM"),
+            limite_tpm=_ler_inteiro_opcional("LIMITE_TPM"),
+            retentativas_max=_ler_inteiro_opcional("RETENTATIVAS_MAX", 3),
+            retentativa_espera_base=_ler_decimal_opcional("RETENTATIVA_ESPERA_BASE", 0.5),
+            retentativa_espera_max=_ler_decimal_opcional("RETENTATIVA_ESPERA_MAX", 30.0),
+            base_urls=_ler_endpoints("OPENAI_BASE_URLS"),
+            balanceador_falhas_ejecao=_ler_inteiro_opcional("BALANCEADOR_FALHAS_EJECAO", 3),
+            balanceador_tempo_ejecao=_ler_decimal_opcional("BALANCEADOR_TEMPO_EJECAO", 30.0),
+            balanceador_intervalo_saude=_ler_decimal_opcional("BALANCEADOR_INTERVALO_SAUDE", 10.0),
+            balanceador_afinidade=os.getenv("BALANCEADOR_AFINIDADE", "true").lower() == "true",
+            hedge=os.getenv("HEDGE", "false").lower() == "true",
+            hedge_percentil=_ler_decimal_opcional("HEDGE_PERCENTIL", 95.0),
+            hedge_min_amostras=_ler_inteiro_opcional("HEDGE_MIN_AMOSTRAS", 20),
+            modo_profile=os.getenv("MODO_PROFILE", "").lower() or None,
+        )
+
+    def com(self, **alteracoes) -> "ConfiguracaoChat":
+        """
+        Cria uma cópia com algumas configurações alteradas (ex: por sessão).
+
+        Valores None são ignorados, mantendo a configuração original.
+
+        Example:
+            config.com(tamanho_janela=4, temperature=0.0)
+        """
+        alteracoes = {chave: valor for chave, valor in alteracoes.items() if valor is not None}
+        if not alteracoes:
+            return self
+        return replace(self, **alteracoes)
+
+
+@lru_cache(maxsize=1)
+def carregar_configuracao() -> ConfiguracaoChat:
+    """
+    Retorna a configuração do processo, lendo o .env apenas na primeira chamada.
+
+    Para forçar uma nova leitura (ex: após alterar o .env), use
+    carregar_configuracao.cache_clear().
+    """
+    return ConfiguracaoChat.do_ambiente()
@@ -0,0 +1,94 @@
+"""
+Contagem de Tokens - Contadores plugáveis para ChatComMemoria
+
+Fornece a estimativa simples (~4 caracteres por token) e um contador exato
+baseado no tokenizador BPE do modelo configurado (via tiktoken).
+
+O tokenizador só é carregado na primeira contagem, para não atrasar a
+inicialização. Se o tiktoken não estiver instalado ou o vocabulário não puder
+ser carregado, o contador BPE volta para a estimativa de ~4 caracteres.
+"""
+
+# Vocabulário usado quando o tiktoken não conhece o modelo (ex: modelos locais via Ollama)
+CODIFICACAO_PADRAO = "o200k_base"
+
+
+class ContadorTokens:
+    """Contador aproximado: ~4 caracteres por token"""
+
+    def contar(self, texto: str) -> int:
+        """
+        Conta os tokens de um texto.
+
+        Args:
+            texto: Texto a ser contado
+
+        Returns:
+            Quantidade de tokens
+        """
+        return len(texto) // 4
+
+    @property
+    def descricao(self) -> str:
+        """Descrição curta do método de contagem (exibida no debug)"""
+        return "aproximado (~4 caracteres por token)"
+
+
+class ContadorTokensBPE(ContadorTokens):
+    """Contador exato usando o tokenizador BPE do modelo (tiktoken)"""
+
+    def __init__(self, modelo: str):
+        """
+        Args:
+            modelo: Nome do modelo (OPENAI_MODEL) usado para escolher o vocabulário
+        """
+        self.modelo = modelo
+        self._codificador = None
+        self._indisponivel = False
+
+    def _obter_codificador(self):
+        """Carrega o tokenizador na primeira chamada; retorna None se indisponível"""
+        if self._codificador is None and not self._indisponivel:
+            try:
+                import tiktoken
+                try:
+                    self._codificador = tiktoken.encoding_for_model(self.modelo)
+                except KeyError:
+                    self._codificador = tiktoken.get_encoding(CODIFICACAO_PADRAO)
+            except Exception:
+                # tiktoken ausente ou vocabulário indisponível offline
+                self._indisponivel = True
+        return self._codificador
+
+    def contar(self, texto: str) -> int:
+        codificador = self._obter_codificador()
+        if codificador is None:
+            return super().contar(texto)
+        return len(codificador.encode(texto, disallowed_special=()))
+
+    @property
+    def descricao(self) -> str:
+        if self._indisponivel:
+            return f"{super().descricao} - tokenizador BPE indisponível"
+        if self._codificador is None:
+            return f"BPE para {self.modelo} (ainda não carregado)"
+        return f"BPE {self._codificador.name} ({self.modelo})"
+
+
+def criar_contador(modelo: str, tipo: str = "bpe") -> ContadorTokens:
+    """
+    Cria o contador de tokens configurado.
+
+    Args:
+        modelo: Nome do modelo (OPENAI_MODEL)
+        tipo: 'bpe' (exato, com fallback) ou 'aproximado' (~4 caracteres por token)
+
+    Returns:
+        Instância de ContadorTokens
+    """
+    tipo = (tipo or "bpe").lower()
+    if tipo == "aproximado":
+        return ContadorTokens()
+    if tipo == "bpe":
+        return ContadorTokensBPE(modelo)
+    raise ValueError(f"CONTADOR_TOKENS inválido: '{tipo}'. Use 'bpe' ou 'aproximado'")
@@ -8,6 +8,7 @@ O sistema falhará se qualquer variável obrigatória estiver faltando.
 """
 
 from chat_openai_memoria import ChatComMemoria
+from gerenciador_sessoes import GerenciadorSessoes
 import time
 
 
@@ -18,35 +19,48 @@ def exemplo_multiplas_personalidades():
     print("EXEMPLO: MÚLTIPLAS PERSONALIDADES")
     print("="*60 + "\n")
     
+    # Um único cliente (e pool de conexões) compartilhado pelas sessões
+    gerenciador = GerenciadorSessoes()
+    
     # Chat 1: Professor de Python
-    professor = ChatComMemoria()
+    professor = gerenciador.obter("professor")
     professor.definir_personalidade(
         "Você é um professor de Python experiente. "
         "Responda de forma didática e use exemplos práticos."
     )
     
     # Chat 2: Code Reviewer
-    reviewer = ChatComMemoria()
+    reviewer = gerenciador.obter("reviewer")
     reviewer.definir_personalidade(
         "Você é um code reviewer experiente. "
         "Analise código criticamente e sugira melhorias."
     )
     
-    # Pergunta ao professor
-    print("PERGUNTANDO AO PROFESSOR:")
+    # Mesma pergunta às duas personalidades, em paralelo
+    # (o tempo total é o da resposta mais lenta, não a soma)
+    print("PERGUNTANDO AO PROFESSOR E AO REVIEWER:")
     codigo_exemplo = """
 def calcular(a, b):
     return a + b
 """
     pergunta = f"Como posso melhorar esta função?\n{codigo_exemplo}"
-    resposta_prof = professor.enviar_mensagem(pergunta)
-    print(f"Professor: {resposta_prof}\n")
     
-    # Mesma pergunta ao reviewer
-    print("-"*60)
-    print("\nPERGUNTANDO AO REVIEWER:")
-    resposta_review = reviewer.enviar_mensagem(pergunta)
-    print(f"Reviewer: {resposta_review}\n")
+    def exibir_resposta(sessao_id, resultado):
+        # Chamado assim que cada personalidade responde
+        print("-"*60)
+        if resultado["erro"]:
+            print(f"\n{sessao_id.capitalize()}: [erro] {resultado['erro']}\n")
+        else:
+            print(f"\n{sessao_id.capitalize()} ({resultado['segundos']:.1f}s): {resultado['resposta']}\n")
+    
+    inicio = time.time()
+    resultados = gerenciador.transmitir(pergunta, ["professor", "reviewer"], prazo=60,
+                                        ao_concluir=exibir_resposta)
+    sem_resposta = [sessao_id for sessao_id, r in resultados.items() if r["segundos"] is None]
+    print(f"Tempo total: {time.time() - inicio:.1f}s"
+          + (f" (sem resposta no prazo: {', '.join(sem_resposta)})" if sem_resposta else "") + "\n")
+    
+    gerenciador.fechar()
     
     print("="*60)
     print("Nota: Respostas diferentes devido a personalidades distintas")
@@ -374,7 +388,7 @@ def exemplo_modo_debug():
     
     print("\n" + "-"*60)
     print("\nConversação concluída!")
-    print(f"\nVerifique o arquivo de log para ver detalhes completos:")
+    print("\nVerifique o arquivo de log para ver detalhes completos:")
     print(f"  📄 {chat.arquivo_log}\n")
     
     chat.debug_memoria()
@@ -0,0 +1,110 @@
+"""
+Ganchos - Callbacks nas fases do envio de mensagens
+
+Permite acompanhar cada turno de enviar_mensagem() / enviar_mensagem_stream()
+(tempos, rastreamento, auditoria) sem alterar nem estender a classe do chat:
+
+    def registrar_tempos(dados):
+        print(dados["sessao_id"], dados["tempos"])
+
+    chat.ganchos.registrar("pos_resposta", registrar_tempos)
+
+    @chat.ganchos.registrar("ao_alertar")
+    def avisar(dados):
+        ...
+
+Eventos (cada callback recebe um dict com "evento", "sessao_id" e "tempos"):
+    pre_requisicao  Prompt montado, antes de enviar à API (e da espera do
+                    limite de taxa). + "mensagem" e "mensagens" (as mensagens
+                    que serão enviadas: iterável com len(), somente leitura)
+    pos_resposta    Turno concluído (também os respondidos pelo cache).
+                    + "mensagem", "resposta" e "usage" (None se a API não informou)
+    ao_remover      O sliding window removeu mensagens do histórico.
+                    + "removidas" (as mensagens, da mais antiga para a mais recente)
+    ao_alertar      A contagem de tokens gerou alertas.
+                    + "alertas" (textos) e "tokens"
+
+"tempos" traz a duração, em segundos, das fases do turno já executadas
+(ver chat.ultimos_tempos): verificar_tokens, anexar, montar_prompt, api,
+persistir, janela e log.
+
+Os callbacks executam na thread do turno (ou no event loop, no modo
+assíncrono) e devem ser rápidos. Uma exceção em um callback não interrompe o
+turno: fica em ultimo_erro e é contada em falhas.
+
+Um mesmo Ganchos pode ser compartilhado por várias sessões (ex:
+GerenciadorSessoes.ganchos); use dados["sessao_id"] para distingui-las.
+"""
+
+import threading
+from typing import Callable, Dict, Tuple
+
+EVENTOS = ("pre_requisicao", "pos_resposta", "ao_remover", "ao_alertar")
+
+
+class Ganchos:
+    """Callbacks registrados por evento, seguros entre threads"""
+
+    def __init__(self):
+        # Tuplas substituídas a cada alteração: emitir() não precisa da trava
+        self._callbacks: Dict[str, Tuple[Callable[[dict], None], ...]] = {evento: () for evento in EVENTOS}
+        self._trava = threading.Lock()
+        self.falhas = 0
+        self.ultimo_erro = None
+
+    def _validar(self, evento: str):
+        if evento not in self._callbacks:
+            raise ValueError(f"Evento inválido: '{evento}'. Use {', '.join(EVENTOS)}")
+
+    def registrar(self, evento: str, funcao: Callable[[dict], None] = None):
+        """
+        Registra um callback para o evento (na ordem de registro).
+
+        Sem funcao, retorna um decorador: @chat.ganchos.registrar("pos_resposta")
+
+        Returns:
+            A própria função (para remover() depois)
+        """
+        self._validar(evento)
+        if funcao is None:
+            return lambda f: self.registrar(evento, f)
+        with self._trava:
+            self._callbacks[evento] = self._callbacks[evento] + (funcao,)
+        return funcao
+
+    def remover(self, evento: str, funcao: Callable[[dict], None]) -> bool:
+        """
+        Remove um callback registrado.
+
+        Returns:
+            True se o callback estava registrado
+        """
+        self._validar(evento)
+        with self._trava:
+            callbacks = self._callbacks[evento]
+            if funcao not in callbacks:
+                return False
+            indice = callbacks.index(funcao)
+            self._callbacks[evento] = callbacks[:indice] + callbacks[indice + 1:]
+            return True
+
+    def ativo(self, evento: str) -> bool:
+        """Se há callbacks para o evento (o chat só monta os dados nesse caso)"""
+        return bool(self._callbacks[evento])
+
+    def emitir(self, evento: str, dados: dict):
+        """Chama os callbacks do evento com os dados"""
+        for funcao in self._callbacks[evento]:
+            try:
+                funcao(dados)
+            except Exception as e:
+                self.falhas += 1
+                self.ultimo_erro = f"{evento}: {type(e).__name__}: {e}"
+
+    def resumo(self) -> Dict:
+        """Callbacks por evento e falhas (ex: para debug_memoria)"""
+        return {
+            "callbacks": {evento: len(callbacks) for evento, callbacks in self._callbacks.items()},
+            "falhas": self.falhas,
+            "ultimo_erro": self.ultimo_erro,
+        }
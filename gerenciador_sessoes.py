@@ -0,0 +1,319 @@
+"""
+Gerenciador de Sessões - Muitas conversas com um único cliente OpenAI
+
+Cada ChatComMemoria cria, por padrão, o próprio cliente OpenAI (com seu pool de
+conexões HTTP e handshakes TLS). O GerenciadorSessoes cria um único cliente
+configurado e o compartilha entre todas as sessões, que são criadas e
+localizadas por um identificador. A configuração (ConfiguracaoChat) também é
+lida uma única vez e compartilhada por todas as sessões, assim como o registro
+de métricas (gerenciador.metricas), que agrega os turnos de todas elas, e os
+ganchos (gerenciador.ganchos), chamados nos turnos de qualquer sessão.
+
+Com transmitir() (ou transmitir_async() no modo assíncrono), a mesma mensagem
+é enviada a várias sessões ao mesmo tempo (ex: várias personalidades
+revisando o mesmo código): o tempo total passa a ser o da resposta mais lenta,
+e não a soma de todas.
+
+Configurações opcionais do .env:
+    POOL_MAX_CONEXOES: Máximo de conexões HTTP simultâneas. Padrão: 100
+    POOL_MAX_OCIOSAS: Máximo de conexões mantidas abertas (keep-alive). Padrão: 20
+    POOL_AQUECER: Conexões abertas antecipadamente na criação. Padrão: 0
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TempoEsgotado, as_completed
+from typing import Callable, Dict, Iterable, Optional
+
+from chat_openai_memoria import ChatMemoriaBase, ChatComMemoria, ChatComMemoriaAsync
+from configuracao import ConfiguracaoChat, carregar_configuracao
+from ganchos import Ganchos
+from metricas import RegistroMetricas
+
+
+class GerenciadorSessoes:
+    """Cria e localiza sessões de chat por id, compartilhando um cliente e pool HTTP"""
+
+    def __init__(self, max_conexoes: int = None, max_conexoes_ociosas: int = None,
+                 aquecer: int = None, assincrono: bool = False, config: ConfiguracaoChat = None,
+                 **opcoes_chat):
+        """
+        Inicializa o gerenciador e o cliente compartilhado.
+
+        Args:
+            max_conexoes: Limite de conexões HTTP simultâneas do pool.
+                         Se None, carrega de POOL_MAX_CONEXOES no .env. Padrão: 100.
+            max_conexoes_ociosas: Limite de conexões mantidas abertas entre requisições.
+                                 Se None, carrega de POOL_MAX_OCIOSAS no .env. Padrão: 20.
+            aquecer: Quantidade de conexões abertas já na inicialização (apenas síncrono).
+                    Se None, carrega de POOL_AQUECER no .env. Padrão: 0.
+            assincrono: Se True, cria sessões ChatComMemoriaAsync com AsyncOpenAI.
+            config: Configuração compartilhada pelas sessões.
+                   Se None, usa a configuração do .env (carregada uma única vez).
+            **opcoes_chat: Parâmetros repassados a cada sessão criada
+                          (tamanho_janela, limite_maximo, modo_debug, exibir_banner, ...)
+        """
+        if config is None:
+            config = carregar_configuracao()
+        self.config = config.com(
+            pool_max_conexoes=max_conexoes,
+            pool_max_ociosas=max_conexoes_ociosas,
+            pool_aquecer=aquecer
+        )
+
+        self.max_conexoes = self.config.pool_max_conexoes
+        self.max_conexoes_ociosas = min(self.config.pool_max_ociosas, self.max_conexoes)
+        self.assincrono = assincrono
+        self.opcoes_chat = opcoes_chat
+
+        self.client = self._criar_cliente()
+        self.metricas = RegistroMetricas()
+        self.ganchos = Ganchos()
+        self._sessoes: Dict[str, ChatMemoriaBase] = {}
+        self._trava = threading.Lock()
+        self._tarefas = set()  # Turnos assíncronos que continuam após o prazo de uma transmissão
+
+        if self.config.pool_aquecer > 0 and not assincrono:
+            self.aquecer_conexoes(self.config.pool_aquecer)
+
+    def _criar_cliente(self):
+        """Cria o cliente compartilhado com os limites do pool de conexões"""
+        import httpx
+        from openai import OpenAI, AsyncOpenAI
+
+        limites = httpx.Limits(
+            max_connections=self.max_conexoes,
+            max_keepalive_connections=self.max_conexoes_ociosas
+        )
+        opcoes = {"api_key": self.config.api_key}
+        if self.config.base_url:
+            opcoes["base_url"] = self.config.base_url
+
+        if self.assincrono:
+            return AsyncOpenAI(http_client=httpx.AsyncClient(limits=limites), **opcoes)
+        return OpenAI(http_client=httpx.Client(limits=limites), **opcoes)
+
+    def aquecer_conexoes(self, quantidade: int) -> int:
+        """
+        Abre conexões antecipadamente com requisições leves e simultâneas (GET /models),
+        para que as primeiras mensagens não paguem o handshake TLS.
+
+        Args:
+            quantidade: Número de conexões a abrir (limitado a max_conexoes_ociosas,
+                       pois as excedentes seriam fechadas logo em seguida)
+
+        Returns:
+            Quantidade de requisições de aquecimento que tiveram sucesso
+        """
+        quantidade = min(quantidade, self.max_conexoes_ociosas)
+        if quantidade <= 0:
+            return 0
+
+        cliente = self.client.with_options(max_retries=0)
+
+        def _aquecer(_):
+            try:
+                cliente.models.list()
+                return True
+            except Exception:
+                return False
+
+        with ThreadPoolExecutor(max_workers=quantidade) as executor:
+            return sum(executor.map(_aquecer, range(quantidade)))
+
+    def obter(self, sessao_id: str, **opcoes) -> ChatMemoriaBase:
+        """
+        Retorna a sessão com o id informado, criando-a se ainda não existir.
+        
+        Com ARMAZENAMENTO_SQLITE, uma sessão gravada por qualquer processo é
+        retomada do banco (apenas as mensagens que cabem na janela).
+
+        Args:
+            sessao_id: Identificador da sessão
+            **opcoes: Parâmetros específicos desta sessão (sobrescrevem opcoes_chat),
+                     incluindo config=self.config.com(...) para ajustes por sessão
+
+        Returns:
+            Instância de ChatComMemoria (ou ChatComMemoriaAsync)
+        """
+        with self._trava:
+            sessao = self._sessoes.get(sessao_id)
+            if sessao is None:
+                classe = ChatComMemoriaAsync if self.assincrono else ChatComMemoria
+                parametros = {"config": self.config, "metricas": self.metricas, "ganchos": self.ganchos,
+                              "sessao_id": sessao_id, **self.opcoes_chat, **opcoes}
+                sessao = classe(client=self.client, **parametros)
+                self._sessoes[sessao_id] = sessao
+            return sessao
+
+    def buscar(self, sessao_id: str) -> Optional[ChatMemoriaBase]:
+        """Retorna a sessão com o id informado, ou None se não existir"""
+        return self._sessoes.get(sessao_id)
+
+    def remover(self, sessao_id: str) -> bool:
+        """
+        Remove a sessão do gerenciador (o cliente compartilhado continua aberto).
+
+        Returns:
+            True se a sessão existia
+        """
+        with self._trava:
+            return self._sessoes.pop(sessao_id, None) is not None
+
+    def ids(self) -> list:
+        """Lista os ids das sessões ativas"""
+        return list(self._sessoes)
+
+    def __len__(self) -> int:
+        return len(self._sessoes)
+
+    def __contains__(self, sessao_id: str) -> bool:
+        return sessao_id in self._sessoes
+
+    def _sessoes_transmissao(self, sessao_ids: Optional[Iterable[str]]) -> Dict[str, ChatMemoriaBase]:
+        """Sessões de destino de uma transmissão (todas as ativas se sessao_ids for None)"""
+        if sessao_ids is None:
+            return dict(self._sessoes)
+        sessoes = {}
+        for sessao_id in sessao_ids:
+            sessao = self._sessoes.get(sessao_id)
+            if sessao is None:
+                raise ValueError(f"Sessão não encontrada: {sessao_id}")
+            sessoes[sessao_id] = sessao
+        return sessoes
+
+    @staticmethod
+    def _resultado_prazo(prazo: float) -> dict:
+        return {"resposta": None, "erro": f"Prazo de {prazo} s esgotado", "segundos": None}
+
+    def transmitir(self, mensagem: str, sessao_ids: Iterable[str] = None, prazo: float = None,
+                   max_paralelo: int = None,
+                   ao_concluir: Callable[[str, dict], None] = None) -> Dict[str, dict]:
+        """
+        Envia a mesma mensagem a várias sessões em paralelo (uma thread por sessão).
+
+        Cada sessão executa um turno normal de enviar_mensagem(), protegido pela
+        sua trava_turno: turnos da mesma sessão nunca se intercalam, e o histórico
+        de uma sessão não é afetado pelas demais.
+
+        Args:
+            mensagem: Mensagem do usuário enviada a todas as sessões
+            sessao_ids: Ids das sessões de destino. Se None, todas as sessões ativas.
+            prazo: Segundos para aguardar as respostas. Se None, aguarda todas.
+                  Turnos já em andamento quando o prazo acaba continuam em segundo
+                  plano e são concluídos normalmente no histórico da sessão;
+                  turnos que ainda não começaram são descartados.
+            max_paralelo: Máximo de turnos simultâneos. Padrão: uma thread por sessão,
+                         limitado a max_conexoes.
+            ao_concluir: Chamado como ao_concluir(sessao_id, resultado) assim que
+                        cada sessão responde (na thread de quem chamou transmitir)
+
+        Returns:
+            Para cada sessao_id, na ordem de sessao_ids:
+            {"resposta": texto ou None, "erro": None ou mensagem, "segundos": duração do turno}
+        """
+        if self.assincrono:
+            raise RuntimeError("Gerenciador assíncrono: use await transmitir_async()")
+        sessoes = self._sessoes_transmissao(sessao_ids)
+        resultados = {sessao_id: self._resultado_prazo(prazo) for sessao_id in sessoes}
+        if not sessoes:
+            return resultados
+
+        limite = time.monotonic() + prazo if prazo is not None else None
+
+        def _turno(sessao_id: str, sessao: ChatMemoriaBase) -> dict:
+            espera = -1 if limite is None else max(limite - time.monotonic(), 0)
+            if not sessao.trava_turno.acquire(timeout=espera):
+                return self._resultado_prazo(prazo)
+            try:
+                inicio = time.perf_counter()
+                try:
+                    return {"resposta": sessao.enviar_mensagem(mensagem), "erro": None,
+                            "segundos": time.perf_counter() - inicio}
+                except Exception as e:
+                    return {"resposta": None, "erro": str(e), "segundos": time.perf_counter() - inicio}
+            finally:
+                sessao.trava_turno.release()
+
+        executor = ThreadPoolExecutor(max_workers=max_paralelo or min(len(sessoes), self.max_conexoes))
+        try:
+            futuros = {executor.submit(_turno, sessao_id, sessao): sessao_id
+                       for sessao_id, sessao in sessoes.items()}
+            try:
+                for futuro in as_completed(futuros, timeout=prazo):
+                    sessao_id = futuros[futuro]
+                    resultados[sessao_id] = futuro.result()
+                    if ao_concluir is not None:
+                        ao_concluir(sessao_id, resultados[sessao_id])
+            except TempoEsgotado:
+                pass
+        finally:
+            # Não espera os turnos em andamento; descarta os que ainda não começaram
+            executor.shutdown(wait=False, cancel_futures=True)
+        return resultados
+
+    async def transmitir_async(self, mensagem: str, sessao_ids: Iterable[str] = None, prazo: float = None,
+                               ao_concluir: Callable[[str, dict], None] = None) -> Dict[str, dict]:
+        """
+        Versão assíncrona de transmitir(): um turno por sessão no event loop atual.
+
+        Mesmo contrato de transmitir(). Turnos em andamento no fim do prazo não são
+        cancelados (o histórico da sessão ficaria sem a resposta); continuam como
+        tarefas do event loop e são concluídos normalmente.
+        """
+        if not self.assincrono:
+            raise RuntimeError("Gerenciador síncrono: use transmitir()")
+        sessoes = self._sessoes_transmissao(sessao_ids)
+        resultados = {sessao_id: self._resultado_prazo(prazo) for sessao_id in sessoes}
+        if not sessoes:
+            return resultados
+
+        limite = time.monotonic() + prazo if prazo is not None else None
+
+        async def _turno(sessao_id: str, sessao: ChatMemoriaBase) -> tuple:
+            espera = None if limite is None else max(limite - time.monotonic(), 0)
+            try:
+                await asyncio.wait_for(sessao.trava_turno.acquire(), espera)
+            except asyncio.TimeoutError:
+                return sessao_id, self._resultado_prazo(prazo)
+            try:
+                inicio = time.perf_counter()
+                try:
+                    resultado = {"resposta": await sessao.enviar_mensagem(mensagem), "erro": None,
+                                 "segundos": time.perf_counter() - inicio}
+                except Exception as e:
+                    resultado = {"resposta": None, "erro": str(e), "segundos": time.perf_counter() - inicio}
+                return sessao_id, resultado
+            finally:
+                sessao.trava_turno.release()
+
+        tarefas = [asyncio.create_task(_turno(sessao_id, sessao)) for sessao_id, sessao in sessoes.items()]
+        for tarefa in tarefas:
+            self._tarefas.add(tarefa)
+            tarefa.add_done_callback(self._tarefas.discard)
+        try:
+            for proxima in asyncio.as_completed(tarefas, timeout=prazo):
+                sessao_id, resultado = await proxima
+                resultados[sessao_id] = resultado
+                if ao_concluir is not None:
+                    ao_concluir(sessao_id, resultado)
+        except asyncio.TimeoutError:
+            pass
+        return resultados
+
+    def fechar(self):
+        """Fecha o pool de conexões do cliente compartilhado (apenas síncrono)"""
+        if not self.assincrono:
+            self.client.close()
+
+    async def fechar_async(self):
+        """Fecha o pool de conexões do cliente compartilhado assíncrono"""
+        if self.assincrono:
+            await self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.fechar()
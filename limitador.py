@@ -0,0 +1,254 @@
+"""
+Limitador - Limite de taxa compartilhado e retentativas com espera exponencial
+
+Sob carga, muitas sessões no mesmo processo (ex: GerenciadorSessoes) disparam
+requisições ao mesmo tempo e a API responde 429 (limite de requisições ou de
+tokens por minuto). O LimitadorTaxa espaça as requisições no cliente, antes
+que o limite do provedor seja atingido:
+
+- Dois baldes de fichas (token bucket), um de requisições por minuto (RPM) e
+  outro de tokens por minuto (TPM), reabastecidos continuamente
+- Cada requisição reserva 1 requisição e a estimativa de tokens do turno
+  (prompt + max_tokens); depois da resposta, ajustar() acerta a diferença
+  com o uso real informado pela API
+- Uma reserva maior que o saldo deixa o balde negativo e a chamada espera o
+  tempo necessário para o saldo voltar a zero: as reservas são atendidas na
+  ordem em que chegam, sem segurar a trava durante a espera
+- Um 429 com Retry-After pausa o limitador inteiro (todas as sessões)
+
+classificar_erro() e calcular_espera() definem as retentativas: apenas erros
+temporários são repetidos, com espera exponencial aleatória ("full jitter")
+ou o tempo indicado pelo servidor no cabeçalho Retry-After.
+
+Configurações opcionais do .env:
+    LIMITE_RPM: Requisições por minuto. Padrão: sem limite
+    LIMITE_TPM: Tokens por minuto. Padrão: sem limite
+    RETENTATIVAS_MAX: Retentativas por requisição (0 desativa). Padrão: 3
+    RETENTATIVA_ESPERA_BASE: Espera base, dobrada a cada tentativa. Padrão: 0.5
+    RETENTATIVA_ESPERA_MAX: Espera máxima entre tentativas. Padrão: 30
+"""
+
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+# Status HTTP temporários: timeout, conflito, limite de taxa e erros do servidor
+STATUS_REPETIVEIS = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+# Exceções de rede do SDK (sem status HTTP), reconhecidas pelo nome para não
+# importar o openai neste módulo
+ERROS_CONEXAO = ("APIConnectionError", "APITimeoutError")
+
+_abertos: Dict[tuple, "LimitadorTaxa"] = {}
+_trava_abertos = threading.Lock()
+
+
+def obter_limitador(rpm: Optional[int] = None, tpm: Optional[int] = None) -> "LimitadorTaxa":
+    """
+    Retorna o limitador compartilhado do processo para esses limites (todas as
+    sessões disputam os mesmos baldes, como disputam o limite da conta).
+    """
+    chave = (rpm, tpm)
+    with _trava_abertos:
+        limitador = _abertos.get(chave)
+        if limitador is None:
+            limitador = _abertos[chave] = LimitadorTaxa(rpm, tpm)
+        return limitador
+
+
+class _Balde:
+    """Balde de fichas reabastecido continuamente (capacidade = limite por minuto)"""
+
+    __slots__ = ("capacidade", "taxa", "saldo", "atualizado")
+
+    def __init__(self, limite_por_minuto: int, agora: float):
+        self.capacidade = float(limite_por_minuto)
+        self.taxa = limite_por_minuto / 60.0  # Fichas por segundo
+        self.saldo = self.capacidade
+        self.atualizado = agora
+
+    def reservar(self, quantidade: float, agora: float) -> float:
+        """
+        Consome a quantidade (o saldo pode ficar negativo; uma quantidade
+        negativa devolve fichas, até a capacidade); retorna a espera necessária
+        """
+        self.saldo = min(self.capacidade, self.saldo + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+        # Após a quantidade: uma devolução (negativa) também não passa da capacidade
+        self.saldo = min(self.capacidade, self.saldo - quantidade)
+        return -self.saldo / self.taxa if self.saldo < 0 else 0.0
+
+
+class LimitadorTaxa:
+    """Limite de requisições (RPM) e tokens (TPM) por minuto, seguro entre threads"""
+
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None):
+        """
+        Args:
+            rpm: Requisições por minuto (None = sem limite)
+            tpm: Tokens por minuto (None = sem limite)
+        """
+        if (rpm is not None and rpm <= 0) or (tpm is not None and tpm <= 0):
+            raise ValueError(f"Limites devem ser maiores que 0, recebido: rpm={rpm}, tpm={tpm}")
+        agora = time.monotonic()
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requisicoes = _Balde(rpm, agora) if rpm else None
+        self._tokens = _Balde(tpm, agora) if tpm else None
+        self._pausado_ate = 0.0
+        self._trava = threading.Lock()
+
+        self.reservas = 0
+        self.esperas = 0  # Reservas que precisaram esperar
+        self.tempo_espera = 0.0  # Soma das esperas, em segundos
+        self.pausas = 0
+
+    def reservar(self, tokens: int = 0) -> float:
+        """
+        Reserva uma requisição com a estimativa de tokens informada.
+
+        Returns:
+            Segundos que a chamada deve esperar antes de enviar a requisição
+        """
+        with self._trava:
+            agora = time.monotonic()
+            espera = max(self._pausado_ate - agora, 0.0)
+            if self._requisicoes is not None:
+                espera = max(espera, self._requisicoes.reservar(1, agora))
+            if self._tokens is not None and tokens > 0:
+                espera = max(espera, self._tokens.reservar(tokens, agora))
+            self.reservas += 1
+            if espera > 0:
+                self.esperas += 1
+                self.tempo_espera += espera
+            return espera
+
+    def tentar_reservar(self, tokens: int = 0) -> bool:
+        """
+        Reserva apenas se houver saldo agora, sem esperar nem ficar devendo
+        (ex: requisições opcionais, como a duplicata de uma requisição lenta).
+
+        Returns:
+            True se a reserva foi feita
+        """
+        with self._trava:
+            agora = time.monotonic()
+            if self._pausado_ate > agora:
+                return False
+            baldes = [(self._requisicoes, 1), (self._tokens, tokens)]
+            baldes = [(balde, quantidade) for balde, quantidade in baldes if balde is not None]
+            for balde, _ in baldes:
+                balde.reservar(0, agora)  # Apenas reabastece
+            if any(balde.saldo < quantidade for balde, quantidade in baldes):
+                return False
+            for balde, quantidade in baldes:
+                balde.saldo -= quantidade
+            self.reservas += 1
+            return True
+
+    def aguardar(self, tokens: int = 0) -> float:
+        """Reserva e espera (bloqueando a thread) até poder enviar; retorna a espera"""
+        espera = self.reservar(tokens)
+        if espera > 0:
+            time.sleep(espera)
+        return espera
+
+    async def aguardar_async(self, tokens: int = 0) -> float:
+        """Reserva e espera sem bloquear o event loop; retorna a espera"""
+        espera = self.reservar(tokens)
+        if espera > 0:
+            await asyncio.sleep(espera)
+        return espera
+
+    def ajustar(self, diferenca: int):
+        """
+        Acerta o balde de tokens após a resposta.
+
+        Args:
+            diferenca: Tokens usados de fato menos os reservados (negativo devolve fichas)
+        """
+        if self._tokens is None or not diferenca:
+            return
+        with self._trava:
+            agora = time.monotonic()
+            self._tokens.reservar(diferenca, agora)
+
+    def pausar(self, segundos: float):
+        """Suspende todas as reservas por alguns segundos (ex: 429 com Retry-After)"""
+        with self._trava:
+            self._pausado_ate = max(self._pausado_ate, time.monotonic() + segundos)
+            self.pausas += 1
+
+    def resumo(self) -> Dict[str, float]:
+        """Estatísticas do limitador (ex: para debug_memoria)"""
+        return {
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "reservas": self.reservas,
+            "esperas": self.esperas,
+            "tempo_espera": round(self.tempo_espera, 3),
+            "pausas": self.pausas,
+        }
+
+
+def _ler_retry_after(erro: Exception) -> Optional[float]:
+    """Segundos indicados pelo servidor (retry-after-ms ou Retry-After), se houver"""
+    resposta = getattr(erro, "response", None)
+    cabecalhos = getattr(resposta, "headers", None)
+    if not cabecalhos:
+        return None
+    try:
+        valor_ms = cabecalhos.get("retry-after-ms")
+        if valor_ms:
+            return max(float(valor_ms) / 1000.0, 0.0)
+        valor = cabecalhos.get("retry-after")
+        if not valor:
+            return None
+        try:
+            return max(float(valor), 0.0)
+        except ValueError:
+            # Formato de data HTTP (ex: "Wed, 21 Oct 2015 07:28:00 GMT")
+            return max(parsedate_to_datetime(valor).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def classificar_erro(erro: Exception) -> Tuple[bool, Optional[float]]:
+    """
+    Classifica um erro da API.
+
+    Returns:
+        Tupla (repetivel, retry_after): se vale repetir a requisição e os
+        segundos de espera indicados pelo servidor (None se não informado)
+    """
+    status = getattr(erro, "status_code", None)
+    if status is None:
+        repetivel = type(erro).__name__ in ERROS_CONEXAO or isinstance(erro, (ConnectionError, TimeoutError))
+        return repetivel, None
+    # Cota esgotada também volta como 429, mas não se resolve esperando
+    if status == 429 and getattr(erro, "code", None) == "insufficient_quota":
+        return False, None
+    return status in STATUS_REPETIVEIS or status >= 500, _ler_retry_after(erro)
+
+
+def calcular_espera(tentativa: int, base: float, maximo: float, retry_after: Optional[float] = None) -> float:
+    """
+    Espera antes da próxima tentativa.
+
+    Args:
+        tentativa: Número da retentativa (0 para a primeira)
+        base: Espera base em segundos, dobrada a cada tentativa
+        maximo: Espera máxima em segundos
+        retry_after: Espera indicada pelo servidor (tem prioridade, limitada ao máximo)
+
+    Returns:
+        Segundos de espera: Retry-After ou um valor aleatório entre 0 e
+        min(maximo, base * 2^tentativa), que espalha as retentativas de
+        muitas sessões no tempo
+    """
+    if retry_after is not None:
+        return min(retry_after, maximo)
+    return random.uniform(0, min(maximo, base * (2 ** tentativa)))
@@ -0,0 +1,416 @@
+"""
+Log Binário - Histórico completo em disco, com acesso aleatório por posição
+
+Sessões de auditoria chegam a dezenas de milhares de mensagens. Com o
+LogBinario, cada mensagem é acrescentada a um arquivo em disco e o histórico
+em memória pode ficar restrito a uma cauda pequena (JANELA_MAX): qualquer
+trecho da conversa é lido pelo índice de posições, via mmap, sem carregar o
+restante.
+
+Formato (PREFIXO.log + PREFIXO.idx), somente acréscimos:
+    .log  cabeçalho b"CHATLOG1" seguido dos registros
+          <tamanho u32><crc32 u32><tipo u8><tokens u32><conteúdo utf-8>
+          (o CRC cobre tipo, tokens e conteúdo)
+    .idx  posição (u64) de cada registro no .log; a do registro N fica em 8*N
+
+Além das mensagens (user/assistant), o log guarda o system prompt e marcos
+de limpeza (limpar_historico), sem nunca reescrever o que já foi gravado.
+
+Segurança contra falhas: o registro é gravado no .log antes da entrada no
+.idx. Ao abrir, o final dos dois arquivos é verificado: um registro
+incompleto ou com CRC inválido (gravação interrompida) é truncado, e
+registros sem entrada no índice são reindexados.
+
+Uso no terminal:
+    python log_binario.py info PREFIXO
+    python log_binario.py exportar PREFIXO [INICIO] [FIM]
+    python log_binario.py compactar PREFIXO
+
+Configurações opcionais do .env:
+    LOG_BINARIO: Diretório dos logs (um PREFIXO por sessao_id). Sem ele, nada é gravado
+    LOG_BINARIO_FSYNC: true para forçar fsync a cada gravação. Padrão: false
+"""
+
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+MAGICO = b"CHATLOG1"
+
+# <tamanho u32><crc32 u32> seguido de <tipo u8><tokens u32> (parte coberta pelo CRC)
+_PREFIXO = struct.Struct("<II")
+_CORPO = struct.Struct("<BI")
+_CABECALHO = _PREFIXO.size + _CORPO.size
+_POSICAO = struct.Struct("<Q")
+
+_TIPOS = {"user": 1, "assistant": 2, "system": 3, "limpeza": 4}
+_ROLES = {tipo: role for role, tipo in _TIPOS.items()}
+
+# Registros gravados por vez na compactação
+TAMANHO_LOTE_COMPACTACAO = 1000
+
+
+def _codificar(role: str, content: str, tokens: int) -> bytes:
+    """Monta o registro binário de uma mensagem"""
+    dados = content.encode("utf-8")
+    corpo = _CORPO.pack(_TIPOS[role], tokens) + dados
+    return _PREFIXO.pack(len(dados), zlib.crc32(corpo)) + corpo
+
+
+def _validar(dados, posicao: int, limite: int) -> Optional[int]:
+    """Retorna a posição final do registro em `posicao`, ou None se incompleto/corrompido"""
+    if posicao + _CABECALHO > limite:
+        return None
+    tamanho, crc = _PREFIXO.unpack_from(dados, posicao)
+    fim = posicao + _CABECALHO + tamanho
+    if fim > limite or dados[posicao + _PREFIXO.size] not in _ROLES:
+        return None
+    if zlib.crc32(dados[posicao + _PREFIXO.size:fim]) != crc:
+        return None
+    return fim
+
+
+class LogBinario:
+    """Histórico de uma sessão em um log binário somente de acréscimos"""
+
+    def __init__(self, prefixo: str, sincronizar: bool = False):
+        """
+        Abre (ou cria) o log, recuperando-o se a última gravação foi interrompida.
+
+        Args:
+            prefixo: Caminho sem extensão (gera PREFIXO.log e PREFIXO.idx)
+            sincronizar: Se True, faz fsync a cada gravação (sobrevive a quedas
+                        de energia, ao custo de latência por mensagem)
+        """
+        diretorio = os.path.dirname(prefixo)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+
+        self.prefixo = prefixo
+        self.arquivo_log = prefixo + ".log"
+        self.arquivo_indice = prefixo + ".idx"
+        self.sincronizar = sincronizar
+
+        self._trava = threading.RLock()
+        self._log = None  # Arquivos de escrita e mapas de leitura, abertos sob demanda
+        self._indice = None
+        self._mapa_log = None
+        self._mapa_indice = None
+        self._marcos = None  # (início da conversa atual, system prompt), calculado na 1ª consulta
+
+        self._recuperar()
+
+    @property
+    def total(self) -> int:
+        """Registros gravados (mensagens, system prompts e marcos de limpeza)"""
+        return self._total
+
+    def __len__(self) -> int:
+        return self._total
+
+    @property
+    def tamanho_bytes(self) -> int:
+        return self._tamanho + self._total * _POSICAO.size
+
+    def _recuperar(self):
+        """Valida o final do .log e do .idx, truncando ou reindexando o que for preciso"""
+        with open(self.arquivo_log, "a+b") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < len(MAGICO):
+                f.truncate(0)
+                f.write(MAGICO)
+            f.seek(0)
+            if f.read(len(MAGICO)) != MAGICO:
+                raise ValueError(f"Arquivo não é um log binário do chat: {self.arquivo_log}")
+            f.seek(0, os.SEEK_END)
+            tamanho = f.tell()
+
+        if not os.path.exists(self.arquivo_indice):
+            open(self.arquivo_indice, "wb").close()
+        total = os.path.getsize(self.arquivo_indice) // _POSICAO.size
+
+        with open(self.arquivo_log, "rb") as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as dados, \
+                open(self.arquivo_indice, "rb") as indice:
+            # Última entrada do índice que aponta para um registro íntegro
+            fim = len(MAGICO)
+            while total > 0:
+                indice.seek((total - 1) * _POSICAO.size)
+                fim_registro = _validar(dados, _POSICAO.unpack(indice.read(_POSICAO.size))[0], tamanho)
+                if fim_registro is not None:
+                    fim = fim_registro
+                    break
+                total -= 1
+
+            # Registros gravados no .log cuja entrada no índice não chegou a ser gravada
+            novas = []
+            while True:
+                fim_registro = _validar(dados, fim, tamanho)
+                if fim_registro is None:
+                    break
+                novas.append(_POSICAO.pack(fim))
+                fim = fim_registro
+
+        if fim < tamanho:
+            os.truncate(self.arquivo_log, fim)
+        os.truncate(self.arquivo_indice, total * _POSICAO.size)
+        if novas:
+            with open(self.arquivo_indice, "ab") as indice:
+                indice.write(b"".join(novas))
+
+        self._tamanho = fim
+        self._total = total + len(novas)
+
+    def anexar(self, mensagens: List[Tuple[str, str, int]]):
+        """
+        Acrescenta mensagens (role, content, tokens) ao log.
+
+        Todos os registros vão em uma única escrita no .log, seguida de uma
+        única escrita no .idx.
+        """
+        if not mensagens:
+            return
+        registros = [_codificar(role, content, tokens) for role, content, tokens in mensagens]
+        with self._trava:
+            posicoes = []
+            posicao = self._tamanho
+            for registro in registros:
+                posicoes.append(_POSICAO.pack(posicao))
+                posicao += len(registro)
+
+            self._abrir_escrita()
+            self._log.write(b"".join(registros))
+            if self.sincronizar:
+                os.fsync(self._log.fileno())
+            self._indice.write(b"".join(posicoes))
+            if self.sincronizar:
+                os.fsync(self._indice.fileno())
+
+            if self._marcos is not None:
+                for i, (role, content, _) in enumerate(mensagens, self._total):
+                    if role == "system":
+                        self._marcos = (self._marcos[0], content)
+                    elif role == "limpeza":
+                        self._marcos = (i + 1, self._marcos[1])
+            self._tamanho = posicao
+            self._total += len(posicoes)
+
+    def definir_system_prompt(self, prompt: str):
+        """Grava o system prompt (restaurado por carregar())"""
+        self.anexar([("system", prompt, 0)])
+
+    def limpar(self):
+        """Grava um marco de limpeza: as mensagens anteriores deixam de fazer parte da conversa"""
+        self.anexar([("limpeza", "", 0)])
+
+    def _abrir_escrita(self):
+        if self._log is None:
+            # buffering=0: cada anexar() é uma única chamada write() por arquivo
+            self._log = open(self.arquivo_log, "ab", buffering=0)
+            self._indice = open(self.arquivo_indice, "ab", buffering=0)
+
+    def _mapas(self):
+        """
+        Mapas (mmap) do .log e do .idx, refeitos quando o arquivo cresceu.
+
+        O mapa anterior não é fechado explicitamente: uma leitura em andamento
+        (registros()) ainda pode usá-lo, e ele é liberado com a última referência.
+        """
+        if self._mapa_log is None or len(self._mapa_log) < self._tamanho:
+            with open(self.arquivo_log, "rb") as f:
+                self._mapa_log = mmap.mmap(f.fileno(), self._tamanho, access=mmap.ACCESS_READ)
+        tamanho_indice = self._total * _POSICAO.size
+        if tamanho_indice and (self._mapa_indice is None or len(self._mapa_indice) < tamanho_indice):
+            with open(self.arquivo_indice, "rb") as f:
+                self._mapa_indice = mmap.mmap(f.fileno(), tamanho_indice, access=mmap.ACCESS_READ)
+        return self._mapa_log, self._mapa_indice
+
+    @staticmethod
+    def _decodificar(dados, posicao: int) -> Tuple[str, str, int]:
+        tamanho, _ = _PREFIXO.unpack_from(dados, posicao)
+        tipo, tokens = _CORPO.unpack_from(dados, posicao + _PREFIXO.size)
+        inicio = posicao + _CABECALHO
+        return _ROLES[tipo], dados[inicio:inicio + tamanho].decode("utf-8"), tokens
+
+    def ler(self, posicao: int) -> Tuple[str, str, int]:
+        """Retorna o registro (role, content, tokens) na posição informada (aceita negativos)"""
+        with self._trava:
+            if posicao < 0:
+                posicao += self._total
+            if not 0 <= posicao < self._total:
+                raise IndexError(f"Registro fora do log: {posicao} (total {self._total})")
+            dados, indice = self._mapas()
+            return self._decodificar(dados, _POSICAO.unpack_from(indice, posicao * _POSICAO.size)[0])
+
+    __getitem__ = ler
+
+    def registros(self, inicio: int = 0, fim: int = None) -> Iterator[Tuple[str, str, int]]:
+        """
+        Percorre os registros [inicio, fim) sem carregar o restante do log.
+
+        Inclui system prompts e marcos de limpeza (role 'system' e 'limpeza').
+        """
+        with self._trava:
+            fim = self._total if fim is None else min(fim, self._total)
+            if inicio >= fim:
+                return
+            dados, indice = self._mapas()
+            posicoes = [posicao for posicao, in
+                        _POSICAO.iter_unpack(indice[inicio * _POSICAO.size:fim * _POSICAO.size])]
+        for posicao in posicoes:
+            yield self._decodificar(dados, posicao)
+
+    def _calcular_marcos(self) -> Tuple[int, Optional[str]]:
+        """
+        Início da conversa atual (registro após o último marco de limpeza) e o
+        último system prompt, lendo apenas o tipo de cada registro, do fim
+        para o início.
+        """
+        with self._trava:
+            if self._marcos is None:
+                inicio, system_prompt = None, None
+                if self._total:
+                    dados, indice = self._mapas()
+                    for i in range(self._total - 1, -1, -1):
+                        posicao = _POSICAO.unpack_from(indice, i * _POSICAO.size)[0]
+                        tipo = dados[posicao + _PREFIXO.size]
+                        if tipo == _TIPOS["limpeza"] and inicio is None:
+                            inicio = i + 1
+                        elif tipo == _TIPOS["system"] and system_prompt is None:
+                            system_prompt = self._decodificar(dados, posicao)[1]
+                        if inicio is not None and system_prompt is not None:
+                            break
+                self._marcos = (inicio or 0, system_prompt)
+            return self._marcos
+
+    @property
+    def inicio_conversa(self) -> int:
+        """Posição do primeiro registro após o último limpar()"""
+        return self._calcular_marcos()[0]
+
+    def conversa(self) -> Iterator[Tuple[str, str, int]]:
+        """Mensagens (user/assistant) da conversa atual, da mais antiga para a mais recente"""
+        for role, content, tokens in self.registros(self.inicio_conversa):
+            if role in ("user", "assistant"):
+                yield role, content, tokens
+
+    def carregar(self, max_mensagens: int = None,
+                 max_tokens: int = None) -> Tuple[Optional[str], List[Tuple[str, str, int]]]:
+        """
+        Lê as mensagens mais recentes da conversa atual, do fim para o início.
+
+        Mesmo contrato de ArmazenamentoSQLite.carregar(): a leitura para ao
+        atingir o limite e a primeira mensagem retornada é sempre do usuário.
+
+        Returns:
+            Tupla (system_prompt, mensagens) em ordem cronológica
+        """
+        inicio, system_prompt = self._calcular_marcos()
+        mensagens = []
+        total_tokens = 0
+        with self._trava:
+            for i in range(self._total - 1, inicio - 1, -1):
+                role, content, tokens = self.ler(i)
+                if role not in ("user", "assistant"):
+                    continue
+                if max_mensagens and len(mensagens) >= max_mensagens:
+                    break
+                if max_tokens and mensagens and total_tokens + tokens > max_tokens:
+                    break
+                mensagens.append((role, content, tokens))
+                total_tokens += tokens
+
+        mensagens.reverse()
+        # Não começa no meio de um par (resposta sem a pergunta)
+        while mensagens and mensagens[0][0] != "user":
+            mensagens.pop(0)
+        return system_prompt, mensagens
+
+    def fechar(self):
+        """Fecha os arquivos e libera os mapas (reabertos automaticamente no próximo uso)"""
+        with self._trava:
+            for arquivo in (self._log, self._indice):
+                if arquivo is not None:
+                    arquivo.close()
+            self._log = self._indice = None
+            self._mapa_log = self._mapa_indice = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.fechar()
+
+
+def compactar(prefixo: str) -> Tuple[int, int]:
+    """
+    Reescreve o log apenas com a conversa atual (e o último system prompt).
+
+    Descarta o que limpar_historico() marcou como descartado, system prompts
+    substituídos e qualquer final corrompido. O novo log é gravado ao lado e
+    troca de lugar com o antigo com os.replace(); se o processo for
+    interrompido, o índice é reconstruído na próxima abertura. Não use em um
+    log aberto por outro processo.
+
+    Returns:
+        Tupla (bytes antes, bytes depois)
+    """
+    temporario = prefixo + ".compactando"
+    for extensao in (".log", ".idx"):
+        if os.path.exists(temporario + extensao):
+            os.remove(temporario + extensao)
+
+    with LogBinario(prefixo) as log, LogBinario(temporario) as novo:
+        antes = log.tamanho_bytes
+        system_prompt = log._calcular_marcos()[1]
+        if system_prompt is not None:
+            novo.definir_system_prompt(system_prompt)
+        lote = []
+        for registro in log.conversa():
+            lote.append(registro)
+            if len(lote) >= TAMANHO_LOTE_COMPACTACAO:
+                novo.anexar(lote)
+                lote = []
+        novo.anexar(lote)
+        for arquivo in (novo._log, novo._indice):
+            if arquivo is not None:
+                os.fsync(arquivo.fileno())
+        depois = novo.tamanho_bytes
+
+    # Sem o .idx antigo, uma interrupção entre as trocas apenas força a reindexação
+    os.remove(prefixo + ".idx")
+    os.replace(temporario + ".log", prefixo + ".log")
+    os.replace(temporario + ".idx", prefixo + ".idx")
+    return antes, depois
+
+
+if __name__ == "__main__":
+    comandos = ("info", "exportar", "compactar")
+    if len(sys.argv) < 3 or sys.argv[1] not in comandos:
+        print("Uso: python log_binario.py info PREFIXO")
+        print("     python log_binario.py exportar PREFIXO [INICIO] [FIM]")
+        print("     python log_binario.py compactar PREFIXO")
+        sys.exit(1)
+
+    comando, prefixo = sys.argv[1], sys.argv[2]
+    if comando == "compactar":
+        antes, depois = compactar(prefixo)
+        print(f"Log compactado: {antes / 1024:.1f} KiB -> {depois / 1024:.1f} KiB")
+    elif comando == "info":
+        with LogBinario(prefixo) as log:
+            inicio, system_prompt = log._calcular_marcos()
+            print(f"Arquivo: {log.arquivo_log} ({log.tamanho_bytes / 1024:.1f} KiB com o índice)")
+            print(f"Registros: {log.total}")
+            print(f"Conversa atual: a partir do registro {inicio}")
+            print(f"System prompt: {(system_prompt or '(não definido)')[:60]}")
+    else:
+        inicio = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+        fim = int(sys.argv[4]) if len(sys.argv) > 4 else None
+        rotulos = {"user": "USUÁRIO", "assistant": "ASSISTENTE", "system": "SYSTEM", "limpeza": "LIMPEZA"}
+        with LogBinario(prefixo) as log:
+            for i, (role, content, _) in enumerate(log.registros(inicio, fim), inicio):
+                print(f"[{i}] {rotulos[role]}:\n{content}\n")
@@ -0,0 +1,211 @@
+"""
+Log de Debug - Escrita em segundo plano
+
+O EscritorLog mantém o arquivo de log aberto e grava em lotes a partir de uma
+thread própria, tirando a E/S de disco do caminho de cada requisição.
+
+- Memória limitada: no máximo max_pendentes escritas aguardam na fila; acima
+  disso, escrever() espera a thread gravar (nenhuma linha é descartada).
+- O arquivo recebe flush a cada intervalo_flush segundos, em flush() e em fechar().
+- fechar() é chamado automaticamente na saída do interpretador (atexit).
+
+Com LOG_MODO=delta o chat também grava logs/chat_debug_TIMESTAMP.deltas.jsonl,
+com um evento JSON por linha descrevendo apenas o que mudou em cada turno.
+reconstruir_historico() refaz o histórico completo a partir desses eventos:
+
+    python log_debug.py logs/chat_debug_20250101_120000.deltas.jsonl
+"""
+
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Iterator, List
+
+# Quantidade máxima de escritas agrupadas em um único lote
+TAMANHO_LOTE = 256
+
+_FIM = object()
+
+
+class EscritorLog:
+    """Grava texto em um arquivo a partir de uma thread em segundo plano"""
+
+    def __init__(self, caminho: str, intervalo_flush: float = 1.0, max_pendentes: int = 10000,
+                 modo: str = "w"):
+        """
+        Abre o arquivo e inicia a thread de escrita.
+
+        Args:
+            caminho: Caminho do arquivo de log (o diretório é criado se necessário)
+            intervalo_flush: Intervalo máximo, em segundos, entre flushes do arquivo
+            max_pendentes: Máximo de escritas aguardando na fila (limita a memória)
+            modo: Modo de abertura do arquivo ('w' cria/trunca, 'a' acrescenta)
+        """
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+
+        self.caminho = caminho
+        self.intervalo_flush = intervalo_flush
+        self._arquivo = open(caminho, modo, encoding="utf-8")
+        self._fila = queue.Queue(maxsize=max_pendentes)
+        self._fechado = False
+        self._trava = threading.Lock()
+
+        self._thread = threading.Thread(target=self._executar, name=f"EscritorLog({caminho})", daemon=True)
+        self._thread.start()
+        atexit.register(self.fechar)
+
+    def escrever(self, texto: str):
+        """Enfileira o texto para gravação (bloqueia apenas se a fila estiver cheia)"""
+        if self._fechado:
+            raise ValueError(f"Log já fechado: {self.caminho}")
+        self._fila.put(texto)
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Aguarda a gravação de tudo que foi enfileirado até agora.
+
+        Returns:
+            True se o flush foi concluído dentro do timeout
+        """
+        if self._fechado:
+            return True
+        concluido = threading.Event()
+        self._fila.put(concluido)
+        return concluido.wait(timeout)
+
+    def fechar(self):
+        """Grava o que estiver pendente, fecha o arquivo e encerra a thread"""
+        with self._trava:
+            if self._fechado:
+                return
+            self._fechado = True
+        self._fila.put(_FIM)
+        self._thread.join()
+        atexit.unregister(self.fechar)
+
+    def _executar(self):
+        """Laço da thread: agrupa as escritas em lotes e faz flush periódico"""
+        ultimo_flush = time.monotonic()
+        pendente = False
+
+        while True:
+            try:
+                item = self._fila.get(timeout=self.intervalo_flush)
+            except queue.Empty:
+                if pendente:
+                    self._arquivo.flush()
+                    pendente = False
+                ultimo_flush = time.monotonic()
+                continue
+
+            lote = [item]
+            while len(lote) < TAMANHO_LOTE:
+                try:
+                    lote.append(self._fila.get_nowait())
+                except queue.Empty:
+                    break
+
+            textos = []
+            for item in lote:
+                if isinstance(item, str):
+                    textos.append(item)
+                    continue
+
+                # Marcador de flush ou de encerramento: grava o que veio antes dele
+                if textos:
+                    self._arquivo.write("".join(textos))
+                    textos = []
+                self._arquivo.flush()
+                pendente = False
+                ultimo_flush = time.monotonic()
+
+                if item is _FIM:
+                    self._arquivo.close()
+                    return
+                item.set()
+
+            if textos:
+                self._arquivo.write("".join(textos))
+                pendente = True
+
+            if pendente and time.monotonic() - ultimo_flush >= self.intervalo_flush:
+                self._arquivo.flush()
+                pendente = False
+                ultimo_flush = time.monotonic()
+
+
+def ler_deltas(caminho: str) -> Iterator[Dict]:
+    """
+    Lê os eventos de um log de deltas, na ordem em que foram gravados.
+
+    Uma última linha incompleta (ex: processo interrompido durante a escrita)
+    é ignorada.
+    """
+    with open(caminho, encoding="utf-8") as f:
+        for linha in f:
+            linha = linha.strip()
+            if not linha:
+                continue
+            try:
+                yield json.loads(linha)
+            except json.JSONDecodeError:
+                return
+
+
+def reconstruir_historico(caminho: str, ate_turno: int = None) -> List[Dict[str, str]]:
+    """
+    Reconstrói o histórico em memória a partir de um log de deltas.
+
+    Args:
+        caminho: Arquivo .deltas.jsonl gerado com LOG_MODO=delta
+        ate_turno: Se informado, para após o turno com esse número
+
+    Returns:
+        Lista de mensagens {"role": ..., "content": ...}, como em chat.historico
+
+    Raises:
+        ValueError: Se o total reconstruído divergir do total registrado no log
+    """
+    historico = []
+
+    for registro in ler_deltas(caminho):
+        evento = registro["evento"]
+
+        if evento == "snapshot":
+            historico = list(registro["mensagens"])
+        elif evento == "mensagem":
+            historico.append({"role": registro["role"], "content": registro["content"]})
+        elif evento == "turno":
+            historico.append({"role": "user", "content": registro["user"]})
+            historico.append({"role": "assistant", "content": registro["assistant"]})
+            del historico[:registro["removidas"]]
+        elif evento == "limpeza":
+            historico = []
+
+        if "total" in registro and len(historico) != registro["total"]:
+            raise ValueError(
+                f"Log de deltas inconsistente no evento '{evento}' ({registro.get('ts')}): "
+                f"{len(historico)} mensagens reconstruídas, {registro['total']} registradas"
+            )
+
+        if ate_turno is not None and evento == "turno" and registro["n"] >= ate_turno:
+            break
+
+    return historico
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python log_debug.py ARQUIVO.deltas.jsonl [TURNO]")
+        sys.exit(1)
+
+    turno = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    for i, msg in enumerate(reconstruir_historico(sys.argv[1], turno), 1):
+        role = "USUÁRIO" if msg["role"] == "user" else "ASSISTENTE"
+        print(f"[{i}] {role}:\n{msg['content']}\n")
@@ -0,0 +1,305 @@
+"""
+Lote Batch - Conversas roteirizadas em massa pela Batch API
+
+Jobs noturnos com perguntas roteirizadas (no estilo de exemplo_programatico)
+em milhares de sessões sintéticas não precisam de respostas interativas. O
+LoteConversas envia os turnos pela Batch API: mais barata que as chamadas
+síncronas e sem o limite de uma requisição por vez.
+
+Como cada pergunta depende da resposta anterior da mesma sessão, o job é
+executado em rodadas: a cada rodada, o próximo turno de todas as sessões vai
+em um único arquivo JSONL (um prompt por sessão, montado como em
+enviar_mensagem), o lote é submetido e consultado até concluir, e cada
+resposta volta ao histórico da sua sessão com as regras de memória
+aplicadas turno a turno (sliding window, resumo, memória semântica,
+armazenamento, log de debug).
+
+    lote = LoteConversas()
+    for i in range(1000):
+        lote.adicionar(ChatComMemoria(sessao_id=f"sintetica-{i}", exibir_banner=False), perguntas)
+    resultados = lote.executar()
+
+Uso no terminal (com --mock, contra o servidor_mock.py, sem custo):
+    python lote_batch.py [sessoes] [--mock]
+
+Configurações opcionais do .env:
+    LOTE_INTERVALO_CONSULTA: Segundos entre consultas ao status do lote. Padrão: 10
+"""
+
+import json
+import sys
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Dict, List
+
+from chat_openai_memoria import ChatMemoriaBase
+from configuracao import ConfiguracaoChat, carregar_configuracao
+from metricas import RegistroMetricas
+
+ENDPOINT = "/v1/chat/completions"
+JANELA_CONCLUSAO = "24h"  # Única janela aceita pela Batch API
+STATUS_FINAIS = ("completed", "failed", "expired", "cancelled")
+
+# Buckets (segundos) da duração de um lote: de segundos até a janela de 24h
+BUCKETS_LOTE = (1.0, 10.0, 60.0, 300.0, 900.0, 3600.0, 4 * 3600.0, 12 * 3600.0, 24 * 3600.0)
+
+
+class _FilaSessao:
+    """Perguntas pendentes e respostas de uma sessão do lote"""
+
+    __slots__ = ("chat", "perguntas", "respostas", "erro")
+
+    def __init__(self, chat: ChatMemoriaBase):
+        self.chat = chat
+        self.perguntas = deque()
+        self.respostas = []
+        self.erro = None
+
+
+class LoteConversas:
+    """Executa perguntas roteirizadas de muitas sessões pela Batch API, em rodadas"""
+
+    def __init__(self, client=None, config: ConfiguracaoChat = None, intervalo_consulta: float = None,
+                 metricas: RegistroMetricas = None):
+        """
+        Args:
+            client: Cliente síncrono da API (ex: gerenciador.client).
+                   Se None, cria um com a chave e OPENAI_BASE_URL da configuração.
+            config: Configuração usada para criar o cliente.
+                   Se None, usa a configuração do .env (carregada uma única vez).
+            intervalo_consulta: Segundos entre consultas ao status de cada lote.
+                               Se None, carrega de LOTE_INTERVALO_CONSULTA no .env. Padrão: 10.
+            metricas: Registro onde contar lotes, requisições e falhas.
+        """
+        if config is None:
+            config = carregar_configuracao()
+        self.config = config.com(lote_intervalo_consulta=intervalo_consulta)
+        self.intervalo_consulta = self.config.lote_intervalo_consulta
+        self._client = client
+        self._filas: Dict[str, _FilaSessao] = {}
+        self.lotes: List[str] = []  # Ids dos lotes submetidos, em ordem
+
+        metricas = metricas if metricas is not None else RegistroMetricas()
+        self.metricas = metricas
+        self._m_lotes = metricas.contador("chat_lotes_total", "Lotes submetidos à Batch API")
+        self._m_requisicoes = metricas.contador("chat_lote_requisicoes_total", "Turnos enviados em lotes")
+        self._m_falhas = metricas.contador("chat_lote_falhas_total", "Turnos de lote sem resposta válida")
+        self._m_duracao = metricas.histograma("chat_lote_duracao_segundos",
+                                              "Tempo da submissão até a conclusão de um lote",
+                                              buckets=BUCKETS_LOTE)
+
+    @property
+    def client(self):
+        """Cliente da API (criado apenas no primeiro uso)"""
+        if self._client is None:
+            from openai import OpenAI
+
+            opcoes = {"api_key": self.config.api_key}
+            if self.config.base_url:
+                opcoes["base_url"] = self.config.base_url
+            self._client = OpenAI(**opcoes)
+        return self._client
+
+    def adicionar(self, chat: ChatMemoriaBase, perguntas: List[str]):
+        """
+        Enfileira perguntas para uma sessão (enviadas uma por rodada, em ordem).
+
+        Chamadas repetidas para a mesma sessão acrescentam ao fim da fila.
+        """
+        fila = self._filas.get(chat.sessao_id)
+        if fila is None:
+            fila = self._filas[chat.sessao_id] = _FilaSessao(chat)
+        fila.perguntas.extend(perguntas)
+
+    @property
+    def pendentes(self) -> int:
+        """Perguntas ainda não enviadas (sessões com erro não contam)"""
+        return sum(len(fila.perguntas) for fila in self._filas.values() if fila.erro is None)
+
+    def executar(self) -> Dict[str, dict]:
+        """
+        Executa rodadas até esgotar as perguntas de todas as sessões.
+
+        Returns:
+            Para cada sessao_id: {"respostas": [...], "erro": None ou mensagem}.
+            Uma sessão com erro deixa de receber as perguntas seguintes
+            (o turno com erro é desfeito, como em enviar_mensagem).
+        """
+        while self.pendentes:
+            self.executar_rodada()
+        return {sessao_id: {"respostas": list(fila.respostas), "erro": fila.erro}
+                for sessao_id, fila in self._filas.items()}
+
+    def executar_rodada(self) -> int:
+        """
+        Envia o próximo turno de cada sessão em um lote e aplica as respostas.
+
+        Returns:
+            Quantidade de turnos concluídos na rodada
+        """
+        linhas, turnos, concluidos = self._preparar_rodada()
+        if not linhas:
+            return concluidos
+
+        inicio = time.perf_counter()
+        try:
+            lote = self.aguardar(self.submeter(linhas))
+            self._m_duracao.observar(time.perf_counter() - inicio)
+            resultados = self._ler_resultados(lote)
+        except BaseException:
+            # Falha ao submeter/consultar/ler (ou Ctrl+C durante a espera): nenhuma
+            # resposta foi aplicada; desfaz os turnos para a rodada poder ser repetida
+            self._desfazer_rodada(turnos)
+            raise
+
+        for custom_id, (fila, pergunta, tokens_antes, chave_cache) in turnos.items():
+            resultado = resultados.get(custom_id)
+            erro = self._erro_resultado(resultado, lote)
+            if erro:
+                self._m_falhas.incrementar()
+                fila.erro = str(fila.chat._erro_api(Exception(erro), pergunta))
+                continue
+
+            inicio_local = time.perf_counter()
+            corpo = resultado.response.body
+            resposta_texto = corpo.choices[0].message.content or ""
+            chat = fila.chat
+            chat._guardar_cache(chave_cache, resposta_texto)
+            chat._concluir_turno(pergunta, resposta_texto, tokens_antes, usage=getattr(corpo, "usage", None))
+            chat._registrar_metricas_turno(None, time.perf_counter() - inicio_local, getattr(corpo, "usage", None))
+            fila.respostas.append(resposta_texto)
+            concluidos += 1
+        return concluidos
+
+    def _preparar_rodada(self) -> tuple:
+        """
+        Inicia o próximo turno de cada sessão e monta as linhas do JSONL.
+
+        Turnos atendidos pelo cache de respostas são concluídos aqui mesmo.
+
+        Returns:
+            Tupla (linhas, turnos, respondidos pelo cache), com
+            turnos = {custom_id: (fila, pergunta, tokens_antes, chave_cache)}
+        """
+        linhas, turnos = [], {}
+        do_cache = 0
+        for sessao_id, fila in self._filas.items():
+            if fila.erro is not None or not fila.perguntas:
+                continue
+            chat = fila.chat
+            pergunta = fila.perguntas.popleft()
+            recuperados = chat._recuperar_memoria(pergunta)
+            inicio = time.perf_counter()
+            tokens_antes, mensagens = chat._iniciar_turno(pergunta, recuperados)
+
+            chave_cache, resposta_cache = chat._consultar_cache(mensagens)
+            if resposta_cache is not None:
+                chat._concluir_turno_cache(pergunta, resposta_cache, tokens_antes, inicio)
+                fila.respostas.append(resposta_cache)
+                do_cache += 1
+                continue
+
+            custom_id = f"{sessao_id}:{len(fila.respostas)}"
+            linhas.append(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": ENDPOINT,
+                "body": {
+                    "model": chat.modelo,
+                    "messages": [{"role": msg["role"], "content": msg["content"]} for msg in mensagens],
+                    "temperature": chat.temperature,
+                    "max_tokens": chat.max_tokens,
+                },
+            }, ensure_ascii=False))
+            turnos[custom_id] = (fila, pergunta, tokens_antes, chave_cache)
+        return linhas, turnos, do_cache
+
+    def _desfazer_rodada(self, turnos: dict):
+        """Remove dos históricos as mensagens dos turnos enviados e devolve as perguntas às filas"""
+        for fila, pergunta, _, _ in turnos.values():
+            fila.chat._desfazer_mensagem_usuario(pergunta)
+            fila.perguntas.appendleft(pergunta)
+
+    def submeter(self, linhas: List[str]) -> str:
+        """Envia o JSONL (Files API) e cria o lote; retorna o id do lote"""
+        conteudo = ("\n".join(linhas) + "\n").encode("utf-8")
+        arquivo = self.client.files.create(file=("lote.jsonl", conteudo, "application/jsonl"), purpose="batch")
+        lote = self.client.batches.create(input_file_id=arquivo.id, endpoint=ENDPOINT,
+                                          completion_window=JANELA_CONCLUSAO)
+        self.lotes.append(lote.id)
+        self._m_lotes.incrementar()
+        self._m_requisicoes.incrementar(len(linhas))
+        return lote.id
+
+    def aguardar(self, lote_id: str):
+        """Consulta o lote a cada intervalo_consulta segundos até um status final; retorna o lote"""
+        while True:
+            lote = self.client.batches.retrieve(lote_id)
+            if lote.status in STATUS_FINAIS:
+                return lote
+            time.sleep(self.intervalo_consulta)
+
+    def _ler_resultados(self, lote) -> Dict[str, SimpleNamespace]:
+        """Lê os arquivos de saída e de erros do lote, indexados por custom_id"""
+        resultados = {}
+        for arquivo_id in (lote.output_file_id, lote.error_file_id):
+            if not arquivo_id:
+                continue
+            for linha in self.client.files.content(arquivo_id).text.splitlines():
+                if linha.strip():
+                    registro = json.loads(linha, object_hook=lambda campos: SimpleNamespace(**campos))
+                    resultados[registro.custom_id] = registro
+        return resultados
+
+    @staticmethod
+    def _erro_resultado(resultado, lote) -> str:
+        """Mensagem de erro do resultado de um turno ('' se a resposta é válida)"""
+        if resultado is None:
+            return f"Lote {lote.id} terminou com status '{lote.status}' sem resultado para o turno"
+        if resultado.error:
+            return f"{getattr(resultado.error, 'code', '')}: {getattr(resultado.error, 'message', '')}"
+        if resultado.response is None or resultado.response.status_code != 200:
+            return f"Status HTTP {getattr(resultado.response, 'status_code', None)} no lote {lote.id}"
+        if not getattr(resultado.response.body, "choices", None):
+            return f"Resposta sem choices no lote {lote.id}"
+        return ""
+
+
+if __name__ == "__main__":
+    argumentos = [a for a in sys.argv[1:] if not a.startswith("--")]
+    sessoes = int(argumentos[0]) if argumentos else 10
+
+    from chat_openai_memoria import ChatComMemoria
+
+    perguntas = [
+        "O que é uma lista em Python?",
+        "E como eu adiciono elementos nela?",
+        "Pode me dar um exemplo prático?",
+    ]
+
+    servidor = None
+    config = carregar_configuracao()
+    if "--mock" in sys.argv:
+        from servidor_mock import ServidorMock
+
+        servidor = ServidorMock().iniciar()
+        config = config.com(base_url=servidor.base_url)
+
+    lote = LoteConversas(config=config, intervalo_consulta=0.2 if servidor else None)
+    for i in range(sessoes):
+        chat = ChatComMemoria(config=config, sessao_id=f"lote-{i}", exibir_banner=False)
+        chat.definir_personalidade("Você é um professor de Python que explica conceitos de forma simples.")
+        lote.adicionar(chat, perguntas)
+
+    inicio = time.perf_counter()
+    resultados = lote.executar()
+    erros = sum(1 for r in resultados.values() if r["erro"])
+    print(f"\n{sessoes} sessões x {len(perguntas)} perguntas em {len(lote.lotes)} lotes "
+          f"({time.perf_counter() - inicio:.1f} s, {erros} sessões com erro)")
+    primeira = next(iter(resultados.values()))
+    for pergunta, resposta in zip(perguntas, primeira["respostas"]):
+        print(f"\nVOCÊ: {pergunta}\nASSISTENTE: {resposta}")
+
+    if servidor:
+        servidor.parar()
@@ -0,0 +1,175 @@
+"""
+Memória de Resumo - Resumo contínuo das mensagens removidas pelo sliding window
+
+Quando o sliding window descarta pares antigos, o ResumidorMemoria incorpora
+essas mensagens a um resumo corrente, gerado por um modelo barato
+(RESUMO_MODELO). O chat envia o resumo logo após o system prompt, de modo que
+o modelo mantém o essencial da conversa antiga com poucos tokens.
+
+O resumo é gerado fora do caminho crítico: resumir() apenas enfileira as
+mensagens e retorna; um worker em segundo plano faz a chamada à API enquanto
+o usuário lê a resposta e digita a próxima mensagem. Enquanto um novo resumo
+não fica pronto, o chat continua usando o anterior.
+
+Configurações opcionais do .env:
+    MEMORIA_RESUMO: true para ativar. Padrão: false
+    RESUMO_MODELO: Modelo usado nos resumos. Padrão: OPENAI_MODEL
+    RESUMO_MAX_TOKENS: Tamanho máximo de cada resumo. Padrão: 300
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Mapping
+
+from metricas import RegistroMetricas
+
+# Workers compartilhados por todas as sessões (os resumos de uma mesma sessão
+# são sempre gerados em sequência, um lote por vez)
+MAX_WORKERS = 4
+
+INSTRUCOES_RESUMO = (
+    "Você mantém o resumo de uma conversa entre um usuário e um assistente. "
+    "Atualize o resumo atual incorporando as novas mensagens. Preserve fatos, "
+    "decisões, preferências, nomes e números citados; descarte cumprimentos e "
+    "repetições. Responda apenas com o resumo atualizado, em português, em até {palavras} palavras."
+)
+
+_ROTULOS = {"user": "Usuário", "assistant": "Assistente"}
+
+_executor = None
+_trava_executor = threading.Lock()
+
+
+def _obter_executor() -> ThreadPoolExecutor:
+    """Executor compartilhado, criado apenas no primeiro resumo"""
+    global _executor
+    with _trava_executor:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="resumo")
+        return _executor
+
+
+class ResumidorMemoria:
+    """Mantém o resumo corrente de uma sessão, atualizado em segundo plano"""
+
+    def __init__(self, obter_cliente: Callable, modelo: str, max_tokens: int = 300,
+                 metricas: RegistroMetricas = None, ao_atualizar: Callable[[str], None] = None):
+        """
+        Args:
+            obter_cliente: Função que retorna um cliente síncrono da API (chamada no worker)
+            modelo: Modelo usado para gerar os resumos
+            max_tokens: Tamanho máximo de cada resumo
+            metricas: Registro onde contar resumos, falhas e latência
+            ao_atualizar: Chamada (no worker) com o novo resumo, ex: para o log de debug
+        """
+        self.obter_cliente = obter_cliente
+        self.modelo = modelo
+        self.max_tokens = max_tokens
+        self.ao_atualizar = ao_atualizar
+        self.ultimo_erro = None
+
+        self._resumo = ""
+        self._pendentes: List[Mapping[str, str]] = []
+        self._ativo = False
+        self._geracao = 0  # Incrementada em limpar(); descarta resumos em andamento
+        self._trava = threading.Lock()
+        self._ocioso = threading.Event()
+        self._ocioso.set()
+
+        metricas = metricas if metricas is not None else RegistroMetricas()
+        self._m_resumos = metricas.contador("chat_resumos_total", "Resumos de memória gerados")
+        self._m_falhas = metricas.contador("chat_resumo_falhas_total", "Falhas ao gerar o resumo de memória")
+        self._m_latencia = metricas.histograma("chat_resumo_latencia_segundos",
+                                               "Duração da chamada de resumo (em segundo plano)")
+
+    @property
+    def resumo(self) -> str:
+        """Resumo mais recente (nunca bloqueia; vazio até o primeiro resumo)"""
+        return self._resumo
+
+    @property
+    def pendentes(self) -> int:
+        """Mensagens aguardando para entrar no resumo"""
+        return len(self._pendentes)
+
+    def resumir(self, mensagens: List[Mapping[str, str]]):
+        """
+        Enfileira mensagens removidas do histórico para entrar no resumo.
+
+        Retorna imediatamente; o resumo é atualizado em segundo plano.
+        """
+        if not mensagens:
+            return
+        with self._trava:
+            self._pendentes.extend(mensagens)
+            if self._ativo:
+                return
+            self._ativo = True
+            self._ocioso.clear()
+        _obter_executor().submit(self._processar)
+
+    def aguardar(self, timeout: float = None) -> bool:
+        """
+        Aguarda os resumos pendentes (ex: antes de encerrar ou em testes).
+
+        Returns:
+            True se não há mais resumos em andamento
+        """
+        return self._ocioso.wait(timeout)
+
+    def limpar(self):
+        """Descarta o resumo e as mensagens pendentes"""
+        with self._trava:
+            self._resumo = ""
+            self._pendentes = []
+            self._geracao += 1
+
+    def _processar(self):
+        """Worker: incorpora os lotes pendentes ao resumo, um por vez"""
+        while True:
+            with self._trava:
+                if not self._pendentes:
+                    self._ativo = False
+                    self._ocioso.set()
+                    return
+                lote, self._pendentes = self._pendentes, []
+                resumo_atual, geracao = self._resumo, self._geracao
+
+            inicio = time.perf_counter()
+            try:
+                novo_resumo = self._gerar_resumo(resumo_atual, lote)
+            except Exception as e:
+                # Devolve o lote à fila; ele entra no próximo resumo solicitado
+                self.ultimo_erro = e
+                self._m_falhas.incrementar()
+                with self._trava:
+                    if geracao == self._geracao:
+                        self._pendentes[:0] = lote
+                    self._ativo = False
+                    self._ocioso.set()
+                return
+
+            self._m_latencia.observar(time.perf_counter() - inicio)
+            self._m_resumos.incrementar()
+            with self._trava:
+                if geracao != self._geracao:
+                    continue
+                self._resumo = novo_resumo
+            if self.ao_atualizar:
+                self.ao_atualizar(novo_resumo)
+
+    def _gerar_resumo(self, resumo_atual: str, mensagens: List[Mapping[str, str]]) -> str:
+        """Chama o modelo de resumo e retorna o resumo atualizado"""
+        conversa = "\n".join(f"{_ROTULOS.get(msg['role'], msg['role'])}: {msg['content']}" for msg in mensagens)
+        resposta = self.obter_cliente().chat.completions.create(
+            model=self.modelo,
+            messages=[
+                {"role": "system", "content": INSTRUCOES_RESUMO.format(palavras=self.max_tokens * 3 // 4)},
+                {"role": "user", "content": f"Resumo atual:\n{resumo_atual or '(vazio)'}\n\n"
+                                            f"Novas mensagens:\n{conversa}"},
+            ],
+            temperature=0.0,
+            max_tokens=self.max_tokens
+        )
+        return (resposta.choices[0].message.content or "").strip() or resumo_atual
@@ -0,0 +1,306 @@
+"""
+Memória Semântica - Recuperação de turnos antigos por similaridade
+
+Os pares (pergunta + resposta) removidos pelo sliding window são convertidos
+em embeddings e guardados em um índice local. A cada envio, apenas os k
+turnos antigos mais parecidos com a nova mensagem são incluídos no prompt,
+em vez de todo o histórico.
+
+- IndiceVetorial: matriz float32 contígua com os vetores normalizados; a busca
+  é um único produto matriz-vetor (similaridade de cosseno) + argpartition.
+  Pode ser salvo em disco e reaberto com mmap (sem carregar tudo na memória).
+- EmbedderOpenAI: embeddings pela API (usa o mesmo cliente do chat, logo
+  respeita OPENAI_BASE_URL).
+- EmbedderLocal: embeddings determinísticos por hashing de palavras, sem
+  rede nem custo (testes e uso offline).
+
+Requer numpy (pip install numpy).
+
+Configurações opcionais do .env:
+    MEMORIA_SEMANTICA: true para ativar. Padrão: false
+    SEMANTICA_TOP_K: Turnos antigos incluídos por envio. Padrão: 3
+    EMBEDDINGS_MODELO: Modelo de embeddings, ou 'local'. Padrão: text-embedding-3-small
+    SEMANTICA_DIRETORIO: Diretório dos índices (SEMANTICA_DIRETORIO/<sessao_id>.npy/.json),
+                         para persistir a sessão entre execuções
+"""
+
+import json
+import os
+import re
+import threading
+import zlib
+from typing import Callable, Dict, List, Mapping, Tuple
+
+import numpy as np
+
+# Máximo de textos por chamada à API de embeddings
+TAMANHO_LOTE_EMBEDDINGS = 256
+
+_ROTULOS = {"user": "Usuário", "assistant": "Assistente"}
+
+
+class EmbedderLocal:
+    """
+    Embeddings determinísticos por hashing de palavras (feature hashing).
+
+    Textos com palavras em comum ficam próximos; não captura sinônimos, mas é
+    estável entre execuções e não faz chamadas de rede.
+    """
+
+    def __init__(self, dimensoes: int = 256):
+        self.dimensoes = dimensoes
+        self.descricao = f"local (hashing, {dimensoes} dimensões)"
+
+    def embed(self, textos: List[str]) -> np.ndarray:
+        """Retorna uma matriz float32 (len(textos), dimensoes)"""
+        vetores = np.zeros((len(textos), self.dimensoes), dtype=np.float32)
+        for linha, texto in enumerate(textos):
+            for palavra in re.findall(r"\w+", texto.lower()):
+                h = zlib.crc32(palavra.encode("utf-8"))
+                vetores[linha, h % self.dimensoes] += 1.0 if h & 0x80000000 else -1.0
+        return vetores
+
+
+class EmbedderOpenAI:
+    """Embeddings pela API (endpoint /embeddings do cliente configurado)"""
+
+    def __init__(self, obter_cliente: Callable, modelo: str = "text-embedding-3-small"):
+        """
+        Args:
+            obter_cliente: Função que retorna um cliente síncrono da API
+            modelo: Modelo de embeddings
+        """
+        self.obter_cliente = obter_cliente
+        self.modelo = modelo
+        self.descricao = f"API ({modelo})"
+
+    def embed(self, textos: List[str]) -> np.ndarray:
+        """Retorna uma matriz float32 (len(textos), dimensoes), em lotes de até 256 textos"""
+        cliente = self.obter_cliente()
+        partes = []
+        for inicio in range(0, len(textos), TAMANHO_LOTE_EMBEDDINGS):
+            resposta = cliente.embeddings.create(model=self.modelo,
+                                                 input=textos[inicio:inicio + TAMANHO_LOTE_EMBEDDINGS])
+            dados = sorted(resposta.data, key=lambda item: item.index)
+            partes.append(np.asarray([item.embedding for item in dados], dtype=np.float32))
+        return np.concatenate(partes) if partes else np.zeros((0, 0), dtype=np.float32)
+
+
+class IndiceVetorial:
+    """Índice em memória de vetores normalizados com busca top-k por cosseno"""
+
+    def __init__(self, capacidade_inicial: int = 1024):
+        self._capacidade_inicial = capacidade_inicial
+        self._vetores = None  # Matriz (capacidade, dimensoes); linhas [0, total) em uso
+        self.itens: List[Dict] = []
+        self._gravado_em = None  # Prefixo cujo conteúdo em disco é igual ao do índice
+
+    @property
+    def total(self) -> int:
+        return len(self.itens)
+
+    @property
+    def dimensoes(self) -> int:
+        return 0 if self._vetores is None else self._vetores.shape[1]
+
+    def adicionar(self, vetores: np.ndarray, itens: List[Dict]):
+        """
+        Adiciona vetores (uma linha por item) ao índice.
+
+        A matriz cresce dobrando de capacidade, então o custo amortizado por
+        item é constante e os vetores continuam em um bloco contíguo.
+        """
+        if len(itens) == 0:
+            return
+        vetores = _normalizar(np.asarray(vetores, dtype=np.float32))
+        total, novos = self.total, len(itens)
+
+        if self._vetores is None:
+            capacidade = max(self._capacidade_inicial, novos)
+            self._vetores = np.zeros((capacidade, vetores.shape[1]), dtype=np.float32)
+        elif vetores.shape[1] != self.dimensoes:
+            raise ValueError(f"Dimensão {vetores.shape[1]} diferente da do índice ({self.dimensoes})")
+        elif total + novos > self._vetores.shape[0] or not self._vetores.flags.writeable:
+            # Também cobre o índice aberto com mmap (somente leitura): copia para a memória
+            capacidade = max(self._vetores.shape[0] * 2, total + novos)
+            ampliada = np.zeros((capacidade, self.dimensoes), dtype=np.float32)
+            ampliada[:total] = self._vetores[:total]
+            self._vetores = ampliada
+
+        self._vetores[total:total + novos] = vetores
+        self.itens.extend(itens)
+        self._gravado_em = None
+
+    def buscar(self, consultas: np.ndarray, k: int) -> List[List[Tuple[float, Dict]]]:
+        """
+        Busca os k itens mais similares para cada consulta (em lote).
+
+        Args:
+            consultas: Matriz (n, dimensoes) ou vetor (dimensoes,)
+            k: Quantidade de resultados por consulta
+
+        Returns:
+            Para cada consulta, lista de (similaridade, item) em ordem decrescente
+        """
+        consultas = _normalizar(np.atleast_2d(np.asarray(consultas, dtype=np.float32)))
+        total = self.total
+        if total == 0 or k <= 0:
+            return [[] for _ in range(len(consultas))]
+
+        k = min(k, total)
+        similaridades = consultas @ self._vetores[:total].T  # (n, total)
+        if k < total:
+            candidatos = np.argpartition(-similaridades, k - 1, axis=1)[:, :k]
+        else:
+            candidatos = np.broadcast_to(np.arange(total), (len(consultas), total))
+
+        resultados = []
+        for linha, indices in enumerate(candidatos):
+            pontos = similaridades[linha, indices]
+            ordem = indices[np.argsort(-pontos)]
+            resultados.append([(float(similaridades[linha, i]), self.itens[i]) for i in ordem])
+        return resultados
+
+    def limpar(self):
+        self._vetores = None
+        self.itens = []
+        self._gravado_em = None
+
+    def salvar(self, prefixo: str):
+        """
+        Grava o índice em PREFIXO.npy (vetores) e PREFIXO.json (itens).
+
+        Os vetores podem estar mapeados do próprio PREFIXO.npy (carregar com
+        mmap): os arquivos são escritos ao lado e substituídos com os.replace,
+        nunca truncados. Sem alterações desde carregar()/salvar(), não grava nada.
+        """
+        if prefixo == self._gravado_em:
+            return
+        diretorio = os.path.dirname(prefixo)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        vetores = self._vetores[:self.total] if self._vetores is not None else np.zeros((0, 0), np.float32)
+        with open(prefixo + ".npy.tmp", "wb") as f:
+            np.save(f, vetores)
+        with open(prefixo + ".json.tmp", "w", encoding="utf-8") as f:
+            json.dump(self.itens, f, ensure_ascii=False)
+        os.replace(prefixo + ".npy.tmp", prefixo + ".npy")
+        os.replace(prefixo + ".json.tmp", prefixo + ".json")
+        self._gravado_em = prefixo
+
+    @classmethod
+    def carregar(cls, prefixo: str, mmap: bool = True) -> "IndiceVetorial":
+        """
+        Abre um índice salvo com salvar().
+
+        Args:
+            prefixo: Prefixo dos arquivos .npy/.json
+            mmap: Se True, os vetores são mapeados do disco (somente leitura)
+                  e só são copiados para a memória ao adicionar novos itens
+        """
+        indice = cls()
+        with open(prefixo + ".json", encoding="utf-8") as f:
+            indice.itens = json.load(f)
+        if indice.itens:
+            indice._vetores = np.load(prefixo + ".npy", mmap_mode="r" if mmap else None)
+        indice._gravado_em = prefixo
+        return indice
+
+
+class MemoriaSemantica:
+    """Guarda turnos removidos do histórico e recupera os mais relevantes"""
+
+    def __init__(self, embedder, top_k: int = 3, arquivo: str = None, similaridade_minima: float = 0.1):
+        """
+        Args:
+            embedder: EmbedderOpenAI ou EmbedderLocal (qualquer objeto com embed(textos))
+            top_k: Turnos recuperados por consulta
+            arquivo: Prefixo para persistir o índice (carregado se existir; gravado em salvar())
+            similaridade_minima: Turnos abaixo desta similaridade não são recuperados
+        """
+        self.embedder = embedder
+        self.top_k = top_k
+        self.arquivo = arquivo
+        self.similaridade_minima = similaridade_minima
+        self._pendentes: List[Dict] = []
+        self._trava = threading.Lock()
+
+        if arquivo and os.path.exists(arquivo + ".json"):
+            self.indice = IndiceVetorial.carregar(arquivo)
+        else:
+            self.indice = IndiceVetorial()
+
+    @property
+    def total(self) -> int:
+        """Turnos guardados (incluindo os que aguardam o próximo lote de embeddings)"""
+        return self.indice.total + len(self._pendentes)
+
+    def memorizar(self, mensagens: List[Mapping[str, str]]):
+        """
+        Guarda mensagens removidas do histórico, agrupadas em turnos.
+
+        Os embeddings não são calculados aqui: os turnos aguardam e são
+        enviados na mesma chamada que a consulta do próximo recuperar().
+        """
+        turnos = []
+        for msg in mensagens:
+            if msg["role"] == "user" or not turnos:
+                turnos.append([])
+            turnos[-1].append(f"{_ROTULOS.get(msg['role'], msg['role'])}: {msg['content']}")
+        with self._trava:
+            self._pendentes.extend({"texto": "\n".join(linhas)} for linhas in turnos)
+
+    def recuperar(self, consulta: str, k: int = None) -> List[str]:
+        """
+        Retorna os textos dos turnos antigos mais relevantes para a consulta.
+
+        Uma única chamada ao embedder calcula a consulta e os turnos pendentes.
+        """
+        with self._trava:
+            pendentes, self._pendentes = self._pendentes, []
+        if not pendentes and self.indice.total == 0:
+            return []
+
+        try:
+            vetores = self.embedder.embed([consulta] + [item["texto"] for item in pendentes])
+        except Exception:
+            self._devolver_pendentes(pendentes)
+            raise
+        with self._trava:
+            self.indice.adicionar(vetores[1:], pendentes)
+            resultados = self.indice.buscar(vetores[0], k or self.top_k)[0]
+        return [item["texto"] for similaridade, item in resultados
+                if similaridade >= self.similaridade_minima]
+
+    def limpar(self):
+        with self._trava:
+            self._pendentes = []
+            self.indice.limpar()
+
+    def salvar(self):
+        """Persiste o índice em disco (se arquivo foi configurado); inclui os pendentes"""
+        if not self.arquivo:
+            return
+        with self._trava:
+            pendentes, self._pendentes = self._pendentes, []
+        if pendentes:
+            try:
+                vetores = self.embedder.embed([item["texto"] for item in pendentes])
+            except Exception:
+                self._devolver_pendentes(pendentes)
+                raise
+        with self._trava:
+            if pendentes:
+                self.indice.adicionar(vetores, pendentes)
+            self.indice.salvar(self.arquivo)
+
+    def _devolver_pendentes(self, pendentes: List[Dict]):
+        """Recoloca na fila os turnos cujo embedding falhou (só existem aqui)"""
+        with self._trava:
+            self._pendentes[:0] = pendentes
+
+
+def _normalizar(vetores: np.ndarray) -> np.ndarray:
+    """Normaliza as linhas para norma 1 (linhas nulas permanecem nulas)"""
+    normas = np.linalg.norm(vetores, axis=-1, keepdims=True)
+    return vetores / np.where(normas == 0, 1.0, normas)
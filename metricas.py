@@ -0,0 +1,210 @@
+"""
+Métricas - Registro em processo de contadores e histogramas
+
+Cada turno do chat registra latência da API, tempo de processamento local e o
+uso real de tokens informado pela API (resposta.usage). Os valores ficam em um
+RegistroMetricas, que calcula percentis (p50/p95/p99) e exporta no formato de
+texto do Prometheus ou em JSON.
+
+Exemplo:
+    registro = RegistroMetricas()
+    latencia = registro.histograma("chat_latencia_api_segundos", "Latência da API")
+    latencia.observar(0.42)
+    print(registro.exportar_prometheus())
+"""
+
+import json
+import math
+import threading
+from bisect import bisect_left
+from collections import deque
+from typing import Dict, List
+
+# Limites (segundos) dos buckets padrão dos histogramas de tempo
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Buckets para operações locais (microssegundos a centenas de milissegundos)
+BUCKETS_RAPIDOS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# Buckets para frações (0 a 1), ex: proporção do prompt atendida pelo cache
+BUCKETS_PROPORCAO = (0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+
+# Quantidade de observações recentes mantidas para o cálculo de percentis
+AMOSTRAS_PADRAO = 2048
+
+
+class Contador:
+    """Valor que só aumenta (ex: total de turnos, tokens consumidos)"""
+
+    tipo = "counter"
+
+    def __init__(self, nome: str, descricao: str = ""):
+        self.nome = nome
+        self.descricao = descricao
+        self._valor = 0
+        self._trava = threading.Lock()
+
+    def incrementar(self, valor: float = 1):
+        """Soma valor (não negativo) ao contador"""
+        if valor < 0:
+            raise ValueError(f"Contador {self.nome} não pode diminuir (recebido {valor})")
+        with self._trava:
+            self._valor += valor
+
+    @property
+    def valor(self) -> float:
+        return self._valor
+
+    def resumo(self) -> Dict:
+        return {"tipo": self.tipo, "valor": self._valor}
+
+    def _linhas_prometheus(self) -> List[str]:
+        return [f"{self.nome} {_formatar(self._valor)}"]
+
+
+class Histograma:
+    """Distribuição de valores (ex: latências), com buckets e percentis"""
+
+    tipo = "histogram"
+
+    def __init__(self, nome: str, descricao: str = "", buckets=BUCKETS_PADRAO,
+                 max_amostras: int = AMOSTRAS_PADRAO):
+        self.nome = nome
+        self.descricao = descricao
+        self.buckets = tuple(sorted(buckets))
+        self._contagens = [0] * (len(self.buckets) + 1)  # último = +Inf
+        self._soma = 0.0
+        self._total = 0
+        self._amostras = deque(maxlen=max_amostras)
+        self._trava = threading.Lock()
+
+    def observar(self, valor: float):
+        """Registra uma observação"""
+        with self._trava:
+            self._contagens[bisect_left(self.buckets, valor)] += 1
+            self._soma += valor
+            self._total += 1
+            self._amostras.append(valor)
+
+    @property
+    def total(self) -> int:
+        return self._total
+
+    @property
+    def soma(self) -> float:
+        return self._soma
+
+    def percentil(self, p: float) -> float:
+        """
+        Percentil (0-100) das observações recentes, pelo método nearest-rank.
+
+        Returns:
+            Valor do percentil, ou 0.0 se não houver observações
+        """
+        with self._trava:
+            amostras = sorted(self._amostras)
+        if not amostras:
+            return 0.0
+        posicao = max(1, math.ceil(p / 100 * len(amostras)))
+        return amostras[posicao - 1]
+
+    def resumo(self) -> Dict:
+        return {
+            "tipo": self.tipo,
+            "total": self._total,
+            "soma": self._soma,
+            "media": self._soma / self._total if self._total else 0.0,
+            "p50": self.percentil(50),
+            "p95": self.percentil(95),
+            "p99": self.percentil(99),
+        }
+
+    def _linhas_prometheus(self) -> List[str]:
+        with self._trava:
+            contagens = list(self._contagens)
+            soma, total = self._soma, self._total
+        linhas = []
+        acumulado = 0
+        for limite, contagem in zip(self.buckets, contagens):
+            acumulado += contagem
+            linhas.append(f'{self.nome}_bucket{{le="{_formatar(limite)}"}} {acumulado}')
+        linhas.append(f'{self.nome}_bucket{{le="+Inf"}} {total}')
+        linhas.append(f"{self.nome}_sum {_formatar(soma)}")
+        linhas.append(f"{self.nome}_count {total}")
+        return linhas
+
+
+class RegistroMetricas:
+    """Conjunto de métricas nomeadas, com exportação em Prometheus ou JSON"""
+
+    def __init__(self):
+        self._metricas: Dict[str, object] = {}
+        self._trava = threading.Lock()
+
+    def _obter(self, classe, nome: str, descricao: str, **opcoes):
+        with self._trava:
+            metrica = self._metricas.get(nome)
+            if metrica is None:
+                metrica = classe(nome, descricao, **opcoes)
+                self._metricas[nome] = metrica
+            elif not isinstance(metrica, classe):
+                raise ValueError(f"Métrica '{nome}' já registrada como {metrica.tipo}")
+            return metrica
+
+    def contador(self, nome: str, descricao: str = "") -> Contador:
+        """Retorna o contador com esse nome, criando-o se necessário"""
+        return self._obter(Contador, nome, descricao)
+
+    def histograma(self, nome: str, descricao: str = "", **opcoes) -> Histograma:
+        """Retorna o histograma com esse nome, criando-o se necessário"""
+        return self._obter(Histograma, nome, descricao, **opcoes)
+
+    def resumo(self) -> Dict[str, Dict]:
+        """Retorna um dicionário {nome: resumo} com todas as métricas"""
+        return {nome: metrica.resumo() for nome, metrica in list(self._metricas.items())}
+
+    def exportar_json(self, arquivo: str = None) -> str:
+        """
+        Exporta as métricas em JSON.
+
+        Args:
+            arquivo: Se informado, também grava o resultado nesse arquivo
+
+        Returns:
+            Texto JSON
+        """
+        texto = json.dumps(self.resumo(), indent=2, ensure_ascii=False)
+        if arquivo:
+            with open(arquivo, "w", encoding="utf-8") as f:
+                f.write(texto)
+        return texto
+
+    def exportar_prometheus(self, arquivo: str = None) -> str:
+        """
+        Exporta as métricas no formato de texto do Prometheus
+        (compatível com o textfile collector do node_exporter).
+
+        Args:
+            arquivo: Se informado, também grava o resultado nesse arquivo
+
+        Returns:
+            Texto no formato de exposição do Prometheus
+        """
+        linhas = []
+        for nome, metrica in list(self._metricas.items()):
+            if metrica.descricao:
+                linhas.append(f"# HELP {nome} {metrica.descricao}")
+            linhas.append(f"# TYPE {nome} {metrica.tipo}")
+            linhas.extend(metrica._linhas_prometheus())
+        texto = "\n".join(linhas) + "\n"
+        if arquivo:
+            with open(arquivo, "w", encoding="utf-8") as f:
+                f.write(texto)
+        return texto
+
+
+def _formatar(valor: float) -> str:
+    """Formata números sem casas decimais desnecessárias"""
+    if isinstance(valor, int) or float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
@@ -0,0 +1,182 @@
+"""
+Perfilador - Perfil de CPU (cProfile) ou de memória (tracemalloc) dos turnos
+
+Com MODO_PROFILE no .env, cada turno de enviar_mensagem() e
+enviar_mensagem_stream() é executado com o perfilador ativo. Os dados se
+acumulam durante a sessão e são gravados ao lado do log de debug
+(logs/chat_debug_TIMESTAMP.*, ou logs/chat_profile_TIMESTAMP.* sem MODO_DEBUG)
+em chat.fechar() e na saída do programa (atexit):
+
+    cprofile     .prof: estatísticas do pstats (python -m pstats ARQUIVO, snakeviz)
+                 .prof.txt: funções com maior tempo acumulado
+    tracemalloc  .tracemalloc.txt: memória alocada e pico de cada turno e as
+                 linhas de código com mais memória retida ao gravar
+
+O cProfile e o tracemalloc são globais: apenas um turno é perfilado por vez
+no processo, e turnos simultâneos (outras threads ou sessões) são contados
+em ignorados. No streaming, o perfil inclui o código que consome os trechos;
+no modo assíncrono, o que o event loop executar durante as esperas do turno.
+Ao fechar, o tracemalloc é desligado se foi este perfilador que o ligou
+(religado no próximo turno, se a sessão continuar).
+
+O perfil tem custo (o cProfile deixa o código Python várias vezes mais lento):
+use para investigar, não em produção.
+"""
+
+import atexit
+import cProfile
+import io
+import os
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import List
+
+MODOS = ("cprofile", "tracemalloc")
+
+# Linhas de cada relatório de texto
+LINHAS_RELATORIO = 40
+
+# Um turno perfilado por vez no processo
+_em_uso = threading.Lock()
+
+
+class Perfilador:
+    """Perfil acumulado dos turnos de uma sessão"""
+
+    def __init__(self, modo: str, prefixo: str):
+        """
+        Args:
+            modo: 'cprofile' ou 'tracemalloc'
+            prefixo: Caminho dos arquivos sem extensão (ex: logs/chat_debug_20250101_120000)
+        """
+        if modo not in MODOS:
+            raise ValueError(f"MODO_PROFILE inválido: '{modo}'. Use {' ou '.join(MODOS)}")
+        self.modo = modo
+        self.prefixo = prefixo
+        self.turnos = 0
+        self.ignorados = 0  # Turnos não perfilados (outro turno já estava sendo perfilado)
+        self._perfil = cProfile.Profile() if modo == "cprofile" else None
+        self._memoria_turnos = []  # (alocado, pico) de cada turno, em bytes
+        self._memoria_inicio = 0
+        self._salvo = True
+        self._iniciou_tracemalloc = False  # Se o tracemalloc foi ligado por este perfilador
+        self._registrado = False  # Se fechar() está registrado no atexit
+
+    def _iniciar(self) -> bool:
+        if not _em_uso.acquire(blocking=False):
+            self.ignorados += 1
+            return False
+        if not self._registrado:
+            atexit.register(self.fechar)
+            self._registrado = True
+        try:
+            if self._perfil is not None:
+                self._perfil.enable()
+            else:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self._iniciou_tracemalloc = True
+                tracemalloc.reset_peak()
+                self._memoria_inicio = tracemalloc.get_traced_memory()[0]
+        except ValueError:
+            # Outro perfilador (ex: de um depurador) já está ativo
+            _em_uso.release()
+            self.ignorados += 1
+            return False
+        return True
+
+    def _parar(self):
+        try:
+            if self._perfil is not None:
+                self._perfil.disable()
+            else:
+                atual, pico = tracemalloc.get_traced_memory()
+                self._memoria_turnos.append((atual - self._memoria_inicio, pico - self._memoria_inicio))
+            self.turnos += 1
+            self._salvo = False
+        finally:
+            _em_uso.release()
+
+    @contextmanager
+    def turno(self):
+        """Perfila o bloco (um turno), se nenhum outro turno estiver sendo perfilado"""
+        ativo = self._iniciar()
+        try:
+            yield
+        finally:
+            if ativo:
+                self._parar()
+
+    def salvar(self) -> List[str]:
+        """
+        Grava o perfil acumulado (apenas se houver turnos novos desde a última gravação).
+
+        Returns:
+            Arquivos gravados
+        """
+        if self._salvo:
+            return []
+        diretorio = os.path.dirname(self.prefixo)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        cabecalho = f"Perfil ({self.modo}) de {self.turnos} turnos ({self.ignorados} não perfilados)\n\n"
+
+        if self._perfil is not None:
+            arquivos = [f"{self.prefixo}.prof", f"{self.prefixo}.prof.txt"]
+            self._perfil.dump_stats(arquivos[0])
+            texto = io.StringIO()
+            pstats.Stats(self._perfil, stream=texto).sort_stats("cumulative").print_stats(LINHAS_RELATORIO)
+            relatorio = cabecalho + texto.getvalue()
+        else:
+            arquivos = [f"{self.prefixo}.tracemalloc.txt"]
+            linhas = [cabecalho, f"{'turno':>6} | {'alocado (KiB)':>14} | {'pico (KiB)':>11}\n"]
+            for i, (alocado, pico) in enumerate(self._memoria_turnos, 1):
+                linhas.append(f"{i:>6} | {alocado / 1024:>14.1f} | {pico / 1024:>11.1f}\n")
+            if tracemalloc.is_tracing():
+                estatisticas = tracemalloc.take_snapshot().filter_traces((
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+                )).statistics("lineno")
+                linhas.append("\nLinhas com mais memória retida:\n")
+                linhas.extend(f"  {estatistica}\n" for estatistica in estatisticas[:LINHAS_RELATORIO])
+            relatorio = "".join(linhas)
+
+        with open(arquivos[-1], "w", encoding="utf-8") as f:
+            f.write(relatorio)
+        self._salvo = True
+        return arquivos
+
+    def fechar(self) -> List[str]:
+        """
+        Grava o perfil (ver salvar), desliga o tracemalloc se foi ligado por
+        este perfilador e remove o registro no atexit.
+
+        Um novo turno após fechar() volta a ligar o que for necessário.
+
+        Returns:
+            Arquivos gravados
+        """
+        try:
+            return self.salvar()
+        finally:
+            if self._iniciou_tracemalloc:
+                with _em_uso:  # Não desliga no meio do turno de outra sessão
+                    if tracemalloc.is_tracing():
+                        tracemalloc.stop()
+                    self._iniciou_tracemalloc = False
+            if self._registrado:
+                atexit.unregister(self.fechar)
+                self._registrado = False
+
+    def resumo(self) -> dict:
+        """Modo, turnos perfilados e arquivos de saída (ex: para debug_memoria)"""
+        extensao = ".prof" if self.modo == "cprofile" else ".tracemalloc.txt"
+        return {
+            "modo": self.modo,
+            "turnos": self.turnos,
+            "ignorados": self.ignorados,
+            "arquivo": self.prefixo + extensao,
+        }
@@ -0,0 +1,488 @@
+"""
+Servidor Mock - API compatível com a OpenAI para testes locais
+
+Servidor HTTP mínimo (apenas biblioteca padrão) que responde às rotas usadas
+pelo chat, sem custo e sem chave de API real:
+
+    GET  /v1/models
+    POST /v1/chat/completions   (com e sem stream=True, incluindo usage)
+    POST /v1/embeddings         (float ou base64, como o SDK solicita)
+    POST /v1/files              (upload multipart, purpose=batch)
+    GET  /v1/files/ID[/content]
+    POST /v1/batches            (Batch API: processado em segundo plano)
+    GET  /v1/batches/ID
+    POST /v1/batches/ID/cancel
+
+As respostas são determinísticas ("Resposta simulada: <última mensagem>";
+embeddings por hashing de palavras, textos com palavras em comum ficam
+próximos), o que permite exercitar o histórico, o sliding window, as
+memórias de resumo e semântica e as métricas de ponta a ponta.
+
+Falhas podem ser injetadas com injetar_falhas() (ex: 429 com Retry-After ou
+503), para exercitar as retentativas do chat.
+
+O cache de prompt do provedor também é simulado: usage informa em
+prompt_tokens_details.cached_tokens os tokens das mensagens iniciais cujo
+prefixo (mensagem a mensagem) já apareceu em uma requisição anterior.
+
+A latência, o ritmo do streaming, o tamanho das respostas e a presença de
+usage são configuráveis (ver benchmarks/bench_turno_mock.py).
+
+Uso no terminal:
+    python servidor_mock.py [porta] [latencia_segundos]
+
+    # em outro terminal, no .env:
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+
+Uso em código:
+    with ServidorMock(latencia=0.05) as servidor:
+        chat = ChatComMemoria(config=carregar_configuracao().com(base_url=servidor.base_url))
+        chat.enviar_mensagem("Olá")
+"""
+
+import base64
+import email.parser
+import email.policy
+import hashlib
+import json
+import re
+import struct
+import sys
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Quantidade de caracteres da mensagem repetidos na resposta simulada
+TAMANHO_ECO = 80
+
+# Dimensões padrão dos embeddings simulados
+DIMENSOES_EMBEDDING = 64
+
+# Prefixos guardados pelo cache de prompt simulado (descartados todos ao exceder)
+MAX_PREFIXOS = 100000
+
+
+def _contar_tokens(texto: str) -> int:
+    """Estimativa de ~4 caracteres por token (suficiente para o usage simulado)"""
+    return max(1, len(texto) // 4)
+
+
+def _embedding(texto: str, dimensoes: int) -> list:
+    """Vetor determinístico por hashing das palavras do texto (norma 1)"""
+    vetor = [0.0] * dimensoes
+    for palavra in re.findall(r"\w+", texto.lower()):
+        h = zlib.crc32(palavra.encode("utf-8"))
+        vetor[h % dimensoes] += 1.0 if h & 0x80000000 else -1.0
+    norma = sum(v * v for v in vetor) ** 0.5 or 1.0
+    return [v / norma for v in vetor]
+
+
+class _Manipulador(BaseHTTPRequestHandler):
+    """Trata as requisições de um ServidorMock (ver self.server.mock)"""
+
+    protocol_version = "HTTP/1.1"
+    # Cabeçalhos e corpo saem em escritas separadas: com o algoritmo de Nagle,
+    # cada resposta em conexão persistente esperaria o ACK atrasado do cliente (~40 ms)
+    disable_nagle_algorithm = True
+
+    def log_message(self, formato, *args):
+        if self.server.mock.verboso:
+            super().log_message(formato, *args)
+
+    def _ler_corpo(self) -> bytes:
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(tamanho)
+
+    def _ler_formulario(self, corpo: bytes) -> dict:
+        """Campos de um corpo multipart/form-data ({nome: bytes})"""
+        cabecalho = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("latin-1")
+        mensagem = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(cabecalho + corpo)
+        return {parte.get_param("name", header="content-disposition"): parte.get_payload(decode=True)
+                for parte in mensagem.iter_parts()}
+
+    def _responder_json(self, dados: dict, status: int = 200, cabecalhos: dict = None):
+        corpo = json.dumps(dados, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _nao_encontrado(self):
+        self._responder_json({"error": {"message": f"Rota não encontrada: {self.path}"}}, 404)
+
+    def do_GET(self):
+        mock = self.server.mock
+        partes = self.path.split("?")[0].strip("/").split("/")
+        if partes[-1] == "models":
+            self._responder_json({
+                "object": "list",
+                "data": [{"id": mock.modelo, "object": "model", "owned_by": "mock"}],
+            })
+        elif "files" in partes[:-1]:
+            indice = partes.index("files")
+            arquivo = mock.arquivos.get(partes[indice + 1]) if len(partes) > indice + 1 else None
+            if arquivo is None:
+                self._nao_encontrado()
+            elif partes[-1] == "content":
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(arquivo["conteudo"])))
+                self.end_headers()
+                self.wfile.write(arquivo["conteudo"])
+            else:
+                self._responder_json(arquivo["objeto"])
+        elif "batches" in partes[:-1] and partes[-1] in mock.lotes:
+            with mock._trava:
+                self._responder_json(dict(mock.lotes[partes[-1]]))
+        else:
+            self._nao_encontrado()
+
+    def do_POST(self):
+        mock = self.server.mock
+        corpo = self._ler_corpo()
+        if (self.headers.get("Content-Type") or "").startswith("multipart/form-data"):
+            dados = self._ler_formulario(corpo)
+        else:
+            dados = json.loads(corpo or b"{}")
+        with mock._trava:
+            mock.requisicoes.append({"rota": self.path, "corpo": dados})
+
+        partes = self.path.split("?")[0].strip("/").split("/")
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            if mock.latencia:
+                time.sleep(mock.latencia)
+            falha = mock.proxima_falha()
+            if falha is not None:
+                status, retry_after = falha
+                cabecalhos = {"Retry-After": f"{retry_after:g}"} if retry_after is not None else None
+                self._responder_json({"error": {"message": f"Falha simulada ({status})",
+                                                "type": "mock_error", "code": None}}, status, cabecalhos)
+            elif dados.get("stream"):
+                self._chat_stream(dados)
+            else:
+                self._responder_json(mock.gerar_completion(dados))
+        elif partes[-1] == "embeddings":
+            self._embeddings(dados)
+        elif partes[-1] == "files":
+            nome = "upload.jsonl"
+            self._responder_json(mock.criar_arquivo(dados.get("file") or b"", nome,
+                                                    (dados.get("purpose") or b"batch").decode()))
+        elif partes[-1] == "batches":
+            if dados.get("input_file_id") not in mock.arquivos:
+                self._responder_json({"error": {"message": "input_file_id não encontrado"}}, 400)
+            else:
+                self._responder_json(mock.criar_lote(dados))
+        elif partes[-1] == "cancel" and partes[-2] in mock.lotes:
+            self._responder_json(mock.cancelar_lote(partes[-2]))
+        else:
+            self._nao_encontrado()
+
+    def _embeddings(self, dados: dict):
+        entradas = dados.get("input", [])
+        if isinstance(entradas, str):
+            entradas = [entradas]
+        dimensoes = dados.get("dimensions") or DIMENSOES_EMBEDDING
+
+        itens = []
+        for i, texto in enumerate(entradas):
+            vetor = _embedding(str(texto), dimensoes)
+            if dados.get("encoding_format") == "base64":
+                vetor = base64.b64encode(struct.pack(f"<{dimensoes}f", *vetor)).decode("ascii")
+            itens.append({"object": "embedding", "index": i, "embedding": vetor})
+
+        tokens = sum(_contar_tokens(str(texto)) for texto in entradas)
+        self._responder_json({
+            "object": "list",
+            "data": itens,
+            "model": dados.get("model", "mock-embeddings"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def _chat_stream(self, dados: dict):
+        mock = self.server.mock
+        texto = mock.gerar_resposta(dados)
+        base = {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": dados.get("model", mock.modelo),
+        }
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def enviar(evento: dict):
+            self.wfile.write(b"data: " + json.dumps({**base, **evento}, ensure_ascii=False).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+        try:
+            palavras = texto.split(" ")
+            for i, palavra in enumerate(palavras):
+                trecho = palavra if i == 0 else " " + palavra
+                enviar({"choices": [{"index": 0, "delta": {"content": trecho}, "finish_reason": None}]})
+                if mock.intervalo_stream:
+                    time.sleep(mock.intervalo_stream)
+            enviar({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+
+            if mock.incluir_uso and (dados.get("stream_options") or {}).get("include_usage"):
+                enviar({"choices": [], "usage": mock.uso(dados, texto)})
+
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # O cliente fechou o streaming antes do fim (ex: gerador abandonado, hedge)
+        self.close_connection = True
+
+
+class ServidorMock:
+    """Servidor compatível com a API da OpenAI executado em uma thread própria"""
+
+    def __init__(self, porta: int = 0, host: str = "127.0.0.1", latencia: float = 0.0,
+                 intervalo_stream: float = 0.0, modelo: str = "mock-modelo", verboso: bool = False,
+                 latencia_lote: float = 0.0, tamanho_resposta: int = None, incluir_uso: bool = True):
+        """
+        Cria o servidor (ainda parado, ver iniciar()).
+
+        Args:
+            porta: Porta TCP (0 escolhe uma porta livre)
+            host: Endereço de escuta
+            latencia: Atraso, em segundos, antes de cada resposta de chat
+            intervalo_stream: Atraso, em segundos, entre os trechos do streaming
+            modelo: Id do modelo informado em /v1/models
+            verboso: Se True, imprime cada requisição recebida
+            latencia_lote: Segundos que cada lote da Batch API fica em processamento
+            tamanho_resposta: Caracteres de cada resposta de chat (None = apenas o eco
+                              da última mensagem); define também o número de trechos do streaming
+            incluir_uso: Se False, as respostas de chat não trazem usage (como alguns
+                         servidores compatíveis)
+        """
+        self.host = host
+        self.porta = porta
+        self.latencia = latencia
+        self.intervalo_stream = intervalo_stream
+        self.modelo = modelo
+        self.verboso = verboso
+        self.latencia_lote = latencia_lote
+        self.tamanho_resposta = tamanho_resposta
+        self.incluir_uso = incluir_uso
+        self.requisicoes = []  # Corpos recebidos, para inspeção em testes
+        self.arquivos = {}  # id -> {"objeto": metadados, "conteudo": bytes} (Files API)
+        self.lotes = {}  # id -> objeto batch (Batch API)
+        self._prefixos = set()  # Hashes dos prefixos de prompt já vistos (cache simulado)
+        self._falhas = deque()  # (status, retry_after) das próximas respostas de chat
+        self._trava = threading.Lock()
+        self._servidor = None
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        """URL para OPENAI_BASE_URL (ex: http://127.0.0.1:8765/v1)"""
+        return f"http://{self.host}:{self.porta}/v1"
+
+    def gerar_resposta(self, dados: dict) -> str:
+        """Texto da resposta simulada para o corpo de uma requisição de chat"""
+        mensagens = dados.get("messages") or [{}]
+        ultima = str(mensagens[-1].get("content") or "")
+        texto = f"Resposta simulada: {ultima[:TAMANHO_ECO]}"
+        if self.tamanho_resposta is None:
+            return texto
+        # Completa com palavras de preenchimento até o tamanho pedido
+        while len(texto) < self.tamanho_resposta:
+            texto += " lorem ipsum"
+        return texto[:self.tamanho_resposta]
+
+    def uso(self, dados: dict, texto: str) -> dict:
+        """Campo usage da resposta (inclui os tokens do cache de prompt simulado)"""
+        mensagens = dados.get("messages", [])
+        prompt = sum(_contar_tokens(str(msg.get("content") or "")) for msg in mensagens)
+        resposta = _contar_tokens(texto)
+        return {
+            "prompt_tokens": prompt,
+            "completion_tokens": resposta,
+            "total_tokens": prompt + resposta,
+            "prompt_tokens_details": {"cached_tokens": self.tokens_em_cache(mensagens)},
+        }
+
+    def gerar_completion(self, dados: dict) -> dict:
+        """Objeto chat.completion completo para o corpo de uma requisição de chat"""
+        texto = self.gerar_resposta(dados)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": dados.get("model", self.modelo),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": texto},
+                "finish_reason": "stop",
+            }],
+            "usage": self.uso(dados, texto) if self.incluir_uso else None,
+        }
+
+    def injetar_falhas(self, status: int = 503, quantidade: int = 1, retry_after: float = None):
+        """
+        Faz as próximas requisições de chat falharem com o status informado.
+
+        Args:
+            status: Status HTTP da falha (ex: 429, 500, 503, 401)
+            quantidade: Quantas requisições seguidas falham
+            retry_after: Segundos informados no cabeçalho Retry-After (None = sem cabeçalho)
+        """
+        with self._trava:
+            self._falhas.extend([(status, retry_after)] * quantidade)
+
+    def proxima_falha(self):
+        """Consome a próxima falha injetada: (status, retry_after), ou None"""
+        with self._trava:
+            return self._falhas.popleft() if self._falhas else None
+
+    def criar_arquivo(self, conteudo: bytes, nome: str, finalidade: str) -> dict:
+        """Guarda um arquivo (Files API) e retorna seus metadados"""
+        objeto = {
+            "id": f"file-{uuid.uuid4().hex[:24]}",
+            "object": "file",
+            "bytes": len(conteudo),
+            "created_at": int(time.time()),
+            "filename": nome,
+            "purpose": finalidade,
+            "status": "processed",
+        }
+        with self._trava:
+            self.arquivos[objeto["id"]] = {"objeto": objeto, "conteudo": conteudo}
+        return objeto
+
+    def criar_lote(self, dados: dict) -> dict:
+        """Cria um lote (Batch API) e o processa em uma thread própria"""
+        lote = {
+            "id": f"batch_{uuid.uuid4().hex[:24]}",
+            "object": "batch",
+            "endpoint": dados.get("endpoint", "/v1/chat/completions"),
+            "input_file_id": dados["input_file_id"],
+            "completion_window": dados.get("completion_window", "24h"),
+            "status": "validating",
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": int(time.time()),
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": dados.get("metadata"),
+        }
+        with self._trava:
+            self.lotes[lote["id"]] = lote
+        threading.Thread(target=self._processar_lote, args=(lote["id"],), daemon=True).start()
+        return dict(lote)
+
+    def cancelar_lote(self, lote_id: str) -> dict:
+        with self._trava:
+            lote = self.lotes[lote_id]
+            if lote["status"] in ("validating", "in_progress"):
+                lote["status"] = "cancelling"
+            return dict(lote)
+
+    def _processar_lote(self, lote_id: str):
+        """Responde cada linha do JSONL de entrada e grava os arquivos de saída e de erros"""
+        with self._trava:
+            lote = self.lotes[lote_id]
+            linhas = self.arquivos[lote["input_file_id"]]["conteudo"].decode("utf-8").splitlines()
+            lote["status"] = "in_progress"
+            lote["in_progress_at"] = int(time.time())
+            lote["request_counts"]["total"] = len(linhas)
+        if self.latencia_lote:
+            time.sleep(self.latencia_lote)
+
+        saidas, erros = [], []
+        for linha in filter(None, linhas):
+            requisicao = json.loads(linha)
+            corpo = requisicao.get("body") or {}
+            registro = {"id": f"batch_req_{uuid.uuid4().hex[:24]}", "custom_id": requisicao.get("custom_id")}
+            if requisicao.get("url") != lote["endpoint"] or not corpo.get("messages"):
+                erros.append({**registro, "response": None,
+                              "error": {"code": "invalid_request", "message": "Requisição inválida para o lote"}})
+                continue
+            saidas.append({**registro, "error": None, "response": {
+                "status_code": 200,
+                "request_id": uuid.uuid4().hex,
+                "body": self.gerar_completion(corpo),
+            }})
+
+        with self._trava:
+            if lote["status"] == "cancelling":
+                lote["status"] = "cancelled"
+                return
+        for nome, registros, campo in (("saida", saidas, "output_file_id"), ("erros", erros, "error_file_id")):
+            if registros:
+                conteudo = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in registros).encode("utf-8")
+                arquivo = self.criar_arquivo(conteudo, f"{lote_id}_{nome}.jsonl", "batch_output")
+                lote[campo] = arquivo["id"]
+        with self._trava:
+            lote["request_counts"].update(completed=len(saidas), failed=len(erros))
+            lote["status"] = "completed"
+            lote["completed_at"] = int(time.time())
+
+    def tokens_em_cache(self, mensagens: list) -> int:
+        """
+        Simula o cache de prompt: soma os tokens das mensagens iniciais cujo
+        prefixo já foi visto e registra os prefixos desta requisição
+        """
+        h = hashlib.sha256()
+        prefixos = []
+        em_cache = 0
+        continuo = True
+        with self._trava:
+            for msg in mensagens:
+                conteudo = str(msg.get("content") or "")
+                h.update(json.dumps([msg.get("role"), conteudo], ensure_ascii=False).encode("utf-8"))
+                prefixo = h.digest()
+                continuo = continuo and prefixo in self._prefixos
+                if continuo:
+                    em_cache += _contar_tokens(conteudo)
+                prefixos.append(prefixo)
+            if len(self._prefixos) + len(prefixos) > MAX_PREFIXOS:
+                self._prefixos.clear()
+            self._prefixos.update(prefixos)
+        return em_cache
+
+    def iniciar(self) -> "ServidorMock":
+        """Inicia o servidor em segundo plano e retorna a própria instância"""
+        self._servidor = ThreadingHTTPServer((self.host, self.porta), _Manipulador)
+        self._servidor.daemon_threads = True
+        self._servidor.mock = self
+        self.porta = self._servidor.server_address[1]
+        self._thread = threading.Thread(target=self._servidor.serve_forever, name="ServidorMock", daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        """Encerra o servidor"""
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._thread.join()
+            self._servidor = None
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *args):
+        self.parar()
+
+
+if __name__ == "__main__":
+    porta = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    latencia = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+
+    servidor = ServidorMock(porta=porta, latencia=latencia, verboso=True).iniciar()
+    print(f"Servidor mock em {servidor.base_url} (Ctrl+C para encerrar)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.parar()